@@ -1,16 +1,43 @@
-from fastapi import FastAPI, HTTPException, Query, Depends, Header
+from fastapi import FastAPI, HTTPException, Query, Depends, Header, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
+import base64
 import json
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, Union
 import os
+import re
+import asyncio
+import logging
+import threading
 from fastapi.middleware.cors import CORSMiddleware
 from supabase import create_client, Client
 import jwt
 from datetime import datetime
 from dotenv import load_dotenv
+from question_store import PROGRAMS, SUBJECTS, LiveQuestionStore, dump_json, parse_fields
+from stats_cache import CachedStats, StatsCache, StatsUnavailable
+from user_cache import UserCache
+from user_progress import ProgressTracker, UserProgress, score_outcomes
+from question_selection import SELECTION_STRATEGIES, select_questions
+from search_index import LiveSearchIndex
+from question_export import EXPORT_ENCODINGS, EXPORT_FORMATS, encode_chunks, export_chunks, export_media_type
+from compression import CompressionMiddleware, PrecompressedResponse, negotiate_encoding
+from db import DataAccess, DataAccessTimeout, MemoryBackend, SupabaseBackend
+from attempt_ingest import AttemptIngest
+from metrics import CONTENT_TYPE, REGISTRY, STAGE_SECONDS, RequestMetricsMiddleware
+from structured_log import configure_logging, get_logger, log_event
+from profiler import ProfilingMiddleware, StackSampler
 
 load_dotenv()
 
+# JSON log lines on stderr. Per-request events (e.g. each authentication)
+# are written for LOG_SAMPLE_RATE of requests and only at DEBUG level.
+configure_logging(
+    level=os.environ.get("LOG_LEVEL", "INFO"),
+    sample_rate=float(os.environ.get("LOG_SAMPLE_RATE", "0.01")),
+)
+logger = get_logger("app")
+
 app = FastAPI(
     title="SAT Questions API",
     description="API to retrieve SAT Math and Reading/Writing questions",
@@ -25,16 +52,103 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Responses smaller than this are sent uncompressed; framing overhead outweighs the savings
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+
+# brotli (if installed) or gzip for every response that isn't already encoded
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+
+# Opt-in stack-sampling profiles of PROFILE_SAMPLE_RATE of requests (default
+# none), plus any request sent with `X-Profile: 1` and the admin token
+stack_sampler = StackSampler(
+    interval=float(os.environ.get("PROFILE_INTERVAL", "0.005")),
+    history=int(os.environ.get("PROFILE_HISTORY", "50")),
+)
+app.add_middleware(
+    ProfilingMiddleware,
+    sampler=stack_sampler,
+    sample_rate=float(os.environ.get("PROFILE_SAMPLE_RATE", "0")),
+    admin_token=lambda: ADMIN_TOKEN,
+)
+
+# Outermost, so request latency covers compression and profiling too
+app.add_middleware(RequestMetricsMiddleware)
+
 # Load the data
 DATA_DIR = "data"
 STATS_DIR = "total_questions"
+LOOKUP_FILE = "lookup.json"
+# Compiled by `python question_store.py`; rebuilt at startup if missing or stale
+QUESTION_STORE_PATH = os.environ.get("QUESTION_STORE_PATH", os.path.join(DATA_DIR, "questions.bin"))
+# Seconds between checks of the data files for changes; 0 disables hot reload
+QUESTION_STORE_RELOAD_INTERVAL = float(os.environ.get("QUESTION_STORE_RELOAD_INTERVAL", "30"))
+# Cache-Control max-age for /stats responses
+STATS_MAX_AGE = int(os.environ.get("STATS_MAX_AGE", "300"))
+# Count each near-duplicate cluster once when the API generates missing stats files
+STATS_DEDUP = os.environ.get("STATS_DEDUP", "0") == "1"
+# Enables the /admin endpoints when set; sent back in the X-Admin-Token header
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
 
 # Supabase configuration
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
 SUPABASE_JWT_SECRET = os.environ.get("SUPABASE_JWT_SECRET")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# "supabase" (default) or "memory", an in-process stand-in for running offline
+DATA_BACKEND = os.environ.get("DATA_BACKEND", "supabase")
+
+if DATA_BACKEND == "memory":
+    data_backend = MemoryBackend()
+    # JSON list of users table rows the in-memory backend starts with; it has none otherwise
+    if os.environ.get("MEMORY_BACKEND_USERS"):
+        data_backend.load_users(os.environ["MEMORY_BACKEND_USERS"])
+else:
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    data_backend = SupabaseBackend(supabase)
+
+# Backend calls run on a bounded thread pool so they never block the event loop
+db = DataAccess(
+    data_backend,
+    max_concurrency=int(os.environ.get("DB_MAX_CONCURRENCY", "16")),
+    timeout=float(os.environ.get("DB_TIMEOUT", "10")),
+)
+
+# Attempts are acknowledged once spooled locally and written to the backend in batches
+attempt_ingest = AttemptIngest(
+    lambda rows: db.call_blocking(db.backend.upsert_attempts, rows),
+    spool_dir=os.environ.get("ATTEMPT_SPOOL_DIR", "spool"),
+    batch_size=int(os.environ.get("ATTEMPT_BATCH_SIZE", "500")),
+    flush_interval=float(os.environ.get("ATTEMPT_FLUSH_INTERVAL", "1")),
+    fsync=os.environ.get("ATTEMPT_SPOOL_FSYNC", "0") == "1",
+)
+# Seconds shutdown waits for pending attempts to be written; the rest stay
+# spooled and are replayed on the next start. Below gunicorn's graceful_timeout.
+ATTEMPT_DRAIN_TIMEOUT = float(os.environ.get("ATTEMPT_DRAIN_TIMEOUT", "20"))
+
+# Hits and misses of the per-process caches; the question store's own caches are read at scrape time
+CACHE_LOOKUPS = REGISTRY.counter(
+    "cache_lookups_total",
+    "Cache lookups by cache and result (hit or miss)",
+    ("cache", "result"),
+    function=lambda: {
+        (cache, result): count
+        for cache, (hits, misses) in live_store.current.cache_stats().items()
+        for result, count in (("hit", hits), ("miss", misses))
+    },
+)
+
+# Users resolved from verified JWTs, so authenticated requests skip the users table
+user_cache = UserCache(
+    max_size=int(os.environ.get("USER_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("USER_CACHE_TTL", "300")),
+    negative_ttl=float(os.environ.get("USER_CACHE_NEGATIVE_TTL", "30")),
+)
+
+# Per-user attempt counters behind /user/progress, rebuilt from attempted_questions on a miss
+progress_tracker = ProgressTracker(
+    max_users=int(os.environ.get("PROGRESS_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("PROGRESS_CACHE_TTL", "300")),
+)
 
 class User(BaseModel):
     id: str
@@ -52,6 +166,39 @@ class AttemptQuestionRequest(BaseModel):
     question_id: str
     selected_answer: List[str]
 
+class AttemptQuestionsRequest(BaseModel):
+    attempts: List[AttemptQuestionRequest]
+
+class AttemptResult(BaseModel):
+    question_id: str
+    is_correct: bool
+
+class AttemptQuestionsResponse(BaseModel):
+    success: bool
+    results: List[AttemptResult]
+    missing: List[str]
+    total_attempted: int
+    total_correct: int
+    accuracy: float
+    by_main_category: Dict[str, Any]
+    by_difficulty: Dict[str, Any]
+
+# Upper bound on `limit` for the question list and search endpoints; also
+# keeps any one cached page small
+MAX_PAGE_SIZE = 100
+
+# Upper bound on /user/next-questions?count=
+MAX_NEXT_QUESTIONS = 20
+
+# Upper bound on the number of ids in one /questions?ids= request
+MAX_BATCH_QUESTIONS = 100
+
+# Upper bound on the number of attempts in one /user/attempt-questions request
+MAX_BATCH_ATTEMPTS = 100
+
+# Facets a graded practice set is scored by, and the keys they're reported under
+BATCH_SCORE_FACETS = (("primary_class_cd_desc", "by_main_category"), ("difficulty", "by_difficulty"))
+
 # Stats model
 class StatsResponse(BaseModel):
     total_questions: int
@@ -74,29 +221,30 @@ class DetailedStatsResponse(BaseModel):
     by_score_band_overall: Dict[str, Any]
     detailed: Dict[str, Any]
 
-try:
-    with open(os.path.join(DATA_DIR, "SAT_math.json"), "r") as f:
-        math_questions = json.load(f)
-except FileNotFoundError:
-    math_questions = []
-
-try:
-    with open(os.path.join(DATA_DIR, "SAT_RW.json"), "r") as f:
-        rw_questions = json.load(f)
-except FileNotFoundError:
-    rw_questions = []
-
-try:
-    with open(os.path.join(DATA_DIR, "PSAT89_math.json"), "r") as f:
-        psat89_math_questions = json.load(f)
-except FileNotFoundError:
-    psat89_math_questions = []
-
-try:
-    with open(os.path.join(DATA_DIR, "PSAT89_RW.json"), "r") as f:
-        psat89_rw_questions = json.load(f)
-except FileNotFoundError:
-    psat89_rw_questions = []
+# Every bank in DATA_DIR matching PROGRAM_(math|RW).json, indexed at startup and
+# swapped in place when the files change. Handlers read `.current` once per request.
+live_store = LiveQuestionStore(DATA_DIR, LOOKUP_FILE, QUESTION_STORE_PATH)
+
+# Full-text index over the live store's questions, rebuilt after a reload
+search_index = LiveSearchIndex(live_store)
+
+# Queue depths and cache sizes, read at scrape time
+REGISTRY.gauge("attempt_ingest_pending", "Attempts spooled but not yet written to the backend", function=lambda: {(): attempt_ingest.pending})
+REGISTRY.gauge("db_calls_in_flight", "Backend calls running or waiting for a data-access thread", function=lambda: {(): db.in_flight})
+REGISTRY.gauge(
+    "cache_entries",
+    "Entries held per cache",
+    ("cache",),
+    function=lambda: {("user",): len(user_cache), ("progress",): len(progress_tracker)},
+)
+REGISTRY.gauge("question_store_questions", "Questions in the live question store", function=lambda: {(): len(live_store.current)})
+
+def regenerate_stats():
+    from stats_generator import generate_stats_files
+    generate_stats_files(STATS_DIR, dedup=STATS_DEDUP)
+
+# Stats files held in memory as serialized bytes; generated in the background if missing
+stats_cache = StatsCache(STATS_DIR, regenerate_stats)
 
 class QuestionBasic(BaseModel):
     questionId: str
@@ -109,75 +257,220 @@ class QuestionBasic(BaseModel):
     answerOptions: List[Dict[str, str]]
     questionDetail: Optional[str] = None
     correct_answer: List[str]
+    clusterId: Optional[str] = None
+
+class QuestionFields(BaseModel):
+    """A question limited to the fields asked for with `fields=`; questionId is always included."""
+    questionId: str
+    difficulty: Optional[str] = None
+    skill_desc: Optional[str] = None
+    primary_class_cd_desc: Optional[str] = None
+    program: Optional[str] = None
+    question: Optional[str] = None
+    explanation: Optional[str] = None
+    answerOptions: Optional[List[Dict[str, str]]] = None
+    questionDetail: Optional[str] = None
+    correct_answer: Optional[List[str]] = None
+    clusterId: Optional[str] = None
 
 class QuestionWithAttempt(QuestionBasic):
     attempted: bool = False
     user_answer: Optional[List[str]] = None
 
+class ProgressResponse(BaseModel):
+    total_attempted: int
+    total_correct: int
+    accuracy: float
+    by_program: Dict[str, Any]
+    by_subject: Dict[str, Any]
+    by_main_category: Dict[str, Any]
+    by_subcategory: Dict[str, Any]
+    by_difficulty: Dict[str, Any]
+    by_score_band: Dict[str, Any]
+
+class NextQuestionsResponse(BaseModel):
+    remaining: int
+    questions: List[QuestionBasic]
+
+class SearchHit(QuestionBasic):
+    score: float
+    snippet: str
+
+class SearchHitFields(QuestionFields):
+    score: float
+    snippet: str
+
+class SearchResponse(BaseModel):
+    total: int
+    page: int
+    limit: int
+    questions: List[Union[SearchHit, SearchHitFields]]
+
 class PaginatedResponse(BaseModel):
     total: int
     page: int
     limit: int
-    questions: List[QuestionBasic]
+    questions: List[Union[QuestionBasic, QuestionFields]]
+
+class QuestionBatchResponse(BaseModel):
+    questions: List[Union[QuestionBasic, QuestionFields]]
+    missing: List[str]
 
 class PaginatedAuthResponse(BaseModel):
     total: int
     page: int
     limit: int
     questions: List[QuestionWithAttempt]
+    next_cursor: Optional[str] = None
 
 
-def extract_question_data(question: Dict[str, Any]) -> Dict[str, Any]:
-    result = {
-        "questionId": question.get("questionId", ""),
-        "difficulty": question.get("difficulty", ""),
-        "skill_desc": question.get("skill_desc", ""),
-        "primary_class_cd_desc": question.get("primary_class_cd_desc", ""),
-        "program": question.get("program", ""),
-        "question": question.get("question", ""),
-    }
-    if "questionDetail" in question:
-        result["questionDetail"] = question.get("questionDetail", "")
-    result["answerOptions"] = question.get("options", [])
-    result["correct_answer"] = question.get("correct_answer", [])
-    result["explanation"] = question.get("explanation", "")
-    return result
-
 async def get_current_user(authorization: str = Header(None)) -> User:
-    print(f"Received Authorization header: {authorization}")  # Log the header
     if not authorization or not authorization.startswith("Bearer "):
+        log_event(logger, logging.INFO, "auth.missing_token", sampled=True)
         raise HTTPException(status_code=401, detail="Invalid authentication token - Missing or incorrect format")
 
     token = authorization.replace("Bearer ", "")
-    print(f"Extracted token: {token}")  # Log the extracted token
 
     try:
         payload = jwt.decode(token, SUPABASE_JWT_SECRET, algorithms=["HS256"])
-        print(f"Decoded payload: {payload}")  # Log the payload
         user_id = payload.get("sub")
 
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid user ID in token")
-        print(f"Extracted user ID: {user_id}")  # Log the user ID
 
-        user_data = supabase.table("users").select("*").eq("id", user_id).execute()
-        print(f"Supabase user data response: {user_data}") # Log the database response
+        hit, user = user_cache.lookup(user_id)
+        CACHE_LOOKUPS.inc(cache="user", result="hit" if hit else "miss")
+        if not hit:
+            user_row = await db.get_user(user_id)
 
-        if not user_data.data:
-            raise HTTPException(status_code=404, detail="User not found")
+            if user_row:
+                user = User(
+                    id=user_row["id"],
+                    email=user_row["email"],
+                    created_at=datetime.fromisoformat(user_row["created_at"])
+                )
+                user_cache.put(user_id, user, payload.get("exp"))
+            else:
+                user_cache.put_missing(user_id)
 
-        return User(
-            id=user_data.data[0]["id"],
-            email=user_data.data[0]["email"],
-            created_at=datetime.fromisoformat(user_data.data[0]["created_at"])
-        )
+        # Never the token or the user's row, only who and how they resolved
+        log_event(logger, logging.DEBUG, "auth.resolved", sampled=True, user_id=user_id, cached=hit, found=user is not None)
+        if user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return user
+    except (HTTPException, DataAccessTimeout):
+        raise
     except jwt.PyJWTError as e:
-        print(f"JWT decoding error: {e}")  # Log the specific JWT error
+        log_event(logger, logging.INFO, "auth.invalid_token", sampled=True, error=str(e))
         raise HTTPException(status_code=401, detail="Invalid authentication token - JWT error")
-    except Exception as e:
-        print(f"Unexpected error in get_current_user: {e}") # Log any other errors
+    except Exception:
+        log_event(logger, logging.ERROR, "auth.failed", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error during authentication")
 
+@app.exception_handler(DataAccessTimeout)
+async def data_access_timeout_handler(request: Request, exc: DataAccessTimeout):
+    return JSONResponse(status_code=504, content={"detail": "Database request timed out"})
+
+def require_admin(x_admin_token: str = Header(None)) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.on_event("startup")
+def start_question_store_watcher():
+    live_store.watch(QUESTION_STORE_RELOAD_INTERVAL)
+
+@app.on_event("startup")
+def start_attempt_ingest():
+    attempt_ingest.start()
+
+@app.on_event("shutdown")
+async def drain_attempt_ingest():
+    try:
+        # stop() itself gives up at the deadline (plus at most one backend
+        # call timeout for a batch already being written); an outer wait_for
+        # wouldn't, as its thread is still joined at interpreter exit
+        await asyncio.to_thread(attempt_ingest.stop, ATTEMPT_DRAIN_TIMEOUT)
+    except TimeoutError:
+        # Still spooled; replayed on the next start
+        log_event(logger, logging.ERROR, "attempts.drain_timed_out", pending=attempt_ingest.pending, timeout=ATTEMPT_DRAIN_TIMEOUT)
+    except Exception as e:
+        # Still spooled; replayed on the next start
+        log_event(logger, logging.ERROR, "attempts.drain_failed", pending=attempt_ingest.pending, error=str(e))
+
+@app.on_event("startup")
+def warm_search_index():
+    # Built off the startup path; a search arriving first waits for it
+    threading.Thread(target=lambda: search_index.current, name="search-index", daemon=True).start()
+
+@app.on_event("startup")
+def warm_stats_cache():
+    if stats_cache.missing("simplified_stats.json", "question_stats.json"):
+        stats_cache.generate()
+        return
+    try:
+        stats_cache.get("simplified_stats.json", StatsResponse)
+        stats_cache.get("question_stats.json", DetailedStatsResponse)
+    except Exception as e:
+        # Left to the endpoints to report
+        log_event(logger, logging.WARNING, "stats.preload_failed", error=str(e))
+
+@app.get("/metrics")
+def get_metrics():
+    """
+    This worker's metrics in the Prometheus text format: request latency by
+    route, stage timings, cache hits and misses, backend call latency and
+    queue depths.
+    """
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.post("/admin/reload", dependencies=[Depends(require_admin)])
+def reload_question_store():
+    """
+    Rebuild the question store from the current data files and swap it in.
+    In-flight requests finish on the previous snapshot. Only the worker that
+    handles this request reloads; the others pick the change up on their
+    next QUESTION_STORE_RELOAD_INTERVAL poll, or on restart if polling is off.
+    """
+    try:
+        reloaded = live_store.reload()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reloading question store: {str(e)}")
+    return {
+        "reloaded": reloaded,
+        "version": live_store.current.version,
+        "total_questions": len(live_store.current),
+    }
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+def list_profiles():
+    """Request profiles this worker has kept, newest first."""
+    return {"profiles": [profile.summary() for profile in stack_sampler.finished()]}
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def get_profile(profile_id: str):
+    """
+    One profile's samples as collapsed stacks, e.g. for
+    `flamegraph.pl profile.txt > profile.svg` or speedscope.
+    """
+    profile = stack_sampler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found; it may have been served by another worker or evicted")
+    return Response(content=profile.collapsed(), media_type="text/plain")
+
+@app.post("/admin/users/{user_id}/invalidate", dependencies=[Depends(require_admin)])
+def invalidate_user(user_id: str):
+    """
+    Drop a user from the auth and progress caches, e.g. after their row was
+    updated or deleted. Only the worker that handles this request forgets
+    them; other workers keep their entries until USER_CACHE_TTL and
+    PROGRESS_CACHE_TTL expire them.
+    """
+    user_cache.invalidate(user_id)
+    progress_tracker.invalidate(user_id)
+    return {"success": True}
+
 @app.get("/")
 def read_root():
     return {
@@ -185,25 +478,76 @@ def read_root():
         "endpoints": [
             "/questions/math",
             "/questions/rw",
-            "/questions/psat89/math",
-            "/questions/psat89/rw",
+            "/questions/{program}/{subject}",
+            "/questions/{question_id}",
+            "/questions?ids=",
             "/questions/by-category/{category}",
+            "/questions/search",
+            "/questions/export",
             "/stats",
             "/stats/detailed",
             "/user/attempted",
             "/user/attempt-question",
+            "/user/attempt-questions",
+            "/user/progress",
+            "/user/next-questions",
         ],
     }
 
+def selected_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def list_questions(
+    program: str,
+    subject: str,
+    limit: int,
+    offset: int,
+    page: int,
+    difficulty: Optional[str] = None,
+    skill: Optional[str] = None,
+    primary_class: Optional[str] = None,
+    score_band: Optional[int] = None,
+    category: Optional[str] = None,
+    dedup: bool = False,
+    fields: Optional[str] = None,
+) -> Response:
+    selected = selected_fields(fields)
+    calculated_offset = (page - 1) * limit
+    if offset > 0:
+        calculated_offset = offset
+
+    # Pages are served pre-serialized (and precompressed), bypassing response_model validation
+    payload = live_store.current.page(
+        calculated_offset,
+        limit,
+        page,
+        program=program,
+        subject=subject,
+        category=category,
+        difficulty=difficulty,
+        skill=skill,
+        primary_class=primary_class,
+        score_band=score_band,
+        dedup=dedup,
+        fields=selected,
+    )
+    return PrecompressedResponse(payload, minimum_size=COMPRESSION_MIN_SIZE)
+
 @app.get("/questions/by-category/{category}", response_model=PaginatedResponse)
 def get_questions_by_category(
     category: str,
-    program: str = Query(..., description="Program type (SAT or PSAT89)", enum=["SAT", "PSAT89"]),
-    limit: int = Query(10, description="Number of questions to return"),
-    offset: int = Query(0, description="Starting position"),
-    page: int = Query(1, description="Page number"),
+    program: str = Query(..., description="Program type (SAT, PSAT89 or PSAT10NMSQT)", enum=list(PROGRAMS)),
+    limit: int = Query(10, ge=0, le=MAX_PAGE_SIZE, description="Number of questions to return"),
+    offset: int = Query(0, ge=0, description="Starting position"),
+    page: int = Query(1, ge=1, description="Page number"),
     difficulty: Optional[str] = Query(None, description="Filter by difficulty (E, M, H)"),
     skill: Optional[str] = Query(None, description="Filter by skill description"),
+    score_band: Optional[int] = Query(None, description="Filter by score band (1-7)"),
+    dedup: bool = Query(False, description="Only the first question of each near-duplicate cluster"),
+    fields: Optional[str] = Query(None, description='Comma-separated fields to return, or "summary" for ids, skills and difficulties only'),
 ):
     rw_categories = [
         "Craft and Structure",
@@ -222,209 +566,262 @@ def get_questions_by_category(
     if category not in valid_categories:
         raise HTTPException(status_code=400, detail=f"Invalid category. Valid categories are: {', '.join(valid_categories)}")
 
-    if program == "SAT":
-        if category in rw_categories:
-            questions = rw_questions
-        elif category in math_categories:
-            questions = math_questions
-        else:
-            questions = []
-    elif program == "PSAT89":
-        if category in rw_categories:
-            questions = psat89_rw_questions
-        elif category in math_categories:
-            questions = psat89_math_questions
-        else:
-            questions = []
-    else:
-        raise HTTPException(status_code=400, detail="Invalid program. Use 'SAT' or 'PSAT89'.")
-
-    calculated_offset = (page - 1) * limit
-    if offset > 0:
-        calculated_offset = offset
-
-    filtered = [q for q in questions if q.get("primary_class_cd_desc") == category]
-
-    if difficulty:
-        filtered = [q for q in filtered if q.get("difficulty") == difficulty]
-    if skill:
-        filtered = [q for q in filtered if skill.lower() in q.get("skill_desc", "").lower()]
+    if program not in PROGRAMS:
+        raise HTTPException(status_code=400, detail=f"Invalid program. Use one of: {', '.join(PROGRAMS)}.")
+    subject = "RW" if category in rw_categories else "MATH"
 
-    paginated = filtered[calculated_offset : calculated_offset + limit]
-    result_questions = [extract_question_data(q) for q in paginated]
+    return list_questions(
+        program, subject, limit, offset, page, difficulty=difficulty, skill=skill, score_band=score_band, category=category,
+        dedup=dedup, fields=fields,
+    )
 
-    return {
-        "total": len(filtered),
-        "page": page,
-        "limit": limit,
-        "questions": result_questions,
-    }
-
-@app.get("/questions/math", response_model=PaginatedResponse)
-def get_math_questions(
-    limit: int = Query(10, description="Number of questions to return"),
-    offset: int = Query(0, description="Starting position"),
-    page: int = Query(1, description="Page number"),
+@app.get("/questions/search", response_model=SearchResponse)
+def search_questions(
+    q: str = Query(..., min_length=1, description='Words to search for; quote "exact phrases"'),
+    program: Optional[str] = Query(None, description="Program type (SAT, PSAT89 or PSAT10NMSQT)", enum=list(PROGRAMS)),
+    subject: Optional[str] = Query(None, description="Subject (MATH or RW)", enum=list(SUBJECTS)),
+    category: Optional[str] = Query(None, description="Main category, e.g. Algebra"),
+    limit: int = Query(10, ge=0, le=MAX_PAGE_SIZE, description="Number of questions to return"),
+    offset: int = Query(0, ge=0, description="Starting position"),
+    page: int = Query(1, ge=1, description="Page number"),
     difficulty: Optional[str] = Query(None, description="Filter by difficulty (E, M, H)"),
     skill: Optional[str] = Query(None, description="Filter by skill description"),
     primary_class: Optional[str] = Query(None, description="Filter by primary class description"),
+    score_band: Optional[int] = Query(None, description="Filter by score band (1-7)"),
+    fields: Optional[str] = Query(None, description='Comma-separated fields to return, or "summary" for ids, skills and difficulties only'),
 ):
+    """
+    Questions whose stem, passage, answer options or explanation contain
+    every word and phrase in `q`, ranked by BM25. Each result carries its
+    score and an HTML snippet with the matches wrapped in <mark>.
+    """
+    selected = selected_fields(fields)
     calculated_offset = (page - 1) * limit
     if offset > 0:
         calculated_offset = offset
-
-    filtered = math_questions
-    if difficulty:
-        filtered = [q for q in filtered if q.get("difficulty") == difficulty]
-    if skill:
-        filtered = [q for q in filtered if skill.lower() in q.get("skill_desc", "").lower()]
-    if primary_class:
-        filtered = [q for q in filtered if primary_class.lower() in q.get("primary_class_cd_desc", "").lower()]
-
-    paginated = filtered[calculated_offset : calculated_offset + limit]
-    result_questions = [extract_question_data(q) for q in paginated]
-
-    return {
-        "total": len(filtered),
-        "page": page,
-        "limit": limit,
-        "questions": result_questions,
+    
+    index = search_index.current
+    question_store = index.store
+    filters = {
+        "program": program,
+        "subject": subject.upper() if subject else None,
+        "category": category,
+        "difficulty": difficulty,
+        "skill": skill,
+        "primary_class": primary_class,
+        "score_band": score_band,
     }
+    allowed = None
+    if any(value is not None for value in filters.values()):
+        allowed = question_store.query(**filters)
+    with STAGE_SECONDS.time(stage="search"):
+        positions, scores = index.search(q, allowed)
+    
+    hits = []
+    with STAGE_SECONDS.time(stage="snippet"):
+        window = slice(calculated_offset, calculated_offset + limit)
+        for position, score in zip(positions[window].tolist(), scores[window].tolist()):
+            # Extends the pre-rendered question in place of re-serializing it
+            hits.append(
+                question_store.render(position, selected)[:-1]
+                + b',"score":%s,"snippet":%s}' % (dump_json(round(score, 4)), dump_json(index.snippet(position, q)))
+            )
+    content = b'{"total":%d,"page":%d,"limit":%d,"questions":[%b]}' % (len(positions), page, limit, b",".join(hits))
+    return Response(content=content, media_type="application/json")
 
-@app.get("/questions/rw", response_model=PaginatedResponse)
-def get_rw_questions(
-    limit: int = Query(10, description="Number of questions to return"),
-    offset: int = Query(0, description="Starting position"),
-    page: int = Query(1, description="Page number"),
+@app.get("/questions/export")
+def export_questions(
+    program: Optional[str] = Query(None, description="Program type (SAT, PSAT89 or PSAT10NMSQT)", enum=list(PROGRAMS)),
+    subject: Optional[str] = Query(None, description="Subject (MATH or RW)", enum=list(SUBJECTS)),
+    category: Optional[str] = Query(None, description="Main category, e.g. Algebra"),
     difficulty: Optional[str] = Query(None, description="Filter by difficulty (E, M, H)"),
     skill: Optional[str] = Query(None, description="Filter by skill description"),
     primary_class: Optional[str] = Query(None, description="Filter by primary class description"),
+    score_band: Optional[int] = Query(None, description="Filter by score band (1-7)"),
+    dedup: bool = Query(False, description="Only the first question of each near-duplicate cluster"),
+    format: str = Query("ndjson", description="ndjson (one question per line) or json (a single array)", enum=list(EXPORT_FORMATS)),
+    since: Optional[str] = Query(None, description="X-Question-Revision of an earlier export; only changes after it are sent"),
+    fields: Optional[str] = Query(None, description='Comma-separated fields to return, or "summary" for ids, skills and difficulties only'),
+    accept_encoding: Optional[str] = Header(None),
 ):
-    calculated_offset = (page - 1) * limit
-    if offset > 0:
-        calculated_offset = offset
+    """
+    Stream every question matching the filters, in the QuestionBasic shape
+    used by the list endpoints (or just `fields`), compressed with zstd or
+    gzip when accepted.
 
-    filtered = rw_questions
-    if difficulty:
-        filtered = [q for q in filtered if q.get("difficulty") == difficulty]
-    if skill:
-        filtered = [q for q in filtered if skill.lower() in q.get("skill_desc", "").lower()]
-    if primary_class:
-        filtered = [q for q in filtered if primary_class.lower() in q.get("primary_class_cd_desc", "").lower()]
+    The X-Question-Revision response header identifies the bank revision the
+    export reflects. Passing it back as `since` returns only the questions
+    added or changed after it, followed by a {"questionId": ..., "deleted":
+    true} entry for each one removed. If the revision can no longer be
+    compared (X-Export-Since is then "full"), everything is sent again.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Use one of: {', '.join(EXPORT_FORMATS)}.")
+    selected = selected_fields(fields)
 
-    paginated = filtered[calculated_offset : calculated_offset + limit]
-    result_questions = [extract_question_data(q) for q in paginated]
+    question_store = live_store.current
+    subject = subject.upper() if subject else None
+    positions = question_store.query(program, subject, category, difficulty, skill, primary_class, score_band, dedup)
+    revision = None
+    if since:
+        try:
+            revision = question_store.since(since)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    deleted = []
+    if revision is not None:
+        positions = question_store.changed(positions, revision)
+        deleted = question_store.deleted_since(revision, program, subject, category, difficulty, skill, primary_class, score_band)
 
-    return {
-        "total": len(filtered),
-        "page": page,
-        "limit": limit,
-        "questions": result_questions,
+    encoding = negotiate_encoding(accept_encoding, EXPORT_ENCODINGS)
+    headers = {
+        "X-Question-Revision": question_store.revision,
+        "X-Export-Since": "full" if revision is None else since,
+        "Vary": "Accept-Encoding",
     }
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return StreamingResponse(
+        encode_chunks(export_chunks(question_store, positions, deleted, format, selected), encoding),
+        media_type=export_media_type(format),
+        headers=headers,
+    )
 
-@app.get("/questions/psat89/math", response_model=PaginatedResponse)
-def get_psat89_math_questions(
-    limit: int = Query(10, description="Number of questions to return"),
-    offset: int = Query(0, description="Starting position"),
-    page: int = Query(1, description="Page number"),
+@app.get("/questions/math", response_model=PaginatedResponse)
+def get_math_questions(
+    limit: int = Query(10, ge=0, le=MAX_PAGE_SIZE, description="Number of questions to return"),
+    offset: int = Query(0, ge=0, description="Starting position"),
+    page: int = Query(1, ge=1, description="Page number"),
     difficulty: Optional[str] = Query(None, description="Filter by difficulty (E, M, H)"),
     skill: Optional[str] = Query(None, description="Filter by skill description"),
     primary_class: Optional[str] = Query(None, description="Filter by primary class description"),
+    score_band: Optional[int] = Query(None, description="Filter by score band (1-7)"),
+    dedup: bool = Query(False, description="Only the first question of each near-duplicate cluster"),
+    fields: Optional[str] = Query(None, description='Comma-separated fields to return, or "summary" for ids, skills and difficulties only'),
 ):
-    calculated_offset = (page - 1) * limit
-    if offset > 0:
-        calculated_offset = offset
-
-    filtered = psat89_math_questions
-    if difficulty:
-        filtered = [q for q in filtered if q.get("difficulty") == difficulty]
-    if skill:
-        filtered = [q for q in filtered if skill.lower() in q.get("skill_desc", "").lower()]
-    if primary_class:
-        filtered = [q for q in filtered if primary_class.lower() in q.get("primary_class_cd_desc", "").lower()]
-
-    paginated = filtered[calculated_offset : calculated_offset + limit]
-    result_questions = [extract_question_data(q) for q in paginated]
+    return list_questions("SAT", "MATH", limit, offset, page, difficulty, skill, primary_class, score_band, dedup=dedup, fields=fields)
 
-    return {
-        "total": len(filtered),
-        "page": page,
-        "limit": limit,
-        "questions": result_questions,
-    }
+@app.get("/questions/rw", response_model=PaginatedResponse)
+def get_rw_questions(
+    limit: int = Query(10, ge=0, le=MAX_PAGE_SIZE, description="Number of questions to return"),
+    offset: int = Query(0, ge=0, description="Starting position"),
+    page: int = Query(1, ge=1, description="Page number"),
+    difficulty: Optional[str] = Query(None, description="Filter by difficulty (E, M, H)"),
+    skill: Optional[str] = Query(None, description="Filter by skill description"),
+    primary_class: Optional[str] = Query(None, description="Filter by primary class description"),
+    score_band: Optional[int] = Query(None, description="Filter by score band (1-7)"),
+    dedup: bool = Query(False, description="Only the first question of each near-duplicate cluster"),
+    fields: Optional[str] = Query(None, description='Comma-separated fields to return, or "summary" for ids, skills and difficulties only'),
+):
+    return list_questions("SAT", "RW", limit, offset, page, difficulty, skill, primary_class, score_band, dedup=dedup, fields=fields)
 
-@app.get("/questions/psat89/rw", response_model=PaginatedResponse)
-def get_psat89_rw_questions(
-    limit: int = Query(10, description="Number of questions to return"),
-    offset: int = Query(0, description="Starting position"),
-    page: int = Query(1, description="Page number"),
+@app.get("/questions/{program}/{subject}", response_model=PaginatedResponse)
+def get_questions(
+    program: str,
+    subject: str,
+    limit: int = Query(10, ge=0, le=MAX_PAGE_SIZE, description="Number of questions to return"),
+    offset: int = Query(0, ge=0, description="Starting position"),
+    page: int = Query(1, ge=1, description="Page number"),
     difficulty: Optional[str] = Query(None, description="Filter by difficulty (E, M, H)"),
     skill: Optional[str] = Query(None, description="Filter by skill description"),
     primary_class: Optional[str] = Query(None, description="Filter by primary class description"),
+    score_band: Optional[int] = Query(None, description="Filter by score band (1-7)"),
+    dedup: bool = Query(False, description="Only the first question of each near-duplicate cluster"),
+    fields: Optional[str] = Query(None, description='Comma-separated fields to return, or "summary" for ids, skills and difficulties only'),
 ):
-    calculated_offset = (page - 1) * limit
-    if offset > 0:
-        calculated_offset = offset
+    """
+    Get paginated questions from any loaded bank, e.g. /questions/psat89/rw
+    or /questions/psat10nmsqt/math. Program and subject are case-insensitive.
+    """
+    program, subject = program.upper(), subject.upper()
+    if program not in PROGRAMS or subject not in SUBJECTS:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown question bank. Programs: {', '.join(PROGRAMS)}; subjects: {', '.join(SUBJECTS)}",
+        )
+    return list_questions(program, subject, limit, offset, page, difficulty, skill, primary_class, score_band, dedup=dedup, fields=fields)
 
-    filtered = psat89_rw_questions
-    if difficulty:
-        filtered = [q for q in filtered if q.get("difficulty") == difficulty]
-    if skill:
-        filtered = [q for q in filtered if skill.lower() in q.get("skill_desc", "").lower()]
-    if primary_class:
-        filtered = [q for q in filtered if primary_class.lower() in q.get("primary_class_cd_desc", "").lower()]
+@app.get("/questions", response_model=QuestionBatchResponse)
+def get_questions_by_id(
+    ids: str = Query(..., description=f"Comma-separated questionIds or external_ids, at most {MAX_BATCH_QUESTIONS}"),
+    fields: Optional[str] = Query(None, description='Comma-separated fields to return, or "summary" for ids, skills and difficulties only'),
+):
+    """
+    Fetch a batch of questions by id, e.g. the details of the rows a summary
+    list is showing, in the order asked. Ids that aren't in any bank are
+    listed under `missing`.
+    """
+    selected = selected_fields(fields)
+    question_ids = list(dict.fromkeys(question_id.strip() for question_id in ids.split(",") if question_id.strip()))
+    if len(question_ids) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUESTIONS} ids per request")
 
-    paginated = filtered[calculated_offset : calculated_offset + limit]
-    result_questions = [extract_question_data(q) for q in paginated]
+    question_store = live_store.current
+    bodies = []
+    missing = []
+    for question_id in question_ids:
+        position = question_store.position(question_id)
+        if position is None:
+            missing.append(question_id)
+        else:
+            bodies.append(question_store.render(position, selected))
+    content = b'{"questions":[%b],"missing":%b}' % (b",".join(bodies), dump_json(missing))
+    return Response(content=content, media_type="application/json")
 
-    return {
-        "total": len(filtered),
-        "page": page,
-        "limit": limit,
-        "questions": result_questions,
+@app.get("/questions/{question_id}", response_model=Union[QuestionBasic, QuestionFields])
+def get_question(
+    question_id: str,
+    fields: Optional[str] = Query(None, description='Comma-separated fields to return, or "summary" for ids, skills and difficulties only'),
+):
+    """One question by questionId or external_id."""
+    selected = selected_fields(fields)
+    question_store = live_store.current
+    position = question_store.position(question_id)
+    if position is None:
+        raise HTTPException(status_code=404, detail="Question not found")
+    return Response(content=question_store.render(position, selected), media_type="application/json")
+
+def cached_stats_response(entry: CachedStats, if_none_match: Optional[str]) -> Response:
+    headers = {
+        "ETag": entry.etag,
+        "Cache-Control": f"public, max-age={STATS_MAX_AGE}",
+        "Vary": "Accept-Encoding",
     }
+    if if_none_match and (if_none_match.strip() == "*" or entry.etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+    return PrecompressedResponse(entry.compressed, minimum_size=COMPRESSION_MIN_SIZE, headers=headers)
 
 @app.get("/stats", response_model=StatsResponse)
-def get_stats():
+def get_stats(
+    if_none_match: Optional[str] = Header(None),
+):
     """
     Get statistics about the number of questions in the system.
     Returns total question count and breakdown by program, subject, and main category.
     """
     try:
-        with open(os.path.join(STATS_DIR, "simplified_stats.json"), "r") as f:
-            stats = json.load(f)
-        return stats
-    except FileNotFoundError:
-        # If stats file doesn't exist, generate it on the fly
-        from stats_generator import generate_stats_files
-        generate_stats_files()
-        
-        with open(os.path.join(STATS_DIR, "simplified_stats.json"), "r") as f:
-            stats = json.load(f)
-        return stats
+        entry = stats_cache.get("simplified_stats.json", StatsResponse)
+    except StatsUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving statistics: {str(e)}")
+    return cached_stats_response(entry, if_none_match)
 
 @app.get("/stats/detailed", response_model=DetailedStatsResponse)
-def get_detailed_stats():
+def get_detailed_stats(
+    if_none_match: Optional[str] = Header(None),
+):
     """
     Get detailed statistics about the number of questions in the system.
     Returns total question count and complete breakdown by program, subject, main category, and subcategory.
     """
     try:
-        with open(os.path.join(STATS_DIR, "question_stats.json"), "r") as f:
-            stats = json.load(f)
-        return stats
-    except FileNotFoundError:
-        # If stats file doesn't exist, generate it on the fly
-        from stats_generator import generate_stats_files
-        generate_stats_files()
-        
-        with open(os.path.join(STATS_DIR, "question_stats.json"), "r") as f:
-            stats = json.load(f)
-        return stats
+        entry = stats_cache.get("question_stats.json", DetailedStatsResponse)
+    except StatsUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving detailed statistics: {str(e)}")
+    return cached_stats_response(entry, if_none_match)
 
 
 @app.post("/user/attempt-question")
@@ -432,77 +829,256 @@ async def attempt_question(
     attempt: AttemptQuestionRequest,
     current_user: User = Depends(get_current_user)
 ):
-    all_questions = math_questions + rw_questions + psat89_math_questions + psat89_rw_questions
-    question = None
-    for q in all_questions:
-        if q.get("questionId") == attempt.question_id:
-            question = q
-            break
-    
-    if not question:
+    question_store = live_store.current
+    position = question_store.position(attempt.question_id)
+    if position is None:
         raise HTTPException(status_code=404, detail="Question not found")
     
-    is_correct = sorted(attempt.selected_answer) == sorted(question.get("correct_answer", []))
+    is_correct = sorted(attempt.selected_answer) == sorted(question_store.correct_answer(position))
+    # The same question may be asked for by questionId or external_id; record it under one
+    question_id = question_store.canonical_id(position)
     
     data = {
         "user_id": current_user.id,
-        "question_id": attempt.question_id,
+        "question_id": question_id,
         "selected_answer": attempt.selected_answer,
         "is_correct": is_correct,
         "created_at": datetime.now().isoformat()
     }
     
-    result = supabase.table("attempted_questions").upsert(data).execute()
-    
-    if not result.data:
+    try:
+        attempt_ingest.submit(data)
+    except Exception as e:
+        log_event(logger, logging.ERROR, "attempts.spool_failed", user_id=current_user.id, error=str(e))
         raise HTTPException(status_code=500, detail="Failed to record question attempt")
+    progress_tracker.record(question_store, current_user.id, question_id, is_correct)
     
     return {"success": True, "is_correct": is_correct}
 
+@app.post("/user/attempt-questions", response_model=AttemptQuestionsResponse)
+async def attempt_questions(
+    batch: AttemptQuestionsRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Grade a whole practice set at once: each attempt's correctness, plus the
+    set's score overall, by main category and by difficulty. The attempts
+    are recorded together, as if each had been sent to
+    /user/attempt-question. Ids that aren't in any bank are listed under
+    `missing` and not recorded.
+    """
+    if len(batch.attempts) > MAX_BATCH_ATTEMPTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_ATTEMPTS} attempts per request")
+
+    question_store = live_store.current
+    created_at = datetime.now().isoformat()
+    rows = []
+    results = []
+    graded = []
+    missing = []
+    for attempt in batch.attempts:
+        position = question_store.position(attempt.question_id)
+        if position is None:
+            missing.append(attempt.question_id)
+            continue
+        is_correct = sorted(attempt.selected_answer) == sorted(question_store.correct_answer(position))
+        rows.append({
+            "user_id": current_user.id,
+            "question_id": question_store.canonical_id(position),
+            "selected_answer": attempt.selected_answer,
+            "is_correct": is_correct,
+            "created_at": created_at,
+        })
+        results.append({"question_id": attempt.question_id, "is_correct": is_correct})
+        graded.append((position, is_correct))
+
+    if rows:
+        try:
+            attempt_ingest.submit_many(rows)
+        except Exception as e:
+            log_event(logger, logging.ERROR, "attempts.spool_failed", user_id=current_user.id, attempts=len(rows), error=str(e))
+            raise HTTPException(status_code=500, detail="Failed to record question attempts")
+        progress_tracker.record_many(question_store, current_user.id, ((row["question_id"], row["is_correct"]) for row in rows))
+
+    return {
+        "success": True,
+        "results": results,
+        "missing": missing,
+        **score_outcomes(question_store, graded, BATCH_SCORE_FACETS),
+    }
+
 @app.get("/user/attempted", response_model=PaginatedAuthResponse)
 async def get_attempted_questions(
-    limit: int = Query(10, description="Number of questions to return"),
+    limit: int = Query(10, ge=1, description="Number of questions to return"),
     offset: int = Query(0, description="Starting position"),
     page: int = Query(1, description="Page number"),
     is_correct: Optional[bool] = Query(None, description="Filter by correctness"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page; overrides offset and page"),
     current_user: User = Depends(get_current_user)
 ):
+    """
+    The user's attempted questions, newest first. Follow `next_cursor` to
+    page through long histories; offset/page still work but get slower the
+    deeper they go.
+    """
+    after = None
     calculated_offset = (page - 1) * limit
     if offset > 0:
         calculated_offset = offset
+    if cursor:
+        after = decode_attempt_cursor(cursor)
+        calculated_offset = 0
     
-    query = supabase.table("attempted_questions").select("*").eq("user_id", current_user.id)
-    
-    if is_correct is not None:
-        query = query.eq("is_correct", is_correct)
+    total_attempted, attempts = await asyncio.gather(
+        db.count_attempts(current_user.id, is_correct),
+        db.list_attempts(current_user.id, is_correct, limit, calculated_offset, after),
+    )
+    last = attempts[-1] if len(attempts) == limit else None
+    # Attempts this worker accepted but hasn't written yet are the newest, so
+    # they lead the first page, and a re-attempt replaces its written row on
+    # whichever page that falls
+    latest: Dict[str, Dict[str, Any]] = {}
+    for row in attempt_ingest.pending_rows(current_user.id):
+        latest.pop(row["question_id"], None)
+        latest[row["question_id"]] = row
+    if latest:
+        spooled = [row for row in reversed(latest.values()) if is_correct is None or row["is_correct"] == is_correct]
+        replaced = await db.count_attempts(current_user.id, is_correct, list(latest))
+        total_attempted += len(spooled) - replaced
+        attempts = [item for item in attempts if item["question_id"] not in latest]
+        if after is None and calculated_offset == 0:
+            attempts = spooled + attempts
+            if len(attempts) > limit:
+                attempts = attempts[:limit]
+                last = attempts[-1]
     
-    count_response = query.execute()
-    total_attempted = len(count_response.data)
-    
-    result = query.range(calculated_offset, calculated_offset + limit - 1).execute()
-    
-    attempted_ids = [item["question_id"] for item in result.data]
-    attempted_map = {item["question_id"]: item["selected_answer"] for item in result.data}
-    
-    all_questions = math_questions + rw_questions + psat89_math_questions + psat89_rw_questions
+    question_store = live_store.current
     matching_questions = []
     
-    for question_id in attempted_ids:
-        for q in all_questions:
-            if q.get("questionId") == question_id:
-                question_data = extract_question_data(q)
-                question_data["attempted"] = True
-                question_data["user_answer"] = attempted_map[question_id]
-                matching_questions.append(question_data)
-                break
+    for item in attempts:
+        position = question_store.position(item["question_id"])
+        if position is not None:
+            question_data = question_store.question_data(position)
+            question_data["attempted"] = True
+            question_data["user_answer"] = item["selected_answer"]
+            matching_questions.append(question_data)
+    
+    next_cursor = None
+    if last is not None:
+        next_cursor = encode_attempt_cursor(last)
     
     return {
         "total": total_attempted,
         "page": page,
         "limit": limit,
         "questions": matching_questions,
+        "next_cursor": next_cursor,
+    }
+
+@app.get("/user/progress", response_model=ProgressResponse)
+async def get_progress(
+    program: Optional[str] = Query(None, description="Only count this program (SAT, PSAT89 or PSAT10NMSQT)", enum=list(PROGRAMS)),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    The user's attempted/correct counts and accuracy overall and by program,
+    subject, main category, subcategory, difficulty and score band. A
+    re-attempted question counts once, with its latest answer.
+    """
+    if program is not None and program not in PROGRAMS:
+        raise HTTPException(status_code=400, detail=f"Invalid program. Use one of: {', '.join(PROGRAMS)}.")
+    
+    progress = await load_progress(current_user.id)
+    return progress_tracker.summary(progress, live_store.current, program)
+
+@app.get("/user/next-questions", response_model=NextQuestionsResponse)
+async def get_next_questions(
+    program: str = Query("SAT", description="Program (SAT, PSAT89 or PSAT10NMSQT)", enum=list(PROGRAMS)),
+    subject: Optional[str] = Query(None, description="Subject (MATH or RW)", enum=list(SUBJECTS)),
+    category: Optional[str] = Query(None, description="Main category, e.g. Algebra"),
+    difficulty: Optional[str] = Query(None, description="Filter by difficulty (E, M, H)"),
+    skill: Optional[str] = Query(None, description="Filter by skill description"),
+    primary_class: Optional[str] = Query(None, description="Filter by primary class description"),
+    score_band: Optional[int] = Query(None, description="Filter by score band range code"),
+    strategy: str = Query("random", description="random, or weakest to favour the user's weakest skills", enum=list(SELECTION_STRATEGIES)),
+    count: int = Query(1, ge=1, le=MAX_NEXT_QUESTIONS, description="Number of questions to return"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Active questions matching the filters that the user hasn't attempted yet,
+    picked at random or weighted towards the skills they get wrong most.
+    """
+    if program not in PROGRAMS:
+        raise HTTPException(status_code=400, detail=f"Invalid program. Use one of: {', '.join(PROGRAMS)}.")
+    if strategy not in SELECTION_STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"Invalid strategy. Use one of: {', '.join(SELECTION_STRATEGIES)}.")
+    
+    question_store = live_store.current
+    progress = progress_tracker.current(await load_progress(current_user.id), question_store)
+    selectable, selectable_bits = question_store.selectable(
+        program=program,
+        subject=subject.upper() if subject else None,
+        category=category,
+        difficulty=difficulty,
+        skill=skill,
+        primary_class=primary_class,
+        score_band=score_band,
+    )
+    positions, remaining = select_questions(
+        question_store,
+        selectable,
+        selectable_bits,
+        progress.attempted,
+        count,
+        strategy,
+        progress.scores("skill_desc", program),
+    )
+    return {
+        "remaining": remaining,
+        "questions": [question_store.question_data(position) for position in positions],
     }
 
+async def load_progress(user_id: str) -> UserProgress:
+    progress = progress_tracker.get(user_id)
+    CACHE_LOOKUPS.inc(cache="progress", result="miss" if progress is None else "hit")
+    if progress is None:
+        # Attempts this worker accepted but hasn't written yet aren't in the
+        # backend. The spool is read on both sides of the backend read: a row
+        # the flusher writes while that read runs can be missing from its
+        # result and from a later snapshot alike, and a row submitted
+        # meanwhile is only in the later one. Spooled rows are deduped by
+        # question_id, the later snapshot winning, and override the backend's
+        # since they're newer.
+        before = attempt_ingest.pending_rows(user_id)
+        rows = await db.list_attempt_outcomes(user_id)
+        spooled = {row["question_id"]: row for row in before + attempt_ingest.pending_rows(user_id)}
+        rows = rows + list(spooled.values())
+        progress = progress_tracker.load(user_id, ((row["question_id"], row["is_correct"]) for row in rows))
+    return progress
+
+# What a cursor may hold: an attempt's created_at as stored (ISO 8601, with or
+# without fractional seconds and offset) and a questionId or external_id
+CURSOR_TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d{1,6})?(Z|[+-]\d{2}:\d{2})?")
+CURSOR_QUESTION_ID = re.compile(r"[A-Za-z0-9-]+")
+
+def encode_attempt_cursor(attempt: Dict[str, Any]) -> str:
+    key = json.dumps([attempt["created_at"], attempt["question_id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(key.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_attempt_cursor(cursor: str) -> Tuple[str, str]:
+    # Both values end up inside a PostgREST filter expression, so anything that
+    # isn't plainly a timestamp and an id is rejected here
+    try:
+        created_at, question_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(created_at, str) or not isinstance(question_id, str):
+            raise ValueError(cursor)
+        if not CURSOR_TIMESTAMP.fullmatch(created_at) or not CURSOR_QUESTION_ID.fullmatch(question_id):
+            raise ValueError(cursor)
+        datetime.fromisoformat(created_at)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, question_id
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
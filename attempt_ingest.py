@@ -0,0 +1,250 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from structured_log import get_logger, log_event
+
+logger = get_logger("attempt_ingest")
+
+
+class AttemptIngest:
+    """
+    Write-behind pipeline for graded question attempts.
+
+    `submit()` appends the attempt to a local append-only spool file and
+    returns; a background thread flushes pending attempts to storage with
+    multi-row upserts once `batch_size` attempts are waiting or the oldest
+    has waited `flush_interval` seconds. Each flush rotates the spool into a
+    segment that is deleted only after its rows were written, so attempts
+    acknowledged before a crash are replayed on the next start. Upserts are
+    idempotent, so replaying an already-written segment is harmless.
+
+    Every process spools to its own file (`attempts-<pid>.log`) and on start
+    also adopts segments left behind by processes that no longer exist.
+    """
+
+    def __init__(
+        self,
+        write_rows: Callable[[List[Dict[str, Any]]], Any],
+        spool_dir: str,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        fsync: bool = False,
+        retry_interval: float = 5.0,
+    ):
+        self.write_rows = write_rows
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.retry_interval = retry_interval
+
+        self._pending: List[Dict[str, Any]] = []
+        self._flushing: List[Dict[str, Any]] = []
+        self._oldest_pending: Optional[float] = None
+        self._segments: List[str] = []
+        self._spool = None
+        self._spool_path: Optional[str] = None
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._deadline: Optional[float] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def pending_rows(self, user_id: str) -> List[Dict[str, Any]]:
+        """Attempts by `user_id` accepted by this process but not yet written."""
+        with self._condition:
+            return [row for row in self._flushing + self._pending if row["user_id"] == user_id]
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._spool_path = os.path.join(self.spool_dir, f"attempts-{os.getpid()}.log")
+        self._recover()
+        self._spool = open(self._spool_path, "a", encoding="utf-8")
+        self._stopping = False
+        self._deadline = None
+        self._thread = threading.Thread(target=self._run, name="attempt-ingest", daemon=True)
+        self._thread.start()
+
+    def submit(self, row: Dict[str, Any]) -> None:
+        """Durably queue one attempt row; raises if it can't be spooled."""
+        self.submit_many([row])
+
+    def submit_many(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Durably queue several attempt rows with a single spool write (and
+        fsync); raises if they can't be spooled.
+        """
+        lines = "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows)
+        with self._condition:
+            self._spool.write(lines)
+            self._spool.flush()
+            if self.fsync:
+                os.fsync(self._spool.fileno())
+            self._pending.extend(rows)
+            if self._oldest_pending is None:
+                # Wake the flusher so it starts timing this batch
+                self._oldest_pending = time.monotonic()
+                self._condition.notify()
+            elif len(self._pending) >= self.batch_size:
+                self._condition.notify()
+
+    def flush(self) -> int:
+        """Write everything pending now. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._condition:
+                rows = self._pending
+                if not rows:
+                    return 0
+                self._pending = []
+                self._flushing = rows
+                self._oldest_pending = None
+                self._segments.append(self._rotate())
+                segments = list(self._segments)
+
+            try:
+                for start in range(0, len(rows), self.batch_size):
+                    if self._deadline is not None and time.monotonic() >= self._deadline:
+                        raise TimeoutError(f"{len(rows) - start} attempts left spooled at the drain deadline")
+                    self.write_rows(_last_per_key(rows[start : start + self.batch_size]))
+            except Exception:
+                with self._condition:
+                    self._pending = rows + self._pending
+                    self._flushing = []
+                    self._oldest_pending = time.monotonic()
+                raise
+
+            with self._condition:
+                self._flushing = []
+                for segment in segments:
+                    _remove(segment)
+                self._segments = [segment for segment in self._segments if segment not in segments]
+            return len(rows)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop the flusher and drain whatever is still pending. With `timeout`,
+        no batch is started after that many seconds; a batch already being
+        written finishes first, so `write_rows` should bound its own calls.
+        Rows left unwritten stay in the spool for the next start to replay,
+        and TimeoutError is raised.
+        """
+        with self._condition:
+            self._stopping = True
+            if timeout is not None:
+                self._deadline = time.monotonic() + timeout
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            self.flush()
+        finally:
+            with self._condition:
+                if self._spool is not None:
+                    self._spool.close()
+                    self._spool = None
+                if not self._pending and os.path.exists(self._spool_path) and not os.path.getsize(self._spool_path):
+                    _remove(self._spool_path)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._stopping and not self._due():
+                    timeout = None
+                    if self._oldest_pending is not None:
+                        timeout = max(0.0, self._oldest_pending + self.flush_interval - time.monotonic())
+                    self._condition.wait(timeout)
+                if self._stopping:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                log_event(logger, logging.ERROR, "attempts.flush_failed", pending=self.pending, retry_in=self.retry_interval, error=str(e))
+                with self._condition:
+                    # Woken early by stop(), which drains what's left itself
+                    if not self._stopping:
+                        self._condition.wait(self.retry_interval)
+
+    def _due(self) -> bool:
+        if len(self._pending) >= self.batch_size:
+            return True
+        return self._oldest_pending is not None and time.monotonic() - self._oldest_pending >= self.flush_interval
+
+    def _rotate(self) -> str:
+        # Called with the condition held: the spooled rows become a segment
+        # and new submissions go to a fresh spool file
+        self._spool.close()
+        segment = self._next_segment()
+        os.replace(self._spool_path, segment)
+        self._spool = open(self._spool_path, "a", encoding="utf-8")
+        return segment
+
+    def _next_segment(self) -> str:
+        # Skips names still taken by segments an earlier process with this
+        # pid (or this one, stopped before it could drain) left behind
+        while True:
+            self._sequence += 1
+            segment = f"{self._spool_path}.{self._sequence}.segment"
+            if not os.path.exists(segment):
+                return segment
+
+    def _recover(self) -> None:
+        """Adopt spool files and segments this process or a dead one left behind."""
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, "attempts-*.log*"))):
+            owner = os.path.basename(path).split(".")[0].split("-")[-1]
+            if owner.isdigit() and int(owner) != os.getpid() and _process_alive(int(owner)):
+                continue
+            adopted = self._next_segment()
+            try:
+                os.replace(path, adopted)
+            except FileNotFoundError:
+                # Another process adopted it first
+                continue
+            with open(adopted, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self._pending.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-write
+                        continue
+            self._segments.append(adopted)
+        if self._pending:
+            self._oldest_pending = time.monotonic()
+            log_event(logger, logging.WARNING, "attempts.recovered", rows=len(self._pending), segments=len(self._segments))
+
+
+def _last_per_key(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # One upsert statement can't touch the same row twice; the latest attempt wins
+    latest = {}
+    for row in rows:
+        latest[(row["user_id"], row["question_id"])] = row
+    return list(latest.values())
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,385 @@
+"""
+Latency and throughput benchmark for the API's hot paths.
+
+Runs from the repository root:
+
+    python benchmarks/api_latency.py [--targets inprocess,uvicorn,gunicorn]
+        [--scales 1,4] [--requests 300] [--concurrency 8]
+        [--scenarios list_rw,search,...] [--output results.json]
+        [--baseline previous.json --max-regression 0.25]
+
+Every scenario (an endpoint plus a filter mix, see SCENARIOS) is run
+against each target at each bank scale:
+
+  - "inprocess": the ASGI app called directly through httpx's ASGI
+    transport, in a child process; measures the app without a network hop.
+  - "uvicorn": one uvicorn process on a local port.
+  - "gunicorn": `--workers` uvicorn workers under gunicorn.conf.py.
+
+The app is bench_app.py: the in-memory backend seeded with benchmark users,
+so no request reaches Supabase. Scale 1 serves the banks in data/; scale N
+serves a copy with every question repeated N times under new ids.
+
+Reports, as JSON on stdout (and in --output): per target, scale and
+scenario, p50/p90/p99/max latency in ms, throughput in requests/s, the
+number of non-2xx responses, mean response size on the wire, and the RSS of each
+serving process afterwards. With --baseline, a scenario whose p99 grew or
+whose throughput dropped by more than --max-regression is listed under
+"regressions" and the script exits with status 1, so a deploy can be gated
+on it.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import jwt
+
+from worker_memory import ROOT, smaps_rollup, worker_pids
+
+sys.path.insert(0, ROOT)
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+JWT_SECRET = "benchmark-secret-benchmark-secret"
+
+# name -> (method, path, authenticated); POSTs attempt a random question, or
+# a random 27-question module for /user/attempt-questions
+SCENARIOS = {
+    "root": ("GET", "/", False),
+    "list_rw": ("GET", "/questions/rw?limit=10", False),
+    "list_rw_summary": ("GET", "/questions/rw?limit=50&fields=summary", False),
+    "list_rw_filtered": ("GET", "/questions/rw?limit=50&difficulty=H&skill=words", False),
+    "list_bank_page": ("GET", "/questions/psat89/rw?limit=100&page=3", False),
+    "list_by_category": ("GET", "/questions/by-category/Craft%20and%20Structure?program=SAT&limit=20", False),
+    "list_dedup": ("GET", "/questions/rw?limit=50&dedup=true", False),
+    "search": ("GET", "/questions/search?q=author&limit=10", False),
+    "search_phrase": ("GET", "/questions/search?q=%22main%20idea%22&subject=RW&limit=10", False),
+    "export": ("GET", "/questions/export?program=SAT", False),
+    "stats": ("GET", "/stats", False),
+    "stats_detailed": ("GET", "/stats/detailed", False),
+    "user_attempted": ("GET", "/user/attempted?limit=50", True),
+    "user_progress": ("GET", "/user/progress", True),
+    "user_next_questions": ("GET", "/user/next-questions?strategy=weakest&count=10", True),
+    "attempt_question": ("POST", "/user/attempt-question", True),
+    "attempt_module": ("POST", "/user/attempt-questions", True),
+}
+
+
+def _env(workdir):
+    env = dict(os.environ)
+    env.update({
+        "DATA_BACKEND": "memory",
+        "SUPABASE_JWT_SECRET": JWT_SECRET,
+        "PYTHONPATH": os.pathsep.join([BENCHMARKS, ROOT, env.get("PYTHONPATH", "")]),
+        "ATTEMPT_SPOOL_DIR": os.path.join(workdir, "spool"),
+        "QUESTION_STORE_RELOAD_INTERVAL": "0",
+        # The app's JSON logs go to stderr too; only warnings, so progress stays readable
+        "LOG_LEVEL": env.get("LOG_LEVEL", "WARNING"),
+    })
+    return env
+
+
+def prepare_workdir(scale):
+    """A directory to serve from: the repository itself at scale 1, else a scaled copy of its banks."""
+    if scale == 1:
+        workdir = ROOT
+    else:
+        from question_store import discover_banks
+
+        workdir = tempfile.mkdtemp(prefix=f"bench-x{scale}-")
+        os.makedirs(os.path.join(workdir, "data"))
+        shutil.copy(os.path.join(ROOT, "lookup.json"), workdir)
+        for path in discover_banks(os.path.join(ROOT, "data")).values():
+            with open(path) as f:
+                questions = json.load(f)
+            scaled = []
+            for copy in range(scale):
+                for question in questions:
+                    question = dict(question)
+                    if copy:
+                        question["questionId"] = f"{question['questionId']}-x{copy}"
+                    scaled.append(question)
+            with open(os.path.join(workdir, "data", os.path.basename(path)), "w") as f:
+                json.dump(scaled, f)
+    # Compile the store and stats up front so no scenario times a rebuild
+    subprocess.check_call(
+        [sys.executable, "-c", "import question_store, stats_generator; question_store.load_question_store(); "
+         "import os; os.path.exists('total_questions/question_stats.json') or stats_generator.generate_stats_files('total_questions')"],
+        cwd=workdir,
+        env=_env(workdir),
+        stdout=subprocess.DEVNULL,
+    )
+    return workdir
+
+
+def token(user_index):
+    claims = {"sub": f"bench-{user_index}", "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)}
+    return jwt.encode(claims, JWT_SECRET, algorithm="HS256")
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+async def run_scenario(client, name, question_ids, requests, concurrency, warmup, users, accept_encoding):
+    method, path, authenticated = SCENARIOS[name]
+    rng = random.Random(name)
+    tokens = [token(index) for index in range(users)]
+
+    async def one():
+        headers = {"Accept-Encoding": accept_encoding}
+        if authenticated:
+            headers["Authorization"] = f"Bearer {rng.choice(tokens)}"
+        body = None
+        if path == "/user/attempt-questions":
+            body = {"attempts": [{"question_id": question_id, "selected_answer": ["A"]} for question_id in rng.sample(question_ids, 27)]}
+        elif method == "POST":
+            body = {"question_id": rng.choice(question_ids), "selected_answer": ["A"]}
+        started = time.perf_counter()
+        response = await client.request(method, path, headers=headers, json=body)
+        elapsed = time.perf_counter() - started
+        return elapsed, response.status_code, response.num_bytes_downloaded
+
+    for _ in range(warmup):
+        await one()
+
+    latencies, errors, sizes = [], 0, 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors, sizes
+        while remaining > 0:
+            remaining -= 1
+            elapsed, status, size = await one()
+            latencies.append(elapsed)
+            sizes += size
+            if not 200 <= status < 300:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p90_ms": round(percentile(latencies, 0.90) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else 0.0,
+        "mean_wire_bytes": sizes // max(len(latencies), 1),
+    }
+
+
+async def drive(client, args, question_ids, rss):
+    results = {}
+    for name in args.scenarios:
+        results[name] = await run_scenario(
+            client, name, question_ids, args.requests, args.concurrency, args.warmup, args.users, args.accept_encoding
+        )
+        results[name]["rss_kb"] = rss()
+        print(f"  {name}: p50 {results[name]['p50_ms']}ms p99 {results[name]['p99_ms']}ms "
+              f"{results[name]['throughput_rps']} req/s", file=sys.stderr)
+    return results
+
+
+def question_ids_in(workdir):
+    from question_store import QuestionStore
+
+    store_path = os.environ.get("QUESTION_STORE_PATH", os.path.join(workdir, "data", "questions.bin"))
+    return [question_id for question_id in QuestionStore(store_path).question_ids if question_id]
+
+
+def inprocess_child(args):
+    """Runs inside the child process started by run_inprocess, from the served directory."""
+    import httpx
+
+    import bench_app
+
+    async def main():
+        await bench_app.app.router.startup()
+        try:
+            transport = httpx.ASGITransport(app=bench_app.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                question_ids = [question_id for question_id in bench_app.api.live_store.current.question_ids if question_id]
+                return await drive(client, args, question_ids, lambda: [_self_rss_kb()])
+        finally:
+            await bench_app.app.router.shutdown()
+
+    results = asyncio.run(main())
+    with open(args.child_output, "w") as f:
+        json.dump(results, f)
+
+
+def run_inprocess(args, workdir):
+    with tempfile.NamedTemporaryFile(suffix=".json") as output:
+        command = [sys.executable, os.path.abspath(__file__), "--child-output", output.name] + _passthrough(args)
+        # stdout carries this process's JSON report, so nothing the child prints
+        # may end up there; its stderr carries the per-scenario progress lines
+        subprocess.check_call(command, cwd=workdir, env=_env(workdir), stdout=subprocess.DEVNULL)
+        with open(output.name) as f:
+            return json.load(f)
+
+
+def run_server(args, workdir, target):
+    import httpx
+
+    port = args.port
+    if target == "uvicorn":
+        command = [sys.executable, "-m", "uvicorn", "bench_app:app", "--port", str(port), "--log-level", "warning"]
+    else:
+        command = [
+            sys.executable, "-m", "gunicorn", "-c", os.path.join(ROOT, "gunicorn.conf.py"),
+            "-w", str(args.workers), "--bind", f"127.0.0.1:{port}", "bench_app:app",
+        ]
+    server = subprocess.Popen(command, cwd=workdir, env=_env(workdir), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_ready(port, server, args.workers if target == "gunicorn" else 0)
+        pids = worker_pids(server.pid) if target == "gunicorn" else [server.pid]
+
+        async def main():
+            limits = httpx.Limits(max_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+                return await drive(client, args, question_ids_in(workdir), lambda: [smaps_rollup(pid)["rss_kb"] for pid in pids])
+
+        return asyncio.run(main())
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def _wait_ready(port, server, workers):
+    deadline = time.time() + 120
+    while True:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with status {server.returncode}")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1).read()
+            if not workers or len(worker_pids(server.pid)) == workers:
+                return
+        except OSError:
+            pass
+        if time.time() > deadline:
+            raise RuntimeError("server did not become ready")
+        time.sleep(0.2)
+
+
+def _self_rss_kb():
+    with open("/proc/self/status") as f:
+        return int(f.read().split("VmRSS:")[1].split()[0])
+
+
+def _passthrough(args):
+    return [
+        "--scenarios", ",".join(args.scenarios),
+        "--requests", str(args.requests),
+        "--concurrency", str(args.concurrency),
+        "--warmup", str(args.warmup),
+        "--users", str(args.users),
+        "--accept-encoding", args.accept_encoding,
+    ]
+
+
+def regressions(results, baseline, max_regression):
+    """Scenarios whose p99 or throughput got more than `max_regression` worse than in `baseline`."""
+    found = []
+    for target, scales in results["results"].items():
+        for scale, scenarios in scales.items():
+            for name, current in scenarios.items():
+                previous = baseline.get("results", {}).get(target, {}).get(scale, {}).get(name)
+                if not previous:
+                    continue
+                if previous["p99_ms"] and current["p99_ms"] > previous["p99_ms"] * (1 + max_regression):
+                    found.append({"target": target, "scale": scale, "scenario": name, "metric": "p99_ms",
+                                  "baseline": previous["p99_ms"], "current": current["p99_ms"]})
+                if current["throughput_rps"] < previous["throughput_rps"] * (1 - max_regression):
+                    found.append({"target": target, "scale": scale, "scenario": name, "metric": "throughput_rps",
+                                  "baseline": previous["throughput_rps"], "current": current["throughput_rps"]})
+                if current["errors"] > previous["errors"]:
+                    found.append({"target": target, "scale": scale, "scenario": name, "metric": "errors",
+                                  "baseline": previous["errors"], "current": current["errors"]})
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", default="inprocess,uvicorn,gunicorn")
+    parser.add_argument("--scales", default="1")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=300, help="timed requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--users", type=int, default=50, help="distinct users the authenticated scenarios rotate through")
+    parser.add_argument("--accept-encoding", default="gzip, br")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--output", help="also write the JSON results here")
+    parser.add_argument("--baseline", help="results from an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    parser.add_argument("--child-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.scenarios = [name for name in args.scenarios.split(",") if name]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    if args.child_output:
+        inprocess_child(args)
+        return
+
+    os.environ["BENCH_USERS"] = str(args.users)
+    results = {
+        "settings": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "accept_encoding": args.accept_encoding,
+            "gunicorn_workers": args.workers,
+            "python": sys.version.split()[0],
+            "cpus": os.cpu_count(),
+        },
+        "results": {},
+    }
+    for scale in [int(scale) for scale in args.scales.split(",")]:
+        workdir = prepare_workdir(scale)
+        try:
+            for target in args.targets.split(","):
+                print(f"{target} x{scale}", file=sys.stderr)
+                if target == "inprocess":
+                    scenarios = run_inprocess(args, workdir)
+                elif target in ("uvicorn", "gunicorn"):
+                    scenarios = run_server(args, workdir, target)
+                else:
+                    parser.error(f"unknown target: {target}")
+                results["results"].setdefault(target, {})[f"x{scale}"] = scenarios
+        finally:
+            if workdir != ROOT:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            results["regressions"] = regressions(results, json.load(f), args.max_regression)
+        status = 1 if results["regressions"] else 0
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    json.dump(results, sys.stdout, indent=2)
+    print()
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
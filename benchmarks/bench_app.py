@@ -0,0 +1,51 @@
+"""
+The API wired to the in-memory backend and seeded with benchmark users, so
+api_latency.py can drive the user endpoints without Supabase.
+
+Serve it like the real app from a directory holding `data/` and
+`lookup.json`, with this directory and the repository root on PYTHONPATH:
+
+    DATA_BACKEND=memory SUPABASE_JWT_SECRET=benchmark gunicorn bench_app:app
+
+BENCH_USERS users (default 50) named bench-0, bench-1, ... each get
+BENCH_ATTEMPTS attempts (default 200) on questions picked with a fixed seed,
+so every worker and every run starts from the same rows.
+"""
+import os
+import random
+
+os.environ["DATA_BACKEND"] = "memory"
+
+import app as api  # noqa: E402
+
+app = api.app
+
+BENCH_USERS = int(os.environ.get("BENCH_USERS", "50"))
+BENCH_ATTEMPTS = int(os.environ.get("BENCH_ATTEMPTS", "200"))
+
+
+def user_id(index: int) -> str:
+    return f"bench-{index}"
+
+
+def seed(backend, store, users: int = BENCH_USERS, attempts: int = BENCH_ATTEMPTS) -> None:
+    rng = random.Random(1600)
+    question_ids = [question_id for question_id in dict.fromkeys(store.question_ids) if question_id]
+    rows = []
+    for index in range(users):
+        backend.add_user(user_id(index), f"{user_id(index)}@example.com", "2024-01-01T00:00:00")
+        for second, question_id in enumerate(rng.sample(question_ids, min(attempts, len(question_ids)))):
+            position = store.position(question_id)
+            correct = store.correct_answer(position)
+            is_correct = rng.random() < 0.6
+            rows.append({
+                "user_id": user_id(index),
+                "question_id": question_id,
+                "selected_answer": correct if is_correct else ["?"],
+                "is_correct": is_correct,
+                "created_at": f"2024-01-01T{second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}",
+            })
+    backend.upsert_attempts(rows)
+
+
+seed(api.db.backend, api.live_store.current)
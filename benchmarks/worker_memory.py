@@ -0,0 +1,146 @@
+"""
+Per-worker memory benchmark for the question store.
+
+Runs from the repository root:
+
+    python benchmarks/worker_memory.py [--workers 4] [--port 8765]
+
+Reports, as JSON on stdout:
+  - "process": RSS of a bare interpreter after holding every bank as parsed
+    `json.load` trees (how app.py used to load them) versus after opening
+    the compiled question store.
+  - "gunicorn": RSS, PSS and USS (private pages) of each worker with the
+    store preloaded in the master versus imported in every worker.
+    PSS splits shared pages between the processes mapping them, so it is
+    the fair number for "memory per worker".
+
+SUPABASE_* variables default to dummy values; no request reaches Supabase.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+JSON_TREES = """
+import json
+from question_store import discover_banks
+banks = [json.load(open(path)) for path in discover_banks("data").values()]
+"""
+
+COMPILED_STORE = """
+from question_store import load_question_store
+store = load_question_store()
+for position in range(len(store)):
+    store.body(position)
+"""
+
+REPORT_RSS = """
+import gc
+gc.collect()
+print(open("/proc/self/status").read().split("VmRSS:")[1].split()[0])
+"""
+
+WARM_PATHS = [
+    "/questions/rw?limit=100",
+    "/questions/psat89/rw?limit=100&difficulty=H",
+    "/questions/psat10nmsqt/rw?limit=100&skill=words",
+]
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+    env.setdefault("SUPABASE_KEY", "benchmark")
+    env.setdefault("SUPABASE_JWT_SECRET", "benchmark")
+    return env
+
+
+def process_rss_kb(setup):
+    output = subprocess.check_output([sys.executable, "-c", setup + REPORT_RSS], cwd=ROOT, env=_env())
+    return int(output.split()[-1])
+
+
+def smaps_rollup(pid):
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss_kb": fields.get("Rss", 0),
+        "pss_kb": fields.get("Pss", 0),
+        "uss_kb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def worker_pids(master_pid):
+    with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def gunicorn_workers(workers, port, preload):
+    env = _env()
+    env["QUESTION_STORE_PRELOAD"] = "1" if preload else "0"
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-w", str(workers), "--bind", f"127.0.0.1:{port}", "app:app"],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1).read()
+                if len(worker_pids(master.pid)) == workers:
+                    break
+            except OSError:
+                pass
+            if time.time() > deadline:
+                raise RuntimeError("gunicorn did not become ready")
+            time.sleep(0.2)
+        # Several rounds so every worker most likely served each path
+        for _ in range(workers * 3):
+            for path in WARM_PATHS:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}{path}").read()
+        return [smaps_rollup(pid) for pid in worker_pids(master.pid)]
+    finally:
+        master.terminate()
+        master.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    baseline = process_rss_kb("")
+    results = {
+        "process": {
+            "interpreter_rss_kb": baseline,
+            "json_trees_rss_kb": process_rss_kb(JSON_TREES),
+            "compiled_store_rss_kb": process_rss_kb(COMPILED_STORE),
+        },
+        "gunicorn": {},
+    }
+    for preload in (False, True):
+        per_worker = gunicorn_workers(args.workers, args.port, preload)
+        results["gunicorn"]["preload" if preload else "per_worker_import"] = {
+            "workers": per_worker,
+            "mean_pss_kb": sum(w["pss_kb"] for w in per_worker) // len(per_worker),
+            "mean_uss_kb": sum(w["uss_kb"] for w in per_worker) // len(per_worker),
+        }
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import gzip
+import zlib
+from typing import Any, Dict, Iterable, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Encodings this process can produce, in order of preference
+AVAILABLE_ENCODINGS = tuple(
+    encoding
+    for encoding, module in (("br", brotli), ("zstd", zstandard), ("gzip", gzip))
+    if module is not None
+)
+
+# Compression levels for bodies compressed once and served many times
+# (precompressed pages and stats) and for bodies compressed per response
+PRECOMPRESSED_LEVELS = {"br": 11, "zstd": 19, "gzip": 9}
+DYNAMIC_LEVELS = {"br": 4, "zstd": 3, "gzip": 6}
+
+# Content types worth compressing; images and already-compressed data aren't
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def negotiate_encoding(accept_encoding: Optional[str], supported: Iterable[str] = AVAILABLE_ENCODINGS) -> Optional[str]:
+    """
+    The first of `supported` (and installed) that the Accept-Encoding header
+    allows, or None to send the body as is. Codings with q=0 are refused and
+    "*" accepts anything not listed.
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+    for encoding in supported:
+        if encoding in AVAILABLE_ENCODINGS and weights.get(encoding, weights.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    if level is None:
+        level = DYNAMIC_LEVELS[encoding]
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+class StreamCompressor:
+    """
+    Incremental compressor for a body sent in chunks. `compress()` returns
+    whatever output is ready (possibly nothing), `flush()` forces out
+    everything compressed so far, and `finish()` ends the stream.
+    """
+
+    def __init__(self, encoding: str, level: Optional[int] = None):
+        if level is None:
+            level = DYNAMIC_LEVELS[encoding]
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=level)
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            # wbits=31 writes a gzip header and trailer around the deflate stream
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(chunk)
+        return self._compressor.compress(chunk)
+
+    def flush(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.flush()
+        if self.encoding == "zstd":
+            return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class CompressedBody:
+    """
+    A cacheable response body plus its compressed variants, each made once
+    (at the precompressed levels) the first time a client asks for it.
+    """
+
+    __slots__ = ("body", "_variants")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self._variants: Dict[str, bytes] = {}
+
+    def __len__(self) -> int:
+        return len(self.body)
+
+    def cached(self, encoding: str) -> Optional[bytes]:
+        """The variant for `encoding` if it has been made already."""
+        return self._variants.get(encoding)
+
+    def encoded(self, encoding: str) -> bytes:
+        variant = self._variants.get(encoding)
+        if variant is None:
+            # Two requests racing here both compress; either result is fine
+            variant = self._variants[encoding] = compress(self.body, encoding, PRECOMPRESSED_LEVELS[encoding])
+        return variant
+
+
+class PrecompressedResponse(Response):
+    """
+    Serves a CompressedBody in whichever encoding the request accepts,
+    choosing when the response is sent so handlers don't need the request's
+    headers. Bodies under `minimum_size` are always sent as is.
+    """
+
+    def __init__(
+        self,
+        payload: CompressedBody,
+        minimum_size: int = 1024,
+        status_code: int = 200,
+        headers: Optional[Dict[str, str]] = None,
+        media_type: str = "application/json",
+    ):
+        super().__init__(content=payload.body, status_code=status_code, headers=headers, media_type=media_type)
+        self.payload = payload
+        self.minimum_size = minimum_size
+        _add_vary(self.headers)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if len(self.payload) >= self.minimum_size:
+            encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+            if encoding is not None:
+                body = self.payload.cached(encoding)
+                if body is None:
+                    # Max-level brotli or zstd takes tens of milliseconds on a
+                    # large page, too long to hold the event loop for
+                    body = await run_in_threadpool(self.payload.encoded, encoding)
+                self.body = body
+                self.headers["Content-Encoding"] = encoding
+                self.headers["Content-Length"] = str(len(self.body))
+        await super().__call__(scope, receive, send)
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses the client accepts compressed: brotli (when the
+    optional brotli package is installed) or gzip, per Accept-Encoding.
+
+    Responses that already carry a Content-Encoding (precompressed pages and
+    stats, the export stream) pass through untouched, as do bodies under
+    `minimum_size`, 204/304 responses and non-text content types.
+    Streamed bodies are compressed incrementally and flushed chunk by chunk.
+    """
+
+    def __init__(self, app: Any, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Dict[str, Any]] = None
+        compressor: Optional[StreamCompressor] = None
+        passthrough = False
+
+        async def send_compressed(message: Dict[str, Any]) -> None:
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether to compress
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start["headers"])
+                if not self._compressible(start["status"], headers) or (not more_body and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                headers["Content-Encoding"] = encoding
+                _add_vary(headers)
+                if not more_body:
+                    body = compress(body, encoding)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                del headers["Content-Length"]
+                compressor = StreamCompressor(encoding)
+                await send(start)
+
+            chunk = compressor.compress(body) + (compressor.flush() if more_body else compressor.finish())
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    def _compressible(status: int, headers: MutableHeaders) -> bool:
+        if status < 200 or status in (204, 304) or "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def _add_vary(headers: MutableHeaders) -> None:
+    vary = headers.get("vary")
+    if not vary:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["Vary"] = f"{vary}, Accept-Encoding"
@@ -0,0 +1,246 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import REGISTRY
+
+
+# Attempt pages are ordered newest first by (created_at, question_id), which
+# is also the keyset a cursor continues from
+ATTEMPT_PAGE_COLUMNS = ("question_id", "selected_answer", "is_correct", "created_at")
+# PostgREST's default max-rows; full histories are read in pages of this size
+OUTCOME_PAGE_SIZE = 1000
+
+DB_CALL_SECONDS = REGISTRY.histogram(
+    "db_call_duration_seconds",
+    "Backend call latency, not counting time queued for a data-access thread",
+    ("operation", "outcome"),
+)
+
+
+class DataAccessTimeout(Exception):
+    """Raised when a backend call doesn't finish within the configured timeout."""
+
+
+class SupabaseBackend:
+    """Blocking data access through a shared supabase-py client."""
+
+    def __init__(self, client: Any):
+        self.client = client
+
+    def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        result = self.client.table("users").select("*").eq("id", user_id).execute()
+        return result.data[0] if result.data else None
+
+    def upsert_attempts(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        result = self.client.table("attempted_questions").upsert(rows).execute()
+        return result.data
+
+    def count_attempts(self, user_id: str, is_correct: Optional[bool] = None, question_ids: Optional[List[str]] = None) -> int:
+        # Counted by Postgres; no rows come back
+        query = self.client.table("attempted_questions").select("question_id", count="exact", head=True).eq("user_id", user_id)
+        if is_correct is not None:
+            query = query.eq("is_correct", is_correct)
+        if question_ids is not None:
+            query = query.in_("question_id", question_ids)
+        return query.execute().count or 0
+
+    def list_attempts(
+        self,
+        user_id: str,
+        is_correct: Optional[bool],
+        limit: int,
+        offset: int = 0,
+        after: Optional[Tuple[str, str]] = None,
+    ) -> List[Dict[str, Any]]:
+        query = self.client.table("attempted_questions").select(*ATTEMPT_PAGE_COLUMNS).eq("user_id", user_id)
+        if is_correct is not None:
+            query = query.eq("is_correct", is_correct)
+        if after is not None:
+            created_at, question_id = after
+            query = query.or_(
+                f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",question_id.lt."{question_id}")'
+            )
+        query = query.order("created_at", desc=True).order("question_id", desc=True)
+        return query.range(offset, offset + limit - 1).execute().data
+
+    def list_attempt_outcomes(self, user_id: str) -> List[Dict[str, Any]]:
+        """question_id and is_correct of every attempt, fetched page by page."""
+        rows: List[Dict[str, Any]] = []
+        while True:
+            page = (
+                self.client.table("attempted_questions")
+                .select("question_id", "is_correct")
+                .eq("user_id", user_id)
+                .order("question_id")
+                .range(len(rows), len(rows) + OUTCOME_PAGE_SIZE - 1)
+                .execute()
+                .data
+            )
+            rows.extend(page)
+            if len(page) < OUTCOME_PAGE_SIZE:
+                return rows
+
+
+class MemoryBackend:
+    """
+    In-process stand-in for Supabase, for running the API and its user
+    endpoints offline (DATA_BACKEND=memory). Attempts are keyed by
+    (user_id, question_id), so a re-attempt replaces the earlier row.
+    """
+
+    def __init__(self):
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.attempts: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def add_user(self, user_id: str, email: str, created_at: str) -> None:
+        self.users[user_id] = {"id": user_id, "email": email, "created_at": created_at}
+
+    def load_users(self, path: str) -> int:
+        """
+        Add the users in a JSON file holding a list of users table rows
+        ({"id", "email", "created_at"}). Returns how many were added.
+        """
+        with open(path, "r") as f:
+            users = json.load(f)
+        for user in users:
+            self.add_user(user["id"], user["email"], user["created_at"])
+        return len(users)
+
+    def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return self.users.get(user_id)
+
+    def upsert_attempts(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with self._lock:
+            for row in rows:
+                self.attempts[(row["user_id"], row["question_id"])] = dict(row)
+        return [dict(row) for row in rows]
+
+    def count_attempts(self, user_id: str, is_correct: Optional[bool] = None, question_ids: Optional[List[str]] = None) -> int:
+        rows = self._attempts(user_id, is_correct)
+        if question_ids is not None:
+            rows = [row for row in rows if row["question_id"] in question_ids]
+        return len(rows)
+
+    def list_attempts(
+        self,
+        user_id: str,
+        is_correct: Optional[bool],
+        limit: int,
+        offset: int = 0,
+        after: Optional[Tuple[str, str]] = None,
+    ) -> List[Dict[str, Any]]:
+        rows = sorted(self._attempts(user_id, is_correct), key=_attempt_order, reverse=True)
+        if after is not None:
+            rows = [row for row in rows if _attempt_order(row) < after]
+        return [{column: row[column] for column in ATTEMPT_PAGE_COLUMNS} for row in rows[offset : offset + limit]]
+
+    def list_attempt_outcomes(self, user_id: str) -> List[Dict[str, Any]]:
+        return [{"question_id": row["question_id"], "is_correct": row["is_correct"]} for row in self._attempts(user_id, None)]
+
+    def _attempts(self, user_id: str, is_correct: Optional[bool]) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = list(self.attempts.values())
+        return [
+            row
+            for row in rows
+            if row["user_id"] == user_id and (is_correct is None or row["is_correct"] == is_correct)
+        ]
+
+
+def _attempt_order(row: Dict[str, Any]) -> Tuple[str, str]:
+    return (row["created_at"], row["question_id"])
+
+
+class DataAccess:
+    """
+    Async facade over a blocking backend.
+
+    Calls run on a dedicated, bounded thread pool, so handlers await them
+    instead of blocking the event loop, and at most `max_concurrency` backend
+    calls are in flight per worker (the backend's client, and its connection
+    pool, is shared by all of them). A call that takes longer than `timeout`
+    seconds, queueing included, raises DataAccessTimeout. Every backend call
+    is timed into DB_CALL_SECONDS; `in_flight` counts calls running or
+    queued.
+    """
+
+    def __init__(self, backend: Any, max_concurrency: int = 16, timeout: float = 10.0):
+        self.backend = backend
+        self.timeout = timeout
+        self.in_flight = 0
+        # Updated from the event loop and from flusher threads alike
+        self._in_flight_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="data-access")
+
+    async def call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        self._track(1)
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(self._executor, partial(self.timed, fn, *args)), self.timeout)
+        except asyncio.TimeoutError:
+            raise DataAccessTimeout(f"{getattr(fn, '__name__', 'call')} timed out after {self.timeout}s")
+        finally:
+            self._track(-1)
+
+    def call_blocking(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        `call` for threads outside the event loop, such as the attempt
+        flusher: same pool, same timeout. On a timeout the caller stops
+        waiting, but the backend call itself may still finish on its thread.
+        """
+        self._track(1)
+        try:
+            future = self._executor.submit(self.timed, fn, *args)
+            try:
+                return future.result(self.timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                raise DataAccessTimeout(f"{getattr(fn, '__name__', 'call')} timed out after {self.timeout}s")
+        finally:
+            self._track(-1)
+
+    def _track(self, delta: int) -> None:
+        with self._in_flight_lock:
+            self.in_flight += delta
+
+    def timed(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run one blocking backend call on the calling thread, recording its latency."""
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = fn(*args)
+            outcome = "ok"
+            return result
+        finally:
+            DB_CALL_SECONDS.observe(time.perf_counter() - started, operation=getattr(fn, "__name__", "call"), outcome=outcome)
+
+    async def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return await self.call(self.backend.get_user, user_id)
+
+    async def upsert_attempts(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return await self.call(self.backend.upsert_attempts, rows)
+
+    async def count_attempts(self, user_id: str, is_correct: Optional[bool] = None, question_ids: Optional[List[str]] = None) -> int:
+        return await self.call(self.backend.count_attempts, user_id, is_correct, question_ids)
+
+    async def list_attempts(
+        self,
+        user_id: str,
+        is_correct: Optional[bool],
+        limit: int,
+        offset: int = 0,
+        after: Optional[Tuple[str, str]] = None,
+    ) -> List[Dict[str, Any]]:
+        return await self.call(self.backend.list_attempts, user_id, is_correct, limit, offset, after)
+
+    async def list_attempt_outcomes(self, user_id: str) -> List[Dict[str, Any]]:
+        return await self.call(self.backend.list_attempt_outcomes, user_id)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
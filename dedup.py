@@ -0,0 +1,109 @@
+import re
+import zlib
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from search_index import plain_text
+
+# Token n-grams compared between questions. Punctuation counts as a token:
+# conventions items differ from each other mostly in their punctuation.
+SHINGLE_SIZE = 3
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+# MinHash signature length, split into LSH bands of BAND_ROWS rows. Pairs
+# agreeing on every row of some band are compared; with 16 bands of 8 rows
+# a pair at 0.8 similarity becomes a candidate ~99.6% of the time and one
+# at 0.5 ~6% of the time.
+NUM_PERMUTATIONS = 128
+BAND_ROWS = 8
+# Estimated Jaccard similarity of shingle sets at which questions are duplicates
+SIMILARITY_THRESHOLD = 0.8
+
+# Universal hash family h(x) = (a * x + b) mod p over 32-bit shingle hashes;
+# fixed seed so cluster ids are stable between builds
+_PRIME = (1 << 61) - 1
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.default_rng(1600)
+_A = _rng.integers(1, 1 << 32, NUM_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 32, NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def question_text(question: Dict[str, Any]) -> str:
+    """Stem plus answer options, as compared for duplicates (bank or rendered form)."""
+    options = question.get("options") or question.get("answerOptions") or []
+    parts = [question.get("question") or ""] + [option.get("content") or "" for option in options]
+    return " ".join(plain_text(part) for part in parts)
+
+
+def shingles(text: str) -> List[int]:
+    words = _TOKEN.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return [zlib.crc32(" ".join(words).encode("utf-8"))] if words else []
+    return list({zlib.crc32(" ".join(words[i : i + SHINGLE_SIZE]).encode("utf-8")) for i in range(len(words) - SHINGLE_SIZE + 1)})
+
+
+def minhash_signatures(texts: Sequence[str]) -> np.ndarray:
+    """
+    One MinHash signature row per text (uint32[NUM_PERMUTATIONS]). Texts
+    without words get an all-max signature and never match anything.
+    """
+    signatures = np.full((len(texts), NUM_PERMUTATIONS), _MAX_HASH, dtype=np.uint64)
+    hashed = [shingles(text) for text in texts]
+    sizes = np.array([len(values) for values in hashed], dtype=np.int64)
+    nonempty = np.flatnonzero(sizes)
+    if not len(nonempty):
+        return signatures.astype(np.uint32)
+    values = np.fromiter((value for values in hashed for value in values), dtype=np.uint64, count=int(sizes.sum()))
+    starts = np.concatenate(([0], np.cumsum(sizes[nonempty])[:-1]))
+    for permutation in range(NUM_PERMUTATIONS):
+        # a, x < 2^32, so a * x + b stays within uint64 before the reduction
+        permuted = (_A[permutation] * values + _B[permutation]) % np.uint64(_PRIME) & _MAX_HASH
+        signatures[nonempty, permutation] = np.minimum.reduceat(permuted, starts)
+    return signatures.astype(np.uint32)
+
+
+def cluster_representatives(texts: Sequence[str]) -> List[int]:
+    """
+    For each text, the index of the first text in its near-duplicate cluster
+    (itself if it has none).
+
+    Candidate pairs come from LSH buckets, so the work grows with the number
+    of texts and true duplicates rather than with every pair. Each candidate
+    is confirmed on its estimated similarity before the two clusters are
+    joined.
+    """
+    signatures = minhash_signatures(texts)
+    parent = list(range(len(texts)))
+
+    def find(index: int) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    def union(first: int, second: int) -> None:
+        first, second = find(first), find(second)
+        if first != second:
+            parent[max(first, second)] = min(first, second)
+
+    def similar(first: int, second: int) -> bool:
+        return float(np.mean(signatures[first] == signatures[second])) >= SIMILARITY_THRESHOLD
+
+    has_words = (signatures != np.uint32(_MAX_HASH)).any(axis=1).tolist()
+    for band in range(NUM_PERMUTATIONS // BAND_ROWS):
+        rows = signatures[:, band * BAND_ROWS : (band + 1) * BAND_ROWS]
+        buckets: Dict[bytes, List[int]] = {}
+        for index in range(len(texts)):
+            if has_words[index]:
+                buckets.setdefault(rows[index].tobytes(), []).append(index)
+        for members in buckets.values():
+            # Compare along the bucket rather than every pair within it
+            for previous, index in zip(members, members[1:]):
+                if find(members[0]) == find(index):
+                    continue
+                if similar(members[0], index):
+                    union(members[0], index)
+                elif similar(previous, index):
+                    union(previous, index)
+
+    return [find(index) for index in range(len(texts))]
@@ -0,0 +1,29 @@
+"""
+Gunicorn settings, picked up automatically when gunicorn runs from this
+directory. Command-line flags (e.g. `-w`, `--bind`) still take precedence.
+
+The question store is compiled once in the master before any worker is
+forked, so workers only ever open the finished file read-only and share
+its pages. With preloading on (the default) the app itself is imported in
+the master too, and the heap it leaves behind is frozen so the garbage
+collector in each worker doesn't dirty those copy-on-write pages.
+Set QUESTION_STORE_PRELOAD=0 to import the app in every worker instead.
+"""
+import gc
+import os
+
+from question_store import ARTIFACT_PATH, DATA_DIR, LOOKUP_FILE, load_question_store
+
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.environ.get("QUESTION_STORE_PRELOAD", "1") != "0"
+
+
+def on_starting(server):
+    store = load_question_store(DATA_DIR, LOOKUP_FILE, os.environ.get("QUESTION_STORE_PATH", ARTIFACT_PATH))
+    server.log.info(f"Question store ready: {len(store)} questions (version {store.version})")
+
+
+def when_ready(server):
+    if preload_app:
+        gc.collect()
+        gc.freeze()
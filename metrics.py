@@ -0,0 +1,236 @@
+import abc
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds; sub-millisecond buckets because most pages are
+# served from cache in well under one
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    @abc.abstractmethod
+    def samples(self) -> Iterator[Tuple[str, LabelValues, Sequence[Tuple[str, str]], float]]:
+        """(name suffix, label values, extra labels, value) for every series."""
+
+
+class Counter(_Metric):
+    """
+    A count that only goes up. With `function`, more series are read from it
+    at scrape time (a {label values: count} dict), for counts kept elsewhere
+    such as lru_cache statistics.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=(), function: Optional[Callable[[], Dict[LabelValues, float]]] = None):
+        super().__init__(name, documentation, labels)
+        self.function = function
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        if self.function:
+            values.update(self.function())
+        for key, value in values.items():
+            yield "", key, (), value
+
+
+class Gauge(Counter):
+    """A value that goes up and down, set directly or read from `function`."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative `buckets`, plus their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket (+Inf last)..., sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(series) for key, series in self._values.items()}
+        for key, series in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                cumulative += count
+                yield "_bucket", key, (("le", _format_bound(bound)),), cumulative
+            yield "_sum", key, (), series[-1]
+            yield "_count", key, (), cumulative
+
+
+class Registry:
+    """
+    The metrics of one process, rendered in the Prometheus text exposition
+    format. Under gunicorn every worker has its own registry, so each scrape
+    sees one worker; label series by instance when aggregating.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=(), function=None) -> Counter:
+        return self.register(Counter(name, documentation, labels, function))
+
+    def gauge(self, name, documentation, labels=(), function=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labels, function))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> bytes:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                samples = list(metric.samples())
+            except Exception:
+                # A failing callback shouldn't take the whole scrape down
+                continue
+            for suffix, key, extra, value in samples:
+                pairs = list(zip(metric.labels, key)) + list(extra)
+                label_text = ",".join(f'{label}="{_escape_label(value)}"' for label, value in pairs)
+                lines.append(f"{metric.name}{suffix}{{{label_text}}} {_format_value(value)}" if pairs else f"{metric.name}{suffix} {_format_value(value)}")
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+# Process-wide registry the API's modules record into
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response",
+    ("method", "route", "status"),
+)
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.gauge("http_requests_in_flight", "Requests currently being served")
+
+# Where a request's time goes: filter, dedup, paginate and serialize for
+# list pages (cache misses only), search and snippet for /questions/search
+STAGE_SECONDS = REGISTRY.histogram("request_stage_duration_seconds", "Time spent in one stage of serving a request", ("stage",))
+
+
+class RequestMetricsMiddleware:
+    """
+    Records every HTTP request in HTTP_REQUEST_SECONDS, labelled with its
+    route template (e.g. /questions/{program}/{subject}) rather than its
+    path, so the number of series stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._in_flight = 0
+        self._routes = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+        self._in_flight += 1
+        HTTP_REQUESTS_IN_FLIGHT.set(self._in_flight)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self._in_flight -= 1
+            HTTP_REQUESTS_IN_FLIGHT.set(self._in_flight)
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=self._route(scope),
+                status=str(status),
+            )
+
+    def _route(self, scope) -> str:
+        # The router records the matched endpoint in the request's scope
+        if self._routes is None and "app" in scope:
+            self._routes = {
+                route.endpoint: route.path for route in getattr(scope["app"], "routes", ()) if hasattr(route, "endpoint")
+            }
+        return (self._routes or {}).get(scope.get("endpoint"), "unmatched")
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == math.inf else repr(float(bound))
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
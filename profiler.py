@@ -0,0 +1,195 @@
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+# Leaf frames in these files mean the thread is parked (event loop waiting
+# for I/O, idle thread-pool workers), not doing work worth a sample
+_IDLE_FILES = ("selectors.py", "threading.py", "queue.py", "thread.py")
+
+# Besides the event loop's own thread, requests run on Starlette's thread
+# pool (sync endpoints) and DataAccess's (backend calls); background threads
+# such as the store watcher or the attempt flusher are left out
+REQUEST_THREAD_PREFIXES = ("AnyIO worker", "data-access")
+
+
+class Profile:
+    """Stack samples collected while one request was being served."""
+
+    __slots__ = ("id", "method", "path", "reason", "thread", "started_at", "duration", "status", "samples", "_started")
+
+    def __init__(self, profile_id: str, method: str, path: str, reason: str):
+        self.id = profile_id
+        self.thread = threading.get_ident()
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.started_at = time.time()
+        self.duration: Optional[float] = None
+        self.status: Optional[int] = None
+        self.samples: Counter = Counter()
+        self._started = time.perf_counter()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "status": self.status,
+            "samples": sum(self.samples.values()),
+        }
+
+    def collapsed(self) -> str:
+        """
+        Brendan Gregg's collapsed-stack format, one "root;...;leaf count" line
+        per distinct stack, as read by flamegraph.pl and speedscope.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class StackSampler:
+    """
+    Every `interval` seconds, samples the Python stacks of each active
+    Profile's event loop thread and of the busy request threads (see
+    REQUEST_THREAD_PREFIXES).
+
+    The sampling thread only runs while at least one profile is active, so
+    there is no cost when nothing is being profiled. Samples are not tied
+    to a request: while profiled requests overlap with others, each
+    profile also sees the stacks of whatever else was running.
+    """
+
+    def __init__(self, interval: float = 0.005, history: int = 50):
+        self.interval = interval
+        self.history = history
+        self._active: Dict[str, Profile] = {}
+        self._finished: "OrderedDict[str, Profile]" = OrderedDict()
+        self._labels: Dict[Any, str] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def begin(self, method: str, path: str, reason: str) -> Profile:
+        profile = Profile(f"{os.getpid()}-{next(self._ids)}", method, path, reason)
+        with self._lock:
+            self._active[profile.id] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+        return profile
+
+    def end(self, profile: Profile, status: Optional[int]) -> None:
+        profile.duration = time.perf_counter() - profile._started
+        profile.status = status
+        with self._lock:
+            self._active.pop(profile.id, None)
+            self._finished[profile.id] = profile
+            while len(self._finished) > self.history:
+                self._finished.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        with self._lock:
+            return self._finished.get(profile_id)
+
+    def finished(self) -> List[Profile]:
+        """Completed profiles, newest first."""
+        with self._lock:
+            return list(reversed(self._finished.values()))
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active.values())
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                shared = names.get(ident, "").startswith(REQUEST_THREAD_PREFIXES)
+                profiles = active if shared else [profile for profile in active if profile.thread == ident]
+                if not profiles:
+                    continue
+                stack = self._collapse(frame)
+                if stack:
+                    for profile in profiles:
+                        profile.samples[stack] += 1
+            time.sleep(self.interval)
+
+    def _collapse(self, frame: Any) -> Optional[str]:
+        if frame.f_code.co_filename.endswith(_IDLE_FILES):
+            return None
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = (
+                    f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                ).replace(";", ":")
+            labels.append(label)
+            frame = frame.f_back
+        return ";".join(reversed(labels))
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a random `sample_rate` fraction of requests, plus any request
+    sent with `X-Profile: 1` and a valid `X-Admin-Token`. Profiled responses
+    carry an `X-Profile-Id` header naming the stored profile. Requests that
+    aren't profiled only pay for a scan of their headers.
+    """
+
+    def __init__(self, app: Any, sampler: StackSampler, sample_rate: float = 0.0, admin_token: Callable[[], Optional[str]] = lambda: None):
+        self.app = app
+        self.sampler = sampler
+        self.sample_rate = sample_rate
+        self.admin_token = admin_token
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        reason = self._reason(scope)
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = self.sampler.begin(scope["method"], scope["path"], reason)
+        status = None
+
+        async def send_with_profile_id(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode("ascii"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            self.sampler.end(profile, status)
+
+    def _reason(self, scope: Dict[str, Any]) -> Optional[str]:
+        requested = admin = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                requested = value
+            elif name == b"x-admin-token":
+                admin = value
+        if requested == b"1":
+            token = self.admin_token()
+            if token and admin is not None and admin.decode("latin-1") == token:
+                return "requested"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
@@ -0,0 +1,67 @@
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from compression import StreamCompressor
+from question_store import dump_json
+
+# Questions serialized per chunk handed to the response stream
+EXPORT_BATCH_SIZE = 256
+
+EXPORT_FORMATS = ("ndjson", "json")
+
+# Exports are large and compressed once per request, so zstd's speed wins over
+# brotli's ratio here
+EXPORT_ENCODINGS = ("zstd", "gzip", "br")
+
+
+def export_media_type(fmt: str) -> str:
+    return "application/x-ndjson" if fmt == "ndjson" else "application/json"
+
+
+def export_chunks(
+    store: Any,
+    positions: Sequence[int],
+    deleted: Sequence[str] = (),
+    fmt: str = "ndjson",
+    fields: Optional[Tuple[str, ...]] = None,
+) -> Iterator[bytes]:
+    """
+    Every question at `positions` as NDJSON lines or one JSON array, limited
+    to `fields` if given, followed by a {"questionId": ..., "deleted": true}
+    entry per deleted id. Bodies are copied from the store's mapping a batch
+    at a time, so memory stays flat however many questions match.
+    """
+    separator = b"\n" if fmt == "ndjson" else b","
+    tombstones = [b'{"questionId":%s,"deleted":true}' % dump_json(question_id) for question_id in deleted]
+    first = True
+    if fmt == "json":
+        yield b"["
+    for start in range(0, len(positions), EXPORT_BATCH_SIZE):
+        batch = [store.render(position, fields) for position in positions[start : start + EXPORT_BATCH_SIZE]]
+        yield _join(batch, separator, first, fmt)
+        first = False
+    for start in range(0, len(tombstones), EXPORT_BATCH_SIZE):
+        yield _join(tombstones[start : start + EXPORT_BATCH_SIZE], separator, first, fmt)
+        first = False
+    if fmt == "json":
+        yield b"]"
+
+
+def encode_chunks(chunks: Iterable[bytes], encoding: Optional[str]) -> Iterator[bytes]:
+    """Compress a stream of chunks incrementally; chunks pass through without an encoding."""
+    if encoding is None:
+        yield from chunks
+        return
+    compressor = StreamCompressor(encoding)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.finish()
+
+
+def _join(items: List[bytes], separator: bytes, first: bool, fmt: str) -> bytes:
+    joined = separator.join(items)
+    if fmt == "ndjson":
+        return joined + b"\n"
+    return joined if first else b"," + joined
+
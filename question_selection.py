@@ -0,0 +1,93 @@
+import random
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+SELECTION_STRATEGIES = ("random", "weakest")
+
+# Random draws from a filter's positions before falling back to walking the
+# candidate bitset; only matters once most of them have been attempted
+MAX_DRAWS = 32
+
+_POPCOUNT = bytes(bin(byte).count("1") for byte in range(256))
+
+
+def select_questions(
+    store: Any,
+    selectable: Sequence[int],
+    selectable_bits: int,
+    attempted: int,
+    count: int,
+    strategy: str = "random",
+    skill_scores: Optional[Dict[Any, Tuple[int, int]]] = None,
+    rng: random.Random = random,
+) -> Tuple[List[int], int]:
+    """
+    Picks up to `count` distinct positions from `selectable` (as returned by
+    QuestionStore.selectable) that aren't set in the `attempted` bitset.
+    Returns them with the number of unattempted questions there were to pick
+    from.
+
+    "random" picks uniformly. "weakest" first picks a skill with probability
+    proportional to the user's smoothed error rate in it, (wrong + 1) /
+    (attempted + 2) from `skill_scores` (skill -> (attempted, correct)), so
+    unpractised skills weigh like a coin flip, then a question within it.
+    """
+    candidates = selectable_bits & ~attempted
+    remaining = candidates.bit_count()
+    if strategy != "weakest":
+        return _sample(selectable, candidates, count, rng), remaining
+
+    skill_scores = skill_scores or {}
+    pools = {}
+    weights = {}
+    for skill, positions in store.facets["skill_desc"].items():
+        bits = candidates & store.facet_bitmap("skill_desc", skill)
+        if bits:
+            attempted_count, correct = skill_scores.get(skill, (0, 0))
+            pools[skill] = (positions, bits)
+            weights[skill] = (attempted_count - correct + 1) / (attempted_count + 2)
+
+    picked = []
+    while pools and len(picked) < count:
+        skill = rng.choices(list(weights), weights=list(weights.values()))[0]
+        positions, bits = pools[skill]
+        position = _draw(positions, bits, rng)
+        picked.append(position)
+        bits &= ~(1 << position)
+        if bits:
+            pools[skill] = (positions, bits)
+        else:
+            del pools[skill], weights[skill]
+    return picked, remaining
+
+
+def _sample(positions: Sequence[int], bits: int, count: int, rng: random.Random) -> List[int]:
+    picked = []
+    while bits and len(picked) < count:
+        position = _draw(positions, bits, rng)
+        picked.append(position)
+        bits &= ~(1 << position)
+    return picked
+
+
+def _draw(positions: Sequence[int], bits: int, rng: random.Random) -> int:
+    """A uniformly random set bit of `bits`, which is a subset of `positions`."""
+    for _ in range(MAX_DRAWS):
+        position = positions[rng.randrange(len(positions))]
+        if bits >> position & 1:
+            return position
+    return _nth_bit(bits, rng.randrange(bits.bit_count()))
+
+
+def _nth_bit(bits: int, n: int) -> int:
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for index, byte in enumerate(data):
+        count = _POPCOUNT[byte]
+        if n >= count:
+            n -= count
+            continue
+        for bit in range(8):
+            if byte >> bit & 1:
+                if not n:
+                    return index * 8 + bit
+                n -= 1
+    raise ValueError("bit index out of range")
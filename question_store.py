@@ -0,0 +1,992 @@
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from compression import CompressedBody
+from metrics import STAGE_SECONDS
+from structured_log import get_logger, log_event
+
+logger = get_logger("question_store")
+
+# Question bank files are named PROGRAM_(math|RW).json; shared with stats_generator
+BANK_FILE_PATTERN = re.compile(r"^(SAT|PSAT89|PSAT10NMSQT)_(math|RW)\.json$", re.IGNORECASE)
+PROGRAMS = ("SAT", "PSAT89", "PSAT10NMSQT")
+SUBJECTS = ("MATH", "RW")
+
+DATA_DIR = "data"
+LOOKUP_FILE = "lookup.json"
+ARTIFACT_PATH = os.path.join(DATA_DIR, "questions.bin")
+
+# Facets indexed at load time. "program" and "subject" come from the bank a
+# question was loaded from (e.g. SAT / MATH); the rest are read off the question.
+FACETS = (
+    "program",
+    "subject",
+    "primary_class_cd_desc",
+    "skill_desc",
+    "difficulty",
+    "score_band_range_cd",
+)
+
+# Metadata kept in memory per question; everything else lives in the body blob.
+# "cluster_id" is the questionId of the first question in a question's
+# near-duplicate cluster (see dedup.py), its own id if it has no duplicates.
+# "revision" is the bank revision in which the question last changed.
+COLUMNS = FACETS + ("skill_cd", "correct_answer", "active", "cluster_id", "revision")
+
+# Field order of app.QuestionBasic, so pre-rendered JSON matches what the
+# response model would have produced.
+RENDERED_FIELDS = (
+    "questionId",
+    "difficulty",
+    "skill_desc",
+    "primary_class_cd_desc",
+    "program",
+    "question",
+    "explanation",
+    "answerOptions",
+    "questionDetail",
+    "correct_answer",
+    "clusterId",
+)
+
+# The light fields, compiled a second time on their own so list screens that
+# only show ids, skills and difficulties never read the question HTML
+SUMMARY_FIELDS = ("questionId", "difficulty", "skill_desc", "primary_class_cd_desc", "program", "clusterId")
+
+# Named field sets accepted wherever `fields` is, alongside single field names
+FIELD_PRESETS = {"summary": SUMMARY_FIELDS}
+
+# Byte budget of each store's cache of rendered list pages, counted over the
+# uncompressed bodies. Pages over PAGE_CACHE_MAX_ENTRY are rendered per
+# request instead, so a few huge windows can't evict everything else.
+PAGE_CACHE_BYTES = 32 * 1024 * 1024
+PAGE_CACHE_MAX_ENTRY = 1024 * 1024
+
+
+def extract_question_data(question: Dict[str, Any]) -> Dict[str, Any]:
+    result = {
+        "questionId": question.get("questionId", ""),
+        "difficulty": question.get("difficulty", ""),
+        "skill_desc": question.get("skill_desc", ""),
+        "primary_class_cd_desc": question.get("primary_class_cd_desc", ""),
+        "program": question.get("program", ""),
+        "question": question.get("question", ""),
+    }
+    if "questionDetail" in question:
+        result["questionDetail"] = question.get("questionDetail", "")
+    result["answerOptions"] = question.get("options", [])
+    result["correct_answer"] = question.get("correct_answer", [])
+    result["explanation"] = question.get("explanation", "")
+    return result
+
+
+def render_question(question: Dict[str, Any], cluster_id: Optional[str] = None) -> bytes:
+    """Serialize a question the way a QuestionBasic response would, once."""
+    data = extract_question_data(question)
+    data["clusterId"] = cluster_id
+    return dump_json({field: data.get(field) for field in RENDERED_FIELDS})
+
+
+def dump_json(data: Any) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def project_json(body: bytes, fields: Sequence[str]) -> bytes:
+    """A rendered question reduced to `fields`, in the order given."""
+    data = json.loads(body)
+    return dump_json({field: data.get(field) for field in fields})
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    The fields selected by a comma-separated list of field names and
+    FIELD_PRESETS, in RENDERED_FIELDS order and always with questionId, or
+    None when it selects whole questions. Raises ValueError on an unknown
+    name.
+    """
+    if not fields:
+        return None
+    selected = {"questionId"}
+    for name in fields.split(","):
+        name = name.strip()
+        if name in FIELD_PRESETS:
+            selected.update(FIELD_PRESETS[name])
+        elif name in RENDERED_FIELDS:
+            selected.add(name)
+        elif name:
+            raise ValueError(f"Unknown field {name}. Use any of: {', '.join(RENDERED_FIELDS + tuple(FIELD_PRESETS))}")
+    if len(selected) == len(RENDERED_FIELDS):
+        return None
+    return tuple(field for field in RENDERED_FIELDS if field in selected)
+
+
+# Compiled store layout (little-endian):
+#   header     magic, format version, question count, then the byte offset
+#              of every section below
+#   bodies     pre-rendered QuestionBasic JSON, back to back
+#   summaries  the same reduced to SUMMARY_FIELDS, back to back
+#   offsets    u64[count + 1] into the body blob, then u64[count + 1] into
+#              the summary blob
+#   codes      u32[count] per column, in COLUMNS order
+#   postings   u32[count] per facet, in FACETS order: positions grouped by
+#              value code, ascending within each value
+#   strings    u32[2 * count + 1] offsets, then the UTF-8 questionId and
+#              external_id of every question (interned string table)
+#   manifest   JSON: banks, per-column value tables, per-facet posting
+#              counts, source hashes, version
+ARTIFACT_MAGIC = b"QSTORE\x00\x00"
+ARTIFACT_FORMAT = 6
+
+# Content digest and revision of every question ever compiled, kept in the
+# data directory and committed with the banks, so every build and every
+# instance starts from the same history and hands out the same revisions.
+# Only the compile step (`python question_store.py`) writes it; stores built
+# at runtime read it as committed.
+REVISIONS_FILE = "question_revisions.json"
+_HEADER = struct.Struct("<8sII7Q")
+
+
+def parse_bank_filename(filename: str) -> Optional[Tuple[str, str]]:
+    """Return the normalized (program, subject) for a bank filename, or None."""
+    match = BANK_FILE_PATTERN.match(filename)
+    if not match:
+        return None
+    subject = "RW" if match.group(2).upper() == "RW" else "MATH"
+    return match.group(1).upper(), subject
+
+
+def discover_banks(data_dir: str) -> Dict[Tuple[str, str], str]:
+    """
+    Find every question bank file in `data_dir`, keyed by (program, subject)
+    and ordered by PROGRAMS then SUBJECTS so question positions are stable.
+    """
+    found = {}
+    for filename in os.listdir(data_dir):
+        key = parse_bank_filename(filename)
+        if key:
+            found[key] = os.path.join(data_dir, filename)
+    return {key: found[key] for key in sorted(found, key=lambda k: (PROGRAMS.index(k[0]), SUBJECTS.index(k[1])))}
+
+
+def load_live_items(lookup_file: str) -> Dict[str, Set[str]]:
+    """Live (active) external ids per subject, as stats_generator reads them."""
+    try:
+        with open(lookup_file, "r") as f:
+            lookup_data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"MATH": set(), "RW": set()}
+    return {
+        "MATH": set(lookup_data.get("mathLiveItems", [])),
+        "RW": set(lookup_data.get("readingLiveItems", [])),
+    }
+
+
+def source_hashes(data_dir: str = DATA_DIR, lookup_file: str = LOOKUP_FILE) -> Dict[str, str]:
+    """Content hash of every input a compiled store is built from."""
+    paths = list(discover_banks(data_dir).values()) + [lookup_file]
+    hashes = {}
+    for path in paths:
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                hashes[os.path.basename(path)] = hashlib.sha1(f.read()).hexdigest()
+    return hashes
+
+
+def update_revisions(path: str, entries: Sequence[Tuple[str, str, Sequence[Any]]], write: bool = True) -> Dict[str, Any]:
+    """
+    Record the current questions, as (questionId, digest, facet values in
+    FACETS order) tuples, in the revision log at `path` and return it. With
+    `write=False` the updated log is only returned.
+
+    The log's revision goes up by one whenever a question is added, changed
+    or removed; added and changed questions are stamped with the new
+    revision, and removed ones are kept as tombstones, with the facet values
+    they had, so clients syncing from an older revision learn about the
+    deletion whatever filters they sync with. A fresh log's epoch is
+    derived from the questions it starts with, so revisions from a
+    different log are never mistaken for this one's, while two builds that
+    start a log from the same banks still agree.
+    """
+    try:
+        with open(path, "r") as f:
+            log = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        seed = sorted((question_id, facets[0], facets[1], digest) for question_id, digest, facets in entries)
+        epoch = hashlib.sha1(dump_json(seed)).hexdigest()[:8]
+        log = {"epoch": epoch, "revision": 0, "questions": {}, "deleted": {}}
+
+    known = log["questions"]
+    current = {question_id: (digest, list(facets)) for question_id, digest, facets in entries if question_id}
+    changed = [question_id for question_id, (digest, _) in current.items() if known.get(question_id, [None])[0] != digest]
+    removed = [question_id for question_id in known if question_id not in current]
+    # Entries recorded before facet values were kept get them without a new revision
+    backfilled = [
+        question_id
+        for question_id, (digest, facets) in current.items()
+        if question_id in known and known[question_id][0] == digest and known[question_id][2:] != facets
+    ]
+    if not changed and not removed and not backfilled:
+        return log
+
+    for question_id in backfilled:
+        known[question_id] = known[question_id][:2] + current[question_id][1]
+    if changed or removed:
+        revision = log["revision"] + 1
+        for question_id in changed:
+            digest, facets = current[question_id]
+            known[question_id] = [digest, revision] + facets
+            log["deleted"].pop(question_id, None)
+        for question_id in removed:
+            log["deleted"][question_id] = [revision] + known.pop(question_id)[2:]
+        log["revision"] = revision
+
+    if write:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(dump_json(log))
+        os.replace(tmp_path, path)
+    return log
+
+
+def revisions_up_to_date(data_dir: str = DATA_DIR) -> bool:
+    """Whether the revision log in `data_dir` already records its banks as they are."""
+    path = os.path.join(data_dir, REVISIONS_FILE)
+    if not os.path.exists(path):
+        return False
+    with open(path, "r") as f:
+        revision = json.load(f)["revision"]
+    _, loaded, _, bodies = _render_banks(data_dir)
+    return update_revisions(path, _revision_entries(loaded, bodies), write=False)["revision"] == revision
+
+
+def _render_banks(data_dir: str) -> Tuple[List[List[Any]], List[Tuple[str, str, Dict[str, Any]]], List[int], List[bytes]]:
+    """Every bank's questions with their cluster representative and rendered body."""
+    from dedup import cluster_representatives, question_text
+
+    banks = []
+    loaded = []
+    for (program, subject), path in discover_banks(data_dir).items():
+        with open(path, "r") as f:
+            questions = json.load(f)
+        banks.append([program, subject, len(questions)])
+        loaded.extend((program, subject, question) for question in questions)
+    representatives = cluster_representatives([question_text(question) for _, _, question in loaded])
+    bodies = [
+        render_question(question, loaded[representative][2].get("questionId") or "")
+        for (_, _, question), representative in zip(loaded, representatives)
+    ]
+    return banks, loaded, representatives, bodies
+
+
+def _revision_entries(loaded, bodies) -> List[Tuple[str, str, Tuple[Any, ...]]]:
+    return [
+        (
+            question.get("questionId") or "",
+            hashlib.sha1(body).hexdigest(),
+            (program, subject) + tuple(question.get(facet) for facet in FACETS[2:]),
+        )
+        for (program, subject, question), body in zip(loaded, bodies)
+    ]
+
+
+def build_artifact(
+    data_dir: str = DATA_DIR,
+    lookup_file: str = LOOKUP_FILE,
+    output_path: str = ARTIFACT_PATH,
+    write_revisions: bool = False,
+) -> str:
+    """
+    Compile every bank in `data_dir` plus the live items in `lookup_file`
+    into a single store file at `output_path`. The file is written next to
+    the target and renamed into place, so readers never see a partial file.
+    Near-duplicate questions are clustered across all banks first, so each
+    question is stored with its cluster id, and every question is stamped
+    with its revision from the log in `data_dir` (see update_revisions).
+    The log itself is only updated with `write_revisions`, as the compile
+    step does; a build at runtime applies any uncommitted changes in memory,
+    identically in every process.
+    """
+    live_items = load_live_items(lookup_file)
+    sources = source_hashes(data_dir, lookup_file)
+    columns = {name: _Column() for name in COLUMNS}
+    question_ids: List[str] = []
+    external_ids: List[str] = []
+    body_offsets = array("Q", [0])
+    summary_offsets = array("Q", [0])
+
+    banks, loaded, representatives, bodies = _render_banks(data_dir)
+    revisions = update_revisions(os.path.join(data_dir, REVISIONS_FILE), _revision_entries(loaded, bodies), write_revisions)
+
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as out:
+        out.write(b"\x00" * _HEADER.size)
+        for (program, subject, question), representative, body in zip(loaded, representatives, bodies):
+            external_id = question.get("external_id")
+            question_ids.append(question.get("questionId") or "")
+            external_ids.append(external_id or "")
+            values = {"program": program, "subject": subject}
+            for name in FACETS[2:] + ("skill_cd", "correct_answer"):
+                values[name] = question.get(name)
+            values["correct_answer"] = tuple(values["correct_answer"] or ())
+            values["active"] = bool(external_id) and external_id in live_items[subject]
+            values["cluster_id"] = loaded[representative][2].get("questionId") or ""
+            values["revision"] = revisions["questions"].get(question_ids[-1], [None, revisions["revision"]])[1]
+            for name in COLUMNS:
+                columns[name].append(values[name])
+
+            out.write(body)
+            body_offsets.append(body_offsets[-1] + len(body))
+        del loaded
+
+        summaries_at = out.tell()
+        for body in bodies:
+            summary = project_json(body, SUMMARY_FIELDS)
+            out.write(summary)
+            summary_offsets.append(summary_offsets[-1] + len(summary))
+        del bodies
+
+        offsets_at = out.tell()
+        out.write(body_offsets.tobytes())
+        out.write(summary_offsets.tobytes())
+
+        codes_at = out.tell()
+        for name in COLUMNS:
+            out.write(columns[name].codes.tobytes())
+
+        postings_at = out.tell()
+        posting_counts = {}
+        for facet in FACETS:
+            codes = columns[facet].codes
+            out.write(array("I", sorted(range(len(codes)), key=codes.__getitem__)).tobytes())
+            posting_counts[facet] = [0] * len(columns[facet].values)
+            for code in codes:
+                posting_counts[facet][code] += 1
+
+        strings_at = out.tell()
+        encoded = [value.encode("utf-8") for value in question_ids + external_ids]
+        string_offsets = array("I", [0])
+        for value in encoded:
+            string_offsets.append(string_offsets[-1] + len(value))
+        out.write(string_offsets.tobytes())
+        out.write(b"".join(encoded))
+
+        manifest_at = out.tell()
+        manifest = {
+            "version": hashlib.sha1(dump_json(sources)).hexdigest()[:16],
+            "sources": sources,
+            "banks": banks,
+            "columns": {name: columns[name].values for name in COLUMNS},
+            "postings": posting_counts,
+            "epoch": revisions["epoch"],
+            "revision": revisions["revision"],
+            "deleted": revisions["deleted"],
+        }
+        out.write(dump_json(manifest))
+        end = out.tell()
+
+        out.seek(0)
+        out.write(_HEADER.pack(
+            ARTIFACT_MAGIC, ARTIFACT_FORMAT, len(question_ids),
+            summaries_at, offsets_at, codes_at, postings_at, strings_at, manifest_at, end,
+        ))
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def load_question_store(
+    data_dir: str = DATA_DIR,
+    lookup_file: str = LOOKUP_FILE,
+    artifact_path: str = ARTIFACT_PATH,
+) -> "QuestionStore":
+    """
+    Open the compiled store at `artifact_path`, rebuilding it first when it
+    is missing, from an older format, or stale against the source files.
+    Rebuilds take an exclusive lock on a file next to the artifact, so when
+    several workers notice the same change one compiles and the others wait
+    and then open its result.
+    """
+    store = _open_fresh(data_dir, lookup_file, artifact_path)
+    if store is not None:
+        return store
+    with open(f"{artifact_path}.lock", "a") as lock:
+        # Released when the file is closed
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        store = _open_fresh(data_dir, lookup_file, artifact_path)
+        if store is not None:
+            return store
+        return QuestionStore(build_artifact(data_dir, lookup_file, artifact_path))
+
+
+def _open_fresh(data_dir: str, lookup_file: str, artifact_path: str) -> Optional["QuestionStore"]:
+    try:
+        store = QuestionStore(artifact_path)
+    except (FileNotFoundError, ValueError):
+        return None
+    return store if store.sources == source_hashes(data_dir, lookup_file) else None
+
+
+class LiveQuestionStore:
+    """
+    Versioned reference to the QuestionStore currently being served.
+
+    `reload()` compiles (or just opens, if another process already did) the
+    store for the current source files, hands it to every `prepare` callback
+    (e.g. to build indexes over it) and then swaps `current` in a single
+    assignment. Requests read `current` once and keep that snapshot; its
+    mapping stays valid until the last reference to it is dropped, even
+    after the file on disk has been replaced. `watch()` polls the sources'
+    mtimes from a daemon thread so refreshed data is picked up without a
+    restart and off the request path.
+    """
+
+    def __init__(
+        self,
+        data_dir: str = DATA_DIR,
+        lookup_file: str = LOOKUP_FILE,
+        artifact_path: str = ARTIFACT_PATH,
+    ):
+        self.data_dir = data_dir
+        self.lookup_file = lookup_file
+        self.artifact_path = artifact_path
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._preparers: List[Callable[["QuestionStore"], Any]] = []
+        self._signature = self._source_signature()
+        self.current: QuestionStore = load_question_store(data_dir, lookup_file, artifact_path)
+
+    def _source_signature(self) -> Tuple:
+        signature = []
+        for path in list(discover_banks(self.data_dir).values()) + [self.lookup_file]:
+            try:
+                stat = os.stat(path)
+                signature.append((path, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+    def prepare(self, callback: Callable[["QuestionStore"], Any]) -> None:
+        """Have `reload()` call `callback` with each new store before serving it."""
+        self._preparers.append(callback)
+
+    def reload(self) -> bool:
+        """Swap in the store for the current sources. Returns True if the version changed."""
+        with self._lock:
+            signature = self._source_signature()
+            store = load_question_store(self.data_dir, self.lookup_file, self.artifact_path)
+            self._signature = signature
+            if store.version == self.current.version:
+                return False
+            for callback in self._preparers:
+                try:
+                    callback(store)
+                except Exception as e:
+                    # Left for the callback's owner to redo lazily
+                    log_event(logger, logging.ERROR, "question_store.prepare_failed", version=store.version, error=str(e))
+            self.current = store
+            return True
+
+    def watch(self, interval: float) -> None:
+        if self._watcher is not None or interval <= 0:
+            return
+        self._watcher = threading.Thread(
+            target=self._watch, args=(interval,), name="question-store-watcher", daemon=True
+        )
+        self._watcher.start()
+
+    def _watch(self, interval: float) -> None:
+        while True:
+            time.sleep(interval)
+            if self._source_signature() == self._signature:
+                continue
+            try:
+                if self.reload():
+                    log_event(logger, logging.INFO, "question_store.reloaded", questions=len(self.current), version=self.current.version)
+            except Exception as e:
+                # Keep serving the old snapshot; retried on the next tick
+                log_event(logger, logging.ERROR, "question_store.reload_failed", error=str(e))
+
+
+class _Column:
+    """
+    Dictionary-encoded metadata column: one integer code per question plus
+    the table of distinct values, so repeated strings are stored once. Codes
+    are 32-bit, since per-question columns such as cluster_id have about as
+    many distinct values as there are questions.
+    """
+
+    __slots__ = ("codes", "values", "_codes_by_value")
+
+    def __init__(self, codes: Optional[Sequence[int]] = None, values: Optional[List[Any]] = None):
+        self.codes = array("I") if codes is None else codes
+        self.values: List[Any] = values or []
+        self._codes_by_value: Dict[Any, int] = {value: code for code, value in enumerate(self.values)}
+
+    def append(self, value: Any) -> int:
+        code = self._codes_by_value.get(value)
+        if code is None:
+            code = self._codes_by_value[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+        return code
+
+    def __getitem__(self, position: int) -> Any:
+        return self.values[self.codes[position]]
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+
+class _PageCache:
+    """
+    LRU cache of rendered pages bounded by the total size of their bodies
+    rather than their number, since a page can be anything from one summary
+    to a hundred full questions.
+    """
+
+    def __init__(self, max_bytes: int, max_entry: int):
+        self.max_bytes = max_bytes
+        self.max_entry = max_entry
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple, CompressedBody]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Tuple) -> Optional[CompressedBody]:
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return payload
+
+    def put(self, key: Tuple, payload: CompressedBody) -> None:
+        if len(payload) > self.max_entry:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = payload
+            self.size += len(payload)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class QuestionStore:
+    """
+    Read-only view over a compiled question store (see build_artifact).
+
+    The file is opened read-only with mmap and only the id lookups and small
+    value tables live on the heap. Column codes, facet postings, the body
+    offset table and the pre-rendered question bodies are read straight
+    from the mapping, so every worker opening the same file shares one copy
+    through the page cache and a body is only touched when a page needs it.
+
+    Each question has a position (banks in PROGRAMS/SUBJECTS order, file
+    order within a bank). Positions are indexed by `questionId` and
+    `external_id`, and per facet value as sorted position arrays, so list
+    filters are answered by intersecting postings instead of rescanning
+    the banks. When an id appears in more than one bank the first wins.
+    Whole list pages are cached as bytes keyed by their normalized filters,
+    window and field projection, up to PAGE_CACHE_BYTES of them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+
+        if len(self._map) < _HEADER.size:
+            raise ValueError(f"{path} is not a compiled question store")
+        header = _HEADER.unpack_from(self._map)
+        magic, self.format, count, summaries_at, offsets_at, codes_at, postings_at, strings_at, manifest_at, end = header
+        if magic != ARTIFACT_MAGIC or self.format != ARTIFACT_FORMAT:
+            raise ValueError(f"{path} is not a format {ARTIFACT_FORMAT} compiled question store")
+        manifest = json.loads(bytes(view[manifest_at:end]))
+        self.version: str = manifest["version"]
+        self.sources: Dict[str, str] = manifest["sources"]
+        self.banks = [(program, subject) for program, subject, _ in manifest["banks"]]
+        # "<epoch>.<revision>" of the banks this store was compiled from
+        self.revision = f"{manifest['epoch']}.{manifest['revision']}"
+        self.deleted: Dict[str, List[Any]] = manifest["deleted"]
+
+        self._bodies = view[_HEADER.size:summaries_at]
+        self._summaries = view[summaries_at:offsets_at]
+        self.body_offsets = view[offsets_at : offsets_at + (count + 1) * 8].cast("Q")
+        self.summary_offsets = view[offsets_at + (count + 1) * 8 : codes_at].cast("Q")
+        self.columns: Dict[str, _Column] = {}
+        for index, name in enumerate(COLUMNS):
+            start = codes_at + index * count * 4
+            values = manifest["columns"][name]
+            if name == "correct_answer":
+                values = [tuple(value) for value in values]
+            self.columns[name] = _Column(view[start : start + count * 4].cast("I"), values)
+
+        string_offsets = view[strings_at : strings_at + (2 * count + 1) * 4].cast("I")
+        strings = view[strings_at + (2 * count + 1) * 4 : manifest_at]
+        ids = [str(strings[string_offsets[i] : string_offsets[i + 1]], "utf-8") for i in range(2 * count)]
+        self.question_ids: List[str] = ids[:count]
+        self.external_ids: List[str] = ids[count:]
+
+        self.by_id: Dict[str, int] = {}
+        self.by_external_id: Dict[str, int] = {}
+        for position in range(count):
+            if self.question_ids[position]:
+                self.by_id.setdefault(self.question_ids[position], position)
+            if self.external_ids[position]:
+                self.by_external_id.setdefault(self.external_ids[position], position)
+
+        self.facets: Dict[str, Dict[Any, Sequence[int]]] = {}
+        for index, facet in enumerate(FACETS):
+            postings = view[postings_at + index * count * 4 : postings_at + (index + 1) * count * 4].cast("I")
+            self.facets[facet] = {}
+            start = 0
+            for value, size in zip(self.columns[facet].values, manifest["postings"][facet]):
+                self.facets[facet][value] = postings[start : start + size]
+                start += size
+
+        self._query = lru_cache(maxsize=1024)(self._compute_query)
+        self._pages = _PageCache(PAGE_CACHE_BYTES, PAGE_CACHE_MAX_ENTRY)
+        self._selectable = lru_cache(maxsize=1024)(self._compute_selectable)
+        self._facet_bitmap = lru_cache(maxsize=1024)(self._compute_facet_bitmap)
+
+    def __len__(self) -> int:
+        return len(self.question_ids)
+
+    def position(self, question_id: str) -> Optional[int]:
+        position = self.by_id.get(question_id)
+        if position is None:
+            position = self.by_external_id.get(question_id)
+        return position
+
+    def canonical_id(self, position: int) -> str:
+        """The id attempts on this question are recorded under: its questionId, else its external_id."""
+        return self.question_ids[position] or self.external_ids[position]
+
+    def correct_answer(self, position: int) -> List[str]:
+        return list(self.columns["correct_answer"][position])
+
+    def body(self, position: int) -> bytes:
+        """The pre-rendered QuestionBasic JSON for one question."""
+        return bytes(self._bodies[self.body_offsets[position] : self.body_offsets[position + 1]])
+
+    def summary(self, position: int) -> bytes:
+        """The question's SUMMARY_FIELDS as JSON, without touching its body."""
+        return bytes(self._summaries[self.summary_offsets[position] : self.summary_offsets[position + 1]])
+
+    def render(self, position: int, fields: Optional[Tuple[str, ...]] = None) -> bytes:
+        """
+        The question's JSON with only `fields` (as returned by parse_fields),
+        or its whole body when None. Projections within SUMMARY_FIELDS are
+        cut from the summary, so the heavy HTML fields are never read.
+        """
+        if fields is None:
+            return self.body(position)
+        if fields == SUMMARY_FIELDS:
+            return self.summary(position)
+        if set(fields) <= set(SUMMARY_FIELDS):
+            return project_json(self.summary(position), fields)
+        return project_json(self.body(position), fields)
+
+    def question_data(self, position: int) -> Dict[str, Any]:
+        return json.loads(self.body(position))
+
+    def query(
+        self,
+        program: Optional[str] = None,
+        subject: Optional[str] = None,
+        category: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        skill: Optional[str] = None,
+        primary_class: Optional[str] = None,
+        score_band: Optional[int] = None,
+        dedup: bool = False,
+    ) -> Sequence[int]:
+        """
+        Positions of the questions matching every given filter, in load order.
+        `category` matches `primary_class_cd_desc` exactly; `skill` and
+        `primary_class` are case-insensitive substring matches, as the list
+        endpoints have always treated them. Empty filters are ignored. With
+        `dedup`, only the first match from each near-duplicate cluster is kept.
+        """
+        return self._query(*_normalize_filters(program, subject, category, difficulty, skill, primary_class, score_band, dedup))
+
+    def page_json(
+        self,
+        offset: int,
+        limit: int,
+        page: int,
+        program: Optional[str] = None,
+        subject: Optional[str] = None,
+        category: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        skill: Optional[str] = None,
+        primary_class: Optional[str] = None,
+        score_band: Optional[int] = None,
+        dedup: bool = False,
+        fields: Optional[Tuple[str, ...]] = None,
+    ) -> bytes:
+        """
+        A serialized PaginatedResponse for the given filters and window,
+        assembled from the pre-rendered questions and cached as bytes. With
+        `fields`, each question carries only those (see render).
+        """
+        return self.page(offset, limit, page, program, subject, category, difficulty, skill, primary_class, score_band, dedup, fields).body
+
+    def page(
+        self,
+        offset: int,
+        limit: int,
+        page: int,
+        program: Optional[str] = None,
+        subject: Optional[str] = None,
+        category: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        skill: Optional[str] = None,
+        primary_class: Optional[str] = None,
+        score_band: Optional[int] = None,
+        dedup: bool = False,
+        fields: Optional[Tuple[str, ...]] = None,
+    ) -> CompressedBody:
+        """
+        page_json's page together with its compressed variants, which are
+        cached alongside it once first requested.
+        """
+        filters = _normalize_filters(program, subject, category, difficulty, skill, primary_class, score_band, dedup)
+        key = (filters, offset, limit, page, fields)
+        payload = self._pages.get(key)
+        if payload is None:
+            payload = self._render_page(*key)
+            self._pages.put(key, payload)
+        return payload
+
+    def selectable(
+        self,
+        program: Optional[str] = None,
+        subject: Optional[str] = None,
+        category: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        skill: Optional[str] = None,
+        primary_class: Optional[str] = None,
+        score_band: Optional[int] = None,
+    ) -> Tuple[Sequence[int], int]:
+        """
+        The active questions (live in lookup.json) matching the filters, as
+        sorted positions and as a bitset in which bit i is position i.
+        """
+        return self._selectable(*_normalize_filters(program, subject, category, difficulty, skill, primary_class, score_band))
+
+    def facet_bitmap(self, facet: str, value: Any) -> int:
+        """Bitset of the questions whose `facet` is exactly `value`."""
+        return self._facet_bitmap(facet, value)
+
+    def bitmap(self, question_ids: Iterable[str]) -> int:
+        """Bitset of the given question ids; ids not in the store are skipped."""
+        return to_bitmap(position for position in map(self.position, question_ids) if position is not None)
+
+    def since(self, token: str) -> Optional[int]:
+        """
+        The revision number in a "<epoch>.<revision>" token previously read
+        from `revision`, or None if the token comes from a different revision
+        log (e.g. one that was rebuilt from scratch) or from a revision this
+        store hasn't reached (e.g. one served by a newer deploy), so nothing
+        can be assumed about what its holder already has. Raises ValueError
+        if the token is malformed.
+        """
+        epoch, _, revision = token.partition(".")
+        if not revision.isdigit():
+            raise ValueError(f"Invalid revision token: {token}")
+        current_epoch, _, current = self.revision.partition(".")
+        if epoch != current_epoch or int(revision) > int(current):
+            return None
+        return int(revision)
+
+    def changed(self, positions: Sequence[int], revision: int) -> Sequence[int]:
+        """The subset of `positions` added or changed after `revision`."""
+        column = self.columns["revision"]
+        newer = {code for code, value in enumerate(column.values) if value > revision}
+        if len(newer) == len(column.values):
+            return positions
+        codes = column.codes
+        return array("I", (position for position in positions if codes[position] in newer))
+
+    def deleted_since(
+        self,
+        revision: int,
+        program: Optional[str] = None,
+        subject: Optional[str] = None,
+        category: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        skill: Optional[str] = None,
+        primary_class: Optional[str] = None,
+        score_band: Optional[int] = None,
+    ) -> List[str]:
+        """
+        Ids of the questions removed after `revision` that matched the given
+        filters, as `query` applies them, when they were removed. A facet a
+        tombstone doesn't record (from before they kept every facet) matches
+        any filter; a client told about a question it never had ignores it.
+        """
+        program, subject, category, difficulty, skill, primary_class, score_band, _ = _normalize_filters(
+            program, subject, category, difficulty, skill, primary_class, score_band
+        )
+        tests = [
+            (facet, lambda value, expected=expected: value == expected)
+            for facet, expected in (
+                ("program", program),
+                ("subject", subject),
+                ("primary_class_cd_desc", category),
+                ("difficulty", difficulty),
+                ("score_band_range_cd", score_band),
+            )
+            if expected is not None
+        ] + [
+            (facet, lambda value, needle=needle: needle in (value or "").lower())
+            for facet, needle in (("skill_desc", skill), ("primary_class_cd_desc", primary_class))
+            if needle is not None
+        ]
+        deleted = []
+        for question_id, (deleted_at, *values) in self.deleted.items():
+            facets = dict(zip(FACETS, values))
+            if deleted_at > revision and all(facet not in facets or test(facets[facet]) for facet, test in tests):
+                deleted.append(question_id)
+        return deleted
+
+    def cache_stats(self) -> Dict[str, Tuple[int, int]]:
+        """(hits, misses) of each of this store's caches."""
+        caches = {"query": self._query, "selectable": self._selectable, "facet_bitmap": self._facet_bitmap}
+        stats = {name: (cache.cache_info().hits, cache.cache_info().misses) for name, cache in caches.items()}
+        stats["page"] = (self._pages.hits, self._pages.misses)
+        return stats
+
+    def _compute_selectable(self, *filters) -> Tuple[Sequence[int], int]:
+        active = self.columns["active"]
+        positions = array("I", (position for position in self._query(*filters) if active[position]))
+        return positions, to_bitmap(positions)
+
+    def _compute_facet_bitmap(self, facet: str, value: Any) -> int:
+        return to_bitmap(self.facets[facet].get(value, ()))
+
+    def _render_page(self, filters: Tuple, offset: int, limit: int, page: int, fields: Optional[Tuple[str, ...]]) -> CompressedBody:
+        positions = self._query(*filters)
+        with STAGE_SECONDS.time(stage="paginate"):
+            bodies = [self.render(position, fields) for position in positions[offset : offset + limit]]
+        with STAGE_SECONDS.time(stage="serialize"):
+            content = b'{"total":%d,"page":%d,"limit":%d,"questions":[%b]}' % (len(positions), page, limit, b",".join(bodies))
+        return CompressedBody(content)
+
+    def _compute_query(self, program, subject, category, difficulty, skill, primary_class, score_band, dedup) -> Sequence[int]:
+        with STAGE_SECONDS.time(stage="filter"):
+            positions = self._filter(program, subject, category, difficulty, skill, primary_class, score_band)
+        if not dedup:
+            return positions
+        with STAGE_SECONDS.time(stage="dedup"):
+            clusters = self.columns["cluster_id"].codes
+            seen = set()
+            kept = array("I")
+            for position in positions:
+                cluster = clusters[position]
+                if cluster not in seen:
+                    seen.add(cluster)
+                    kept.append(position)
+        return kept
+
+    def _filter(self, program, subject, category, difficulty, skill, primary_class, score_band) -> Sequence[int]:
+        postings = []
+        for facet, value in (
+            ("program", program),
+            ("subject", subject),
+            ("primary_class_cd_desc", category),
+            ("difficulty", difficulty),
+            ("score_band_range_cd", score_band),
+        ):
+            if value is not None:
+                postings.append(self.facets[facet].get(value, array("I")))
+        if skill is not None:
+            postings.append(self._substring_postings("skill_desc", skill))
+        if primary_class is not None:
+            postings.append(self._substring_postings("primary_class_cd_desc", primary_class))
+
+        if not postings:
+            return array("I", range(len(self)))
+        return _intersect(postings)
+
+    def _substring_postings(self, facet: str, needle: str) -> Sequence[int]:
+        matches = [
+            postings
+            for value, postings in self.facets[facet].items()
+            if needle in (value or "").lower()
+        ]
+        if len(matches) == 1:
+            return matches[0]
+        return array("I", sorted(position for postings in matches for position in postings))
+
+
+def _normalize_filters(program, subject, category, difficulty, skill, primary_class, score_band, dedup=False) -> Tuple:
+    return (
+        program or None,
+        subject or None,
+        category or None,
+        difficulty or None,
+        skill.lower() if skill else None,
+        primary_class.lower() if primary_class else None,
+        score_band,
+        bool(dedup),
+    )
+
+
+def to_bitmap(positions: Iterable[int]) -> int:
+    """Packs positions into an int used as a bitset (bit i set for position i)."""
+    bits = bytearray()
+    for position in positions:
+        index = position >> 3
+        if index >= len(bits):
+            bits.extend(bytes(index - len(bits) + 1))
+        bits[index] |= 1 << (position & 7)
+    return int.from_bytes(bits, "little")
+
+
+def _intersect(postings: Iterable[Sequence[int]]) -> Sequence[int]:
+    postings = sorted(postings, key=len)
+    result = postings[0]
+    for other in postings[1:]:
+        if not result:
+            break
+        members = set(other)
+        result = array("I", (position for position in result if position in members))
+    return result
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--check"]:
+        # Fails when the banks changed without the revision log being updated
+        # and committed with them (see REVISIONS_FILE)
+        if not revisions_up_to_date():
+            sys.exit(f"{os.path.join(DATA_DIR, REVISIONS_FILE)} is out of date; run `python question_store.py` and commit it")
+        print(f"{os.path.join(DATA_DIR, REVISIONS_FILE)} is up to date")
+        sys.exit(0)
+    output_path = sys.argv[1] if len(sys.argv) > 1 else ARTIFACT_PATH
+    build_artifact(output_path=output_path, write_revisions=True)
+    store = QuestionStore(output_path)
+    print(f"Compiled {len(store)} questions from {len(store.banks)} banks into {output_path} (version {store.version})")
@@ -0,0 +1,226 @@
+import html
+import math
+import re
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Characters of context kept around the first match in a snippet
+SNIPPET_CHARS = 160
+
+_TAG = re.compile(r"<[^>]*>")
+_TOKEN = re.compile(r"\w+")
+_QUERY_PART = re.compile(r'"([^"]*)"|(\S+)')
+
+_EMPTY_POSITIONS = np.zeros(0, dtype=np.uint32)
+_EMPTY_SCORES = np.zeros(0, dtype=np.float64)
+
+
+def plain_text(markup: str) -> str:
+    """HTML stripped to its text, with entities such as &rsquo; decoded."""
+    return html.unescape(_TAG.sub(" ", markup or ""))
+
+
+def tokenize(text: str) -> List[str]:
+    return [_normalize_token(match.group()) for match in _TOKEN.finditer(text)]
+
+
+def question_fields(question: Dict[str, Any]) -> List[str]:
+    """The searchable text of a question, stem and passage first."""
+    fields = [question.get("question"), question.get("questionDetail")]
+    fields.extend(option.get("content") for option in question.get("answerOptions") or [])
+    fields.append(question.get("explanation"))
+    return [plain_text(field) for field in fields if field]
+
+
+def parse_query(query: str) -> Tuple[List[str], List[List[str]]]:
+    """Splits a query into bare terms and "quoted phrases", both tokenized."""
+    terms, phrases = [], []
+    for match in _QUERY_PART.finditer(query):
+        phrase, word = match.groups()
+        tokens = tokenize(phrase if phrase is not None else word)
+        if phrase is not None and len(tokens) > 1:
+            phrases.append(tokens)
+        else:
+            terms.extend(tokens)
+    return terms, phrases
+
+
+class SearchIndex:
+    """
+    In-memory BM25 index over the text of every question in one QuestionStore.
+
+    Questions are indexed by position, over their stem, passage, answer
+    options and explanation with HTML stripped and entities decoded. Postings
+    are stored CSR-style in numpy arrays: for each term, the sorted positions
+    containing it and how often. Every question's token ids are also kept
+    back to back so phrases are verified against the whole corpus in one
+    vectorized pass. A search returns the positions containing every term
+    and phrase, best first.
+    """
+
+    def __init__(self, store: Any):
+        self.store = store
+        self.version = store.version
+        # Term 0 separates fields, so a phrase never spans two of them
+        self.terms: Dict[str, int] = {"": 0}
+
+        token_ids: List[int] = []
+        lengths: List[int] = []
+        for position in range(len(store)):
+            start = len(token_ids)
+            for field in question_fields(store.question_data(position)):
+                token_ids.extend(self.terms.setdefault(token, len(self.terms)) for token in tokenize(field))
+                token_ids.append(0)
+            lengths.append(len(token_ids) - start)
+
+        self.tokens = np.array(token_ids, dtype=np.uint32)
+        self.token_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.token_offsets[1:])
+        documents = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+
+        # One entry per distinct (term, position) pair, sorted by term then position
+        pairs, frequencies = np.unique(self.tokens.astype(np.int64) * max(len(lengths), 1) + documents, return_counts=True)
+        self.postings = (pairs % max(len(lengths), 1)).astype(np.uint32)
+        self.frequencies = frequencies.astype(np.float32)
+        self.term_offsets = np.searchsorted(pairs // max(len(lengths), 1), np.arange(len(self.terms) + 1))
+
+        separators = np.bincount(documents[self.tokens == 0], minlength=len(lengths))
+        self.lengths = (np.asarray(lengths) - separators).astype(np.float32)
+        self.average_length = float(self.lengths.mean()) if len(lengths) else 0.0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def search(self, query: str, allowed: Optional[Sequence[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Positions of every question matching `query` and their scores, best
+        first. `allowed` optionally restricts results to the given sorted
+        positions (e.g. a QuestionStore.query result).
+        """
+        terms, phrases = parse_query(query)
+        words = terms + [token for phrase in phrases for token in phrase]
+        term_ids = [self.terms.get(word) for word in dict.fromkeys(words)]
+        if not term_ids or None in term_ids:
+            return _EMPTY_POSITIONS, _EMPTY_SCORES
+
+        candidates = None
+        for term_id in sorted(term_ids, key=lambda term_id: self.term_offsets[term_id + 1] - self.term_offsets[term_id]):
+            postings = self.postings[self.term_offsets[term_id] : self.term_offsets[term_id + 1]]
+            candidates = postings if candidates is None else np.intersect1d(candidates, postings, assume_unique=True)
+        if allowed is not None:
+            candidates = np.intersect1d(candidates, np.asarray(allowed, dtype=np.uint32), assume_unique=True)
+        for phrase in phrases:
+            candidates = np.intersect1d(candidates, self._phrase_positions([self.terms[word] for word in phrase]), assume_unique=True)
+        if not len(candidates):
+            return _EMPTY_POSITIONS, _EMPTY_SCORES
+
+        length_norm = K1 * (1 - B + B * self.lengths[candidates] / self.average_length)
+        scores = np.zeros(len(candidates), dtype=np.float64)
+        for term_id in term_ids:
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            frequencies = self.frequencies[start + np.searchsorted(self.postings[start:end], candidates)]
+            idf = math.log(1 + (len(self) - (end - start) + 0.5) / (end - start + 0.5))
+            scores += idf * frequencies * (K1 + 1) / (frequencies + length_norm)
+        order = np.lexsort((candidates, -scores))
+        return candidates[order], scores[order]
+
+    def snippet(self, position: int, query: str) -> str:
+        """
+        An HTML-escaped excerpt around the first match, from the field that
+        matches the most distinct query words, with matching words wrapped in
+        <mark>.
+        """
+        terms, phrases = parse_query(query)
+        words = set(terms) | {token for phrase in phrases for token in phrase}
+        fields = question_fields(self.store.question_data(position))
+        best_text, best_matches, best_words = (fields[0] if fields else ""), [], 0
+        for text in fields:
+            matches = [match for match in _TOKEN.finditer(text) if _normalize_token(match.group()) in words]
+            matched_words = len({_normalize_token(match.group()) for match in matches})
+            if matched_words > best_words:
+                best_text, best_matches, best_words = text, matches, matched_words
+        return _highlight(best_text, best_matches)
+
+    def _phrase_positions(self, phrase_ids: List[int]) -> np.ndarray:
+        """Sorted positions whose text contains the token ids in sequence."""
+        starts = np.flatnonzero(self.tokens[: len(self.tokens) - len(phrase_ids) + 1] == phrase_ids[0])
+        for offset, term_id in enumerate(phrase_ids[1:], 1):
+            starts = starts[self.tokens[starts + offset] == term_id]
+        # Fields end in a separator token, so a match never runs into the next question
+        return np.unique(np.searchsorted(self.token_offsets, starts, side="right") - 1).astype(np.uint32)
+
+
+class LiveSearchIndex:
+    """
+    The SearchIndex for whatever LiveQuestionStore currently serves. After a
+    reload it's already built, by the reloading thread before the new store
+    was swapped in; otherwise it's built on first use.
+    """
+
+    def __init__(self, live_store: Any):
+        self.live_store = live_store
+        # By store version; replaced rather than mutated, so reads need no lock
+        self._indexes: Dict[str, SearchIndex] = {}
+        self._lock = threading.Lock()
+        live_store.prepare(self.prepare)
+
+    @property
+    def current(self) -> SearchIndex:
+        store = self.live_store.current
+        index = self._indexes.get(store.version)
+        if index is None or len(self._indexes) > 1:
+            with self._lock:
+                index = self._indexes.get(store.version)
+                if index is None:
+                    index = SearchIndex(store)
+                # Requests still on an older store already hold its index
+                self._indexes = {store.version: index}
+        return index
+
+    def prepare(self, store: Any) -> None:
+        """Build the index for `store` ahead of it being served."""
+        if store.version in self._indexes:
+            return
+        index = SearchIndex(store)
+        with self._lock:
+            self._indexes = {**self._indexes, store.version: index}
+
+
+def _normalize_token(token: str) -> str:
+    return token.lower()
+
+
+def _highlight(text: str, matches: List[re.Match]) -> str:
+    text_start = 0
+    if matches:
+        text_start = max(0, matches[0].start() - SNIPPET_CHARS // 3)
+        # Don't start mid-word
+        if text_start:
+            space = text.find(" ", text_start)
+            text_start = space + 1 if 0 <= space < matches[0].start() else matches[0].start()
+    text_end = min(len(text), text_start + SNIPPET_CHARS)
+    if text_end < len(text):
+        space = text.rfind(" ", text_start, text_end)
+        if space > text_start:
+            text_end = space
+
+    parts = ["…" if text_start else ""]
+    cursor = text_start
+    for match in matches:
+        if match.start() < cursor:
+            continue
+        if match.end() > text_end:
+            break
+        parts.append(html.escape(text[cursor : match.start()], quote=False))
+        parts.append(f"<mark>{html.escape(match.group(), quote=False)}</mark>")
+        cursor = match.end()
+    parts.append(html.escape(text[cursor:text_end], quote=False))
+    if text_end < len(text):
+        parts.append("…")
+    return " ".join("".join(parts).split())
@@ -0,0 +1,77 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Callable, Dict, Optional, Type
+
+from pydantic import BaseModel
+
+from compression import CompressedBody
+
+# How long a request waits for stats generation already in progress
+GENERATION_WAIT_SECONDS = 30.0
+
+
+class StatsUnavailable(Exception):
+    """Raised when the stats files are missing and generation didn't finish in time."""
+
+
+class CachedStats:
+    """A stats payload validated and serialized once, plus its compressed variants and ETag."""
+
+    __slots__ = ("body", "compressed", "etag", "mtime_ns")
+
+    def __init__(self, body: bytes, mtime_ns: int):
+        self.body = body
+        self.compressed = CompressedBody(body)
+        self.etag = f'W/"{hashlib.sha1(body).hexdigest()[:20]}"'
+        self.mtime_ns = mtime_ns
+
+
+class StatsCache:
+    """
+    In-memory copies of the generated stats files.
+
+    Each file is read and run through its response model once, then served
+    from memory until its mtime changes (e.g. after the daily stats job).
+    When the files are missing, `generate()` rebuilds them on a background
+    thread; concurrent callers share that single run instead of each
+    starting their own.
+    """
+
+    def __init__(self, stats_dir: str, generate_files: Callable[[], object]):
+        self.stats_dir = stats_dir
+        self._generate_files = generate_files
+        self._entries: Dict[str, CachedStats] = {}
+        self._lock = threading.Lock()
+        self._generation: Optional[threading.Thread] = None
+
+    def get(self, filename: str, model: Type[BaseModel]) -> CachedStats:
+        path = os.path.join(self.stats_dir, filename)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self.generate().join(GENERATION_WAIT_SECONDS)
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                raise StatsUnavailable(f"{filename} is being generated, try again shortly")
+
+        entry = self._entries.get(filename)
+        if entry is None or entry.mtime_ns != mtime_ns:
+            with open(path, "r") as f:
+                data = json.load(f)
+            entry = CachedStats(model.model_validate(data).model_dump_json().encode("utf-8"), mtime_ns)
+            self._entries[filename] = entry
+        return entry
+
+    def generate(self) -> threading.Thread:
+        """Start regenerating the stats files unless a run is already in progress."""
+        with self._lock:
+            if self._generation is None or not self._generation.is_alive():
+                self._generation = threading.Thread(target=self._generate_files, name="stats-generation", daemon=True)
+                self._generation.start()
+            return self._generation
+
+    def missing(self, *filenames: str) -> bool:
+        return any(not os.path.exists(os.path.join(self.stats_dir, filename)) for filename in filenames)
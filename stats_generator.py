@@ -1,7 +1,9 @@
 import json
 import os
-import re
-from collections import defaultdict
+import sys
+import numpy as np
+from dedup import cluster_representatives, question_text
+from question_store import BANK_FILE_PATTERN, REVISIONS_FILE
 
 # Define the paths
 DATA_DIR = "data"
@@ -11,70 +13,83 @@ LOOKUP_FILE = "lookup.json"
 # Ensure output directory exists
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-# Function to convert defaultdict to dict for JSON serialization
-def defaultdict_to_dict(d):
-    if isinstance(d, defaultdict):
-        d = {k: defaultdict_to_dict(v) for k, v in d.items()}
-    elif isinstance(d, dict):
-        d = {k: defaultdict_to_dict(v) for k, v in d.items()}
-    elif isinstance(d, list):
-        d = [defaultdict_to_dict(x) for x in d]
-    return d
-
-def analyze_data(data_dir=DATA_DIR, lookup_file=LOOKUP_FILE):
+# Facet columns every question is encoded into, in this order
+FACET_COLUMNS = ("program", "subject", "main_category", "subcategory", "difficulty", "score_band")
+PROGRAM, SUBJECT, MAIN_CATEGORY, SUBCATEGORY, DIFFICULTY, SCORE_BAND = range(len(FACET_COLUMNS))
+
+def _status_counts(active, total):
+    return {"active": int(active), "inactive": int(total - active), "total": int(total)}
+
+def _ravel(keys):
+    dims = tuple(int(d) for d in keys.max(axis=0) + 1)
+    return np.ravel_multi_index(tuple(keys.T), dims), dims
+
+def _facet_cube(codes, is_active):
+    """
+    One grouped bincount over every facet column: the distinct code rows,
+    with the index each first appears at and its active and total counts.
+    Every breakdown is a roll-up of this (much smaller) table.
+    """
+    if not len(codes):
+        return np.zeros((0, codes.shape[1]), dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+    flat, dims = _ravel(codes)
+    unique, first_seen, inverse = np.unique(flat, return_index=True, return_inverse=True)
+    totals = np.bincount(inverse, minlength=len(unique))
+    actives = np.bincount(inverse[is_active], minlength=len(unique))
+    combos = np.stack(np.unravel_index(unique, dims), axis=1)
+    return combos, first_seen, actives, totals
+
+def _rollup(cube, columns, distinct=None):
+    """
+    Active and total question counts for every distinct combination of the
+    given facet columns, as (codes, active, total) tuples in order of first
+    appearance. That order matches the key insertion order the old
+    nested-defaultdict aggregation produced, which keeps the JSON output
+    byte-identical.
+
+    With `distinct`, a column of cluster codes, each cluster counts once per
+    combination (as active if any of its questions is) however many of its
+    questions fall in it.
+    """
+    combos, first_seen, actives, totals = cube
+    if not len(combos):
+        return []
+    if distinct is not None:
+        flat, dims = _ravel(combos[:, list(columns) + [distinct]])
+        unique, inverse = np.unique(flat, return_inverse=True)
+        pair_first = np.full(len(unique), first_seen.max() + 1)
+        np.minimum.at(pair_first, inverse, first_seen)
+        pair_actives = np.zeros(len(unique), dtype=np.int64)
+        np.maximum.at(pair_actives, inverse, (actives > 0).astype(np.int64))
+        combos = np.stack(np.unravel_index(unique, dims), axis=1)
+        first_seen, actives, totals = pair_first, pair_actives, np.ones(len(unique), dtype=np.int64)
+        columns = list(range(len(columns)))
+    flat, dims = _ravel(combos[:, columns])
+    unique, inverse = np.unique(flat, return_inverse=True)
+    group_totals = np.bincount(inverse, weights=totals, minlength=len(unique)).astype(np.int64)
+    group_actives = np.bincount(inverse, weights=actives, minlength=len(unique)).astype(np.int64)
+    group_first = np.full(len(unique), first_seen.max() + 1)
+    np.minimum.at(group_first, inverse, first_seen)
+    order = np.argsort(group_first, kind="stable")
+    group_combos = np.stack(np.unravel_index(unique[order], dims), axis=1)
+    return [
+        (tuple(combo), active, total)
+        for combo, active, total in zip(group_combos.tolist(), group_actives[order].tolist(), group_totals[order].tolist())
+    ]
+
+def analyze_data(data_dir=DATA_DIR, lookup_file=LOOKUP_FILE, dedup=False):
     """
     Analyze all data files and generate statistics about question counts
     by program, category, and subcategory.
-    """
-    stats = {
-        "total_questions": 0,
-        "total_active": 0,
-        "total_inactive": 0,
-        "by_program": defaultdict(lambda: {
-            "total": 0, "active": 0, "inactive": 0,
-            "subjects": defaultdict(lambda: {
-                "total": 0, "active": 0, "inactive": 0,
-                "categories": defaultdict(lambda: {"active": 0, "inactive": 0, "total": 0}),
-                "subcategories": defaultdict(lambda: {"active": 0, "inactive": 0, "total": 0}),
-                "by_difficulty": defaultdict(lambda: { # difficulty_key
-                    "categories": defaultdict(lambda: {"active": 0, "inactive": 0, "total": 0}), # main_cat -> counts
-                    "total_counts": {"active": 0, "inactive": 0, "total": 0} 
-                }),
-                "by_score_band": defaultdict(lambda: { # score_band_key
-                    "categories": defaultdict(lambda: {"active": 0, "inactive": 0, "total": 0}), # main_cat -> counts
-                    "total_counts": {"active": 0, "inactive": 0, "total": 0}
-                })
-            })
-        }),
-        "by_main_category_overall": defaultdict(lambda: {"active": 0, "inactive": 0, "total": 0}),
-        "by_subcategory_overall": defaultdict(lambda: {"active": 0, "inactive": 0, "total": 0}),
-        "by_difficulty_overall": defaultdict(lambda: { # difficulty_key
-            "categories": defaultdict(lambda: {"active": 0, "inactive": 0, "total": 0}), # main_cat -> counts
-            "total_counts": {"active": 0, "inactive": 0, "total": 0}
-        }),
-        "by_score_band_overall": defaultdict(lambda: { # score_band_key
-            "categories": defaultdict(lambda: {"active": 0, "inactive": 0, "total": 0}), # main_cat -> counts
-            "total_counts": {"active": 0, "inactive": 0, "total": 0}
-        }),
-        "detailed": defaultdict(lambda: defaultdict(lambda: { # program -> subject
-            "main_categories_breakdown": defaultdict(lambda: { # main_category_name
-                "active": 0, "inactive": 0, "total": 0,
-                "by_difficulty_status": defaultdict(lambda: {"active": 0, "inactive": 0, "total": 0}), # diff_key -> counts
-                "by_score_band_status": defaultdict(lambda: {"active": 0, "inactive": 0, "total": 0}), # band_key -> counts
-                "subcategories_breakdown": defaultdict(lambda: { # sub_category_name
-                    "active": 0, "inactive": 0, "total": 0,
-                    "by_difficulty_status": defaultdict(lambda: {"active": 0, "inactive": 0, "total": 0}),
-                    "by_score_band_status": defaultdict(lambda: {"active": 0, "inactive": 0, "total": 0}),
-                    "by_difficulty_scoreband_status": defaultdict( # difficulty_key
-                        lambda: defaultdict( # score_band_key
-                            lambda: {"active": 0, "inactive": 0}
-                        )
-                    )
-                })
-            })
-        }))
-    }
 
+    Every question is encoded once as a row of integer facet codes. A single
+    grouped bincount over those rows gives counts per distinct combination,
+    and each breakdown is a roll-up of that table.
+
+    With `dedup`, near-duplicate questions (see dedup.py) count once: every
+    count is of distinct clusters, e.g. a passage shared by the SAT and
+    PSAT89 banks counts once overall and once in each program.
+    """
     math_live_items = set()
     rw_live_items = set()
     try:
@@ -88,10 +103,40 @@ def analyze_data(data_dir=DATA_DIR, lookup_file=LOOKUP_FILE):
     except json.JSONDecodeError:
         print(f"Warning: Error decoding {lookup_file}. All items will be marked as inactive.")
 
-    file_pattern = re.compile(r"^(SAT|PSAT89|PSAT10NMSQT)_(math|RW)\.json$", re.IGNORECASE)
+    file_pattern = BANK_FILE_PATTERN
     found_files = []
     print(f"Looking for question files in {data_dir}:")
 
+    # Codes per facet column; a value's code is its position in the table,
+    # so tables list values in order of first appearance
+    value_codes = [{} for _ in FACET_COLUMNS]
+    code_columns = [[] for _ in FACET_COLUMNS]
+    active_flags = []
+    # Stem and options of every question, for clustering when deduplicating
+    texts = []
+    # Every (program, subject) whose file loaded, including empty ones
+    loaded_banks = []
+
+    def encode(column, raw_values):
+        table = value_codes[column]
+        return [table.setdefault(value, len(table)) for value in raw_values]
+
+    def encode_normalized(column, raw_values, normalize):
+        # Normalize each distinct raw value once rather than once per question
+        raw_table = {}
+        raw_codes = [raw_table.setdefault(value, len(raw_table)) for value in raw_values]
+        mapping = encode(column, [normalize(value) for value in raw_table])
+        return [mapping[code] for code in raw_codes]
+
+    def normalize_difficulty(difficulty_key):
+        return difficulty_key if difficulty_key in ["E", "M", "H"] else "Unknown"
+
+    def normalize_score_band(score_band):
+        score_band_key = str(score_band)
+        if not score_band_key.isdigit() or not (1 <= int(score_band_key) <= 7):
+            score_band_key = "Unknown"
+        return score_band_key
+
     for filename in os.listdir(data_dir):
         match = file_pattern.match(filename)
         if match:
@@ -113,142 +158,173 @@ def analyze_data(data_dir=DATA_DIR, lookup_file=LOOKUP_FILE):
                 print(f"Error: Could not decode JSON from {filepath}.")
                 continue
 
-            program_level_stats = stats["by_program"][program_name]
-            subject_level_stats = program_level_stats["subjects"][subject_name]
-            detailed_ps_stats = stats["detailed"][program_name][subject_name]
-
-            questions_processed_for_diagnostic = 0 # Initialize counter for diagnostic prints per file
-            for question in questions:
-                stats["total_questions"] += 1
-                program_level_stats["total"] += 1
-                subject_level_stats["total"] += 1
-                
-                main_category = question.get("primary_class_cd_desc", "Unknown")
-                subcategory = question.get("skill_desc", "Unknown")
-                difficulty_key = question.get("difficulty", "Unknown")
-                if difficulty_key not in ["E", "M", "H"]: # Normalize difficulty
-                    difficulty_key = "Unknown"
-                
-                score_band_key = str(question.get("score_band_range_cd", "Unknown"))
-                if not score_band_key.isdigit() or not (1 <= int(score_band_key) <= 7):
-                    score_band_key = "Unknown"
-
-                external_id = question.get("external_id")
-
-                # Diagnostic prints for SAT and PSAT89
-                # if program_name in ["SAT", "PSAT89"] and questions_processed_for_diagnostic < 3: # Print for first 3 questions
-                #     print(f"  [DIAGNOSTIC] File: {filename}, Program: {program_name}, Subject: {subject_name}")
-                #     print(f"    Q_ext_id: '{external_id}', MainCat: '{main_category}', Difficulty: '{difficulty_key}'")
-                #     if external_id:
-                #         target_set_name = "N/A"
-                #         target_set = None
-                #         is_in_set = False
-                #         if subject_name == "MATH":
-                #             target_set_name = "math_live_items"
-                #             target_set = math_live_items
-                #             if target_set is not None:
-                #                 is_in_set = external_id in target_set
-                #         elif subject_name == "RW":
-                #             target_set_name = "rw_live_items"
-                #             target_set = rw_live_items
-                #             if target_set is not None:
-                #                 is_in_set = external_id in target_set
-                #         
-                #         if target_set is not None:
-                #             print(f"    Checking ID '{external_id}' in '{target_set_name}' (size {len(target_set)}): Found = {is_in_set}")
-                #         else: # Should not happen with current subject_name normalization
-                #             print(f"    Could not determine target_set for subject_name: {subject_name}")
-                #     else:
-                #         print(f"    External_id is None or empty.")
-                
-                # questions_processed_for_diagnostic += 1 # Increment after potential print
-
-                is_active = False
-                if external_id:
-                    if subject_name == "MATH" and external_id in math_live_items:
-                        is_active = True
-                    elif subject_name == "RW" and external_id in rw_live_items:
-                        is_active = True
-                
-                status_key = "active" if is_active else "inactive"
-
-                # Increment active/inactive totals
-                if is_active:
-                    stats["total_active"] += 1
-                    program_level_stats["active"] +=1
-                    subject_level_stats["active"] += 1
-                else:
-                    stats["total_inactive"] += 1
-                    program_level_stats["inactive"] +=1
-                    subject_level_stats["inactive"] += 1
-
-                # Overall aggregations
-                stats["by_main_category_overall"][main_category][status_key] += 1
-                stats["by_main_category_overall"][main_category]["total"] += 1
-                stats["by_subcategory_overall"][subcategory][status_key] += 1
-                stats["by_subcategory_overall"][subcategory]["total"] += 1
-                
-                stats["by_difficulty_overall"][difficulty_key]["total_counts"][status_key] += 1
-                stats["by_difficulty_overall"][difficulty_key]["total_counts"]["total"] += 1
-                stats["by_difficulty_overall"][difficulty_key]["categories"][main_category][status_key] += 1
-                stats["by_difficulty_overall"][difficulty_key]["categories"][main_category]["total"] += 1
-
-                stats["by_score_band_overall"][score_band_key]["total_counts"][status_key] += 1
-                stats["by_score_band_overall"][score_band_key]["total_counts"]["total"] += 1
-                stats["by_score_band_overall"][score_band_key]["categories"][main_category][status_key] += 1
-                stats["by_score_band_overall"][score_band_key]["categories"][main_category]["total"] += 1
-
-                # Program/Subject specific aggregations
-                subject_level_stats["categories"][main_category][status_key] += 1
-                subject_level_stats["categories"][main_category]["total"] += 1
-                subject_level_stats["subcategories"][subcategory][status_key] += 1
-                subject_level_stats["subcategories"][subcategory]["total"] += 1
-
-                subject_level_stats["by_difficulty"][difficulty_key]["total_counts"][status_key] += 1
-                subject_level_stats["by_difficulty"][difficulty_key]["total_counts"]["total"] += 1
-                subject_level_stats["by_difficulty"][difficulty_key]["categories"][main_category][status_key] += 1
-                subject_level_stats["by_difficulty"][difficulty_key]["categories"][main_category]["total"] += 1
-                
-                subject_level_stats["by_score_band"][score_band_key]["total_counts"][status_key] += 1
-                subject_level_stats["by_score_band"][score_band_key]["total_counts"]["total"] += 1
-                subject_level_stats["by_score_band"][score_band_key]["categories"][main_category][status_key] += 1
-                subject_level_stats["by_score_band"][score_band_key]["categories"][main_category]["total"] += 1
-
-                # Detailed stats
-                main_cat_detailed = detailed_ps_stats["main_categories_breakdown"][main_category]
-                main_cat_detailed[status_key] += 1
-                main_cat_detailed["total"] += 1
-                main_cat_detailed["by_difficulty_status"][difficulty_key][status_key] += 1
-                main_cat_detailed["by_difficulty_status"][difficulty_key]["total"] += 1
-                main_cat_detailed["by_score_band_status"][score_band_key][status_key] += 1
-                main_cat_detailed["by_score_band_status"][score_band_key]["total"] += 1
-                
-                sub_cat_detailed = main_cat_detailed["subcategories_breakdown"][subcategory]
-                sub_cat_detailed[status_key] += 1
-                sub_cat_detailed["total"] += 1
-                sub_cat_detailed["by_difficulty_status"][difficulty_key][status_key] += 1
-                sub_cat_detailed["by_difficulty_status"][difficulty_key]["total"] += 1
-                sub_cat_detailed["by_score_band_status"][score_band_key][status_key] += 1
-                sub_cat_detailed["by_score_band_status"][score_band_key]["total"] += 1
-                sub_cat_detailed["by_difficulty_scoreband_status"][difficulty_key][score_band_key][status_key] += 1
+            program_code, = encode(PROGRAM, [program_name])
+            subject_code, = encode(SUBJECT, [subject_name])
+            loaded_banks.append((program_code, subject_code))
+            live_items = math_live_items if subject_name == "MATH" else rw_live_items
+
+            code_columns[PROGRAM].extend([program_code] * len(questions))
+            code_columns[SUBJECT].extend([subject_code] * len(questions))
+            code_columns[MAIN_CATEGORY].extend(
+                encode(MAIN_CATEGORY, [q.get("primary_class_cd_desc", "Unknown") for q in questions])
+            )
+            code_columns[SUBCATEGORY].extend(encode(SUBCATEGORY, [q.get("skill_desc", "Unknown") for q in questions]))
+            code_columns[DIFFICULTY].extend(encode_normalized(
+                DIFFICULTY, [q.get("difficulty", "Unknown") for q in questions], normalize_difficulty
+            ))
+            code_columns[SCORE_BAND].extend(encode_normalized(
+                SCORE_BAND, [q.get("score_band_range_cd", "Unknown") for q in questions], normalize_score_band
+            ))
+            external_ids = [q.get("external_id") for q in questions]
+            active_flags.extend([bool(external_id) and external_id in live_items for external_id in external_ids])
+            if dedup:
+                texts.extend(question_text(q) for q in questions)
         else:
-            if filename.endswith(".json") and "_" in filename:
+            if filename.endswith(".json") and "_" in filename and filename != REVISIONS_FILE:
                  print(f"Skipping file (does not match program/subject pattern): {filename}")
 
     if not found_files:
         print(f"No data files found matching the pattern (SAT|PSAT89|PSAT10NMSQT)_(math|RW).json in the '{data_dir}' directory.")
         print("Please ensure your data files are named correctly and are in the 'data' subdirectory.")
 
-    return defaultdict_to_dict(stats) # Convert all defaultdicts to dicts
+    values = [list(table) for table in value_codes]
+    codes = np.array(code_columns, dtype=np.int64).T.reshape(len(active_flags), len(FACET_COLUMNS))
+    is_active = np.array(active_flags, dtype=bool)
+    total_questions = len(active_flags)
+    total_active = int(is_active.sum())
+
+    distinct = None
+    if dedup:
+        # Cluster codes ride along as an extra column of the cube
+        clusters = np.array(cluster_representatives(texts), dtype=np.int64).reshape(len(active_flags), 1)
+        codes = np.hstack([codes, clusters])
+        distinct = len(FACET_COLUMNS)
+        total_questions = len(np.unique(clusters))
+        total_active = len(np.unique(clusters[is_active]))
+
+    cube = _facet_cube(codes, is_active)
+
+    def grouped(*columns):
+        return [
+            (tuple(values[column][code] for column, code in zip(columns, combo)), active, total)
+            for combo, active, total in _rollup(cube, list(columns), distinct)
+        ]
+
+    def breakdown_entry():
+        return {"categories": {}, "total_counts": {"active": 0, "inactive": 0, "total": 0}}
+
+    stats = {
+        "total_questions": total_questions,
+        "total_active": total_active,
+        "total_inactive": total_questions - total_active,
+        "by_program": {},
+        "by_main_category_overall": {},
+        "by_subcategory_overall": {},
+        "by_difficulty_overall": {},
+        "by_score_band_overall": {},
+        "detailed": {},
+    }
+
+    for program_code, subject_code in loaded_banks:
+        program_name, subject_name = values[PROGRAM][program_code], values[SUBJECT][subject_code]
+        program_stats = stats["by_program"].setdefault(
+            program_name, {"total": 0, "active": 0, "inactive": 0, "subjects": {}}
+        )
+        program_stats["subjects"].setdefault(subject_name, {
+            "total": 0, "active": 0, "inactive": 0,
+            "categories": {},
+            "subcategories": {},
+            "by_difficulty": {},
+            "by_score_band": {},
+        })
+        stats["detailed"].setdefault(program_name, {}).setdefault(subject_name, {"main_categories_breakdown": {}})
+
+    for (program,), active, total in grouped(PROGRAM):
+        stats["by_program"][program].update(total=int(total), active=int(active), inactive=int(total - active))
+    for (program, subject), active, total in grouped(PROGRAM, SUBJECT):
+        stats["by_program"][program]["subjects"][subject].update(
+            total=int(total), active=int(active), inactive=int(total - active)
+        )
+
+    # Overall aggregations
+    for (category,), active, total in grouped(MAIN_CATEGORY):
+        stats["by_main_category_overall"][category] = _status_counts(active, total)
+    for (subcategory,), active, total in grouped(SUBCATEGORY):
+        stats["by_subcategory_overall"][subcategory] = _status_counts(active, total)
+    for key_column, name in ((DIFFICULTY, "by_difficulty_overall"), (SCORE_BAND, "by_score_band_overall")):
+        for (key,), active, total in grouped(key_column):
+            stats[name].setdefault(key, breakdown_entry())["total_counts"] = _status_counts(active, total)
+        for (key, category), active, total in grouped(key_column, MAIN_CATEGORY):
+            stats[name][key]["categories"][category] = _status_counts(active, total)
+
+    # Program/Subject specific aggregations
+    def subject_stats(program, subject):
+        return stats["by_program"][program]["subjects"][subject]
+
+    for (program, subject, category), active, total in grouped(PROGRAM, SUBJECT, MAIN_CATEGORY):
+        subject_stats(program, subject)["categories"][category] = _status_counts(active, total)
+    for (program, subject, subcategory), active, total in grouped(PROGRAM, SUBJECT, SUBCATEGORY):
+        subject_stats(program, subject)["subcategories"][subcategory] = _status_counts(active, total)
+    for key_column, name in ((DIFFICULTY, "by_difficulty"), (SCORE_BAND, "by_score_band")):
+        for (program, subject, key), active, total in grouped(PROGRAM, SUBJECT, key_column):
+            subject_stats(program, subject)[name].setdefault(key, breakdown_entry())["total_counts"] = (
+                _status_counts(active, total)
+            )
+        for (program, subject, key, category), active, total in grouped(PROGRAM, SUBJECT, key_column, MAIN_CATEGORY):
+            subject_stats(program, subject)[name][key]["categories"][category] = _status_counts(active, total)
+
+    # Detailed stats
+    def main_category_stats(program, subject, category):
+        return stats["detailed"][program][subject]["main_categories_breakdown"][category]
+
+    for (program, subject, category), active, total in grouped(PROGRAM, SUBJECT, MAIN_CATEGORY):
+        stats["detailed"][program][subject]["main_categories_breakdown"][category] = {
+            **_status_counts(active, total),
+            "by_difficulty_status": {},
+            "by_score_band_status": {},
+            "subcategories_breakdown": {},
+        }
+    for key_column, name in ((DIFFICULTY, "by_difficulty_status"), (SCORE_BAND, "by_score_band_status")):
+        for (program, subject, category, key), active, total in grouped(PROGRAM, SUBJECT, MAIN_CATEGORY, key_column):
+            main_category_stats(program, subject, category)[name][key] = _status_counts(active, total)
+
+    for (program, subject, category, subcategory), active, total in grouped(PROGRAM, SUBJECT, MAIN_CATEGORY, SUBCATEGORY):
+        main_category_stats(program, subject, category)["subcategories_breakdown"][subcategory] = {
+            **_status_counts(active, total),
+            "by_difficulty_status": {},
+            "by_score_band_status": {},
+            "by_difficulty_scoreband_status": {},
+        }
+    for key_column, name in ((DIFFICULTY, "by_difficulty_status"), (SCORE_BAND, "by_score_band_status")):
+        for (program, subject, category, subcategory, key), active, total in grouped(
+            PROGRAM, SUBJECT, MAIN_CATEGORY, SUBCATEGORY, key_column
+        ):
+            subcategory_stats = main_category_stats(program, subject, category)["subcategories_breakdown"][subcategory]
+            subcategory_stats[name][key] = _status_counts(active, total)
+    for (program, subject, category, subcategory, difficulty, band), active, total in grouped(
+        PROGRAM, SUBJECT, MAIN_CATEGORY, SUBCATEGORY, DIFFICULTY, SCORE_BAND
+    ):
+        subcategory_stats = main_category_stats(program, subject, category)["subcategories_breakdown"][subcategory]
+        subcategory_stats["by_difficulty_scoreband_status"].setdefault(difficulty, {})[band] = {
+            "active": int(active), "inactive": int(total - active)
+        }
+
+    return stats
+
+def write_json_atomic(path, data):
+    # Write beside the target and rename, so the API never reads a half-written file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
 
-def generate_stats_files(output_dir=OUTPUT_DIR):
-    stats_data = analyze_data()
+def generate_stats_files(output_dir=OUTPUT_DIR, dedup=False):
+    stats_data = analyze_data(dedup=dedup)
     
     os.makedirs(output_dir, exist_ok=True)
     
     detailed_stats_path = os.path.join(output_dir, "question_stats.json")
-    with open(detailed_stats_path, 'w') as f:
-        json.dump(stats_data, f, indent=4)
+    write_json_atomic(detailed_stats_path, stats_data)
     print(f"Detailed stats saved to {detailed_stats_path}")
 
     simplified_stats = {
@@ -313,11 +389,11 @@ def generate_stats_files(output_dir=OUTPUT_DIR):
         }
 
     simplified_stats_path = os.path.join(output_dir, "simplified_stats.json")
-    with open(simplified_stats_path, 'w') as f:
-        json.dump(simplified_stats, f, indent=4)
+    write_json_atomic(simplified_stats_path, simplified_stats)
     print(f"Simplified stats saved to {simplified_stats_path}")
     
     return detailed_stats_path, simplified_stats_path
 
 if __name__ == "__main__":
-    generate_stats_files() 
\ No newline at end of file
+    # --dedup counts each near-duplicate cluster once
+    generate_stats_files(dedup="--dedup" in sys.argv[1:])
@@ -0,0 +1,69 @@
+import json
+import logging
+import random
+import sys
+from typing import Any
+
+# Every API logger lives under this name; configure_logging gives it its own
+# handler so uvicorn's and gunicorn's logging setup is left alone
+ROOT_LOGGER = "sat_api"
+
+# Reserved LogRecord attributes; anything else on a record came from `fields`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_sample_rate = 1.0
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, event, then the event's fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+
+def configure_logging(level: str = "INFO", sample_rate: float = 1.0) -> None:
+    """
+    Send API logs to stderr as JSON lines at `level` and above. Events logged
+    with `sampled=True` (per-request chatter) are kept with probability
+    `sample_rate`.
+    """
+    global _sample_rate
+    _sample_rate = sample_rate
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(level.upper())
+    logger.propagate = False
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def log_event(logger: logging.Logger, level: int, event: str, sampled: bool = False, exc_info: Any = None, **fields: Any) -> None:
+    """
+    Log `event` with `fields` as structured data. Returns before building
+    anything when `level` is disabled, or when a `sampled` event isn't
+    picked, so hot paths only pay for the logs that are written.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if sampled and _sample_rate < 1.0 and random.random() >= _sample_rate:
+        return
+    if sampled:
+        fields["sample_rate"] = _sample_rate
+    logger.log(level, event, extra=fields, exc_info=exc_info)
+
@@ -0,0 +1,86 @@
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# app.py reads its configuration at import time
+os.environ.setdefault("DATA_BACKEND", "memory")
+os.environ.setdefault("SUPABASE_JWT_SECRET", "test-secret-test-secret-test-secret")
+os.environ.setdefault("ADMIN_TOKEN", "test-admin-token")
+os.environ.setdefault("ATTEMPT_SPOOL_DIR", tempfile.mkdtemp(prefix="attempt-spool-"))
+os.environ.setdefault("QUESTION_STORE_RELOAD_INTERVAL", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from question_store import QuestionStore, build_artifact  # noqa: E402
+
+STEMS = [
+    "Which choice best states the main idea of the text about coral reef ecosystems and their decline",
+    "Which choice completes the text with the most logical and precise word or phrase for the sentence",
+    "Which finding, if true, would most directly support the researchers' claim about migrating birds",
+    "Which choice most effectively uses data from the table to complete the example about rainfall",
+]
+
+
+def make_question(question_id, external_id, stem, difficulty="M", skill="Inferences", category="Information and Ideas", answer="B"):
+    return {
+        "questionId": question_id,
+        "external_id": external_id,
+        "skill_cd": skill[:3].upper(),
+        "score_band_range_cd": 3,
+        "skill_desc": skill,
+        "program": "SAT",
+        "primary_class_cd_desc": category,
+        "difficulty": difficulty,
+        "question": f"<p>{stem}?</p>",
+        "options": [{"id": letter, "content": f"<p>Option {letter} of the choices</p>"} for letter in "ABCD"],
+        "correct_answer": [answer],
+        "explanation": f"<p>Choice {answer} is the best answer for {question_id}.</p>",
+    }
+
+
+def write_bank(data_dir, questions, filename="SAT_RW.json"):
+    with open(os.path.join(data_dir, filename), "w") as f:
+        json.dump(questions, f)
+
+
+@pytest.fixture
+def bank_questions():
+    return [
+        make_question("q1", "ext-1", STEMS[0], difficulty="H"),
+        make_question("q2", "ext-2", STEMS[1], difficulty="E", skill="Words in Context", category="Craft and Structure", answer="A"),
+        make_question("q3", "ext-3", STEMS[2], skill="Command of Evidence"),
+        # Same stem and options as q1: a near-duplicate
+        make_question("q4", "ext-4", STEMS[0], difficulty="H"),
+        make_question("q5", "", STEMS[3], difficulty="E", category="Craft and Structure"),
+    ]
+
+
+@pytest.fixture
+def bank_dir(tmp_path, bank_questions):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    write_bank(data_dir, bank_questions)
+    with open(tmp_path / "lookup.json", "w") as f:
+        json.dump({"readingLiveItems": ["ext-1", "ext-2", "ext-3"], "mathLiveItems": []}, f)
+    return tmp_path
+
+
+@pytest.fixture
+def store(bank_dir):
+    return QuestionStore(
+        build_artifact(str(bank_dir / "data"), str(bank_dir / "lookup.json"), str(bank_dir / "data" / "questions.bin"), write_revisions=True)
+    )
+
+
+@pytest.fixture(scope="session")
+def api():
+    # The app loads the real banks from paths relative to the repository root
+    os.chdir(ROOT)
+    import app
+
+    return app
@@ -0,0 +1,312 @@
+import asyncio
+import base64
+import datetime
+import json
+import os
+
+import jwt
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+
+def encode(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def token(user_id):
+    claims = {"sub": user_id, "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)}
+    return {"Authorization": "Bearer " + jwt.encode(claims, os.environ["SUPABASE_JWT_SECRET"], algorithm="HS256")}
+
+
+def test_stats_conditional_get(api):
+    client = TestClient(api.app)
+    response = client.get("/stats")
+    assert response.status_code == 200
+    assert response.json()["total_questions"] > 0
+    assert response.headers["Cache-Control"] == f"public, max-age={api.STATS_MAX_AGE}"
+    etag = response.headers["ETag"]
+
+    assert client.get("/stats", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/stats", headers={"If-None-Match": f'W/"other", {etag}'}).status_code == 304
+    assert client.get("/stats", headers={"If-None-Match": 'W/"other"'}).status_code == 200
+    assert client.get("/stats/detailed", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_stats_gzip(api):
+    client = TestClient(api.app)
+    identity = client.get("/stats", headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/stats", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in identity.headers
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.content == identity.content
+    assert gzipped.headers["ETag"] == identity.headers["ETag"]
+
+
+def test_cached_users_skip_the_lookup_until_invalidated(api):
+    user = api.User(id="cached-user", email="cached@example.com", created_at="2024-01-01T00:00:00")
+    api.user_cache.put("cached-user", user)
+    api.user_cache.put_missing("deleted-user")
+    client = TestClient(api.app)
+    assert client.get("/user/attempted", headers=token("deleted-user")).status_code == 404
+    assert client.get("/user/attempted", headers={"Authorization": "Bearer not-a-jwt"}).status_code == 401
+
+    admin = {"X-Admin-Token": os.environ["ADMIN_TOKEN"]}
+    assert client.post("/admin/users/cached-user/invalidate").status_code == 403
+    assert client.post("/admin/users/cached-user/invalidate", headers=admin).status_code == 200
+    assert api.user_cache.lookup("cached-user") == (False, None)
+
+
+@pytest.mark.parametrize(
+    "created_at, question_id",
+    [
+        ("2024-05-01T12:34:56.12345+00:00", "f1bfbed3"),
+        ("2024-05-01T12:34:56", "52a8f1cb-bff4-4dcb-b455-fbc202e8513c"),
+        ("2024-05-01T12:34:56Z", "q1"),
+    ],
+)
+def test_cursor_round_trip(api, created_at, question_id):
+    cursor = api.encode_attempt_cursor({"created_at": created_at, "question_id": question_id})
+    assert api.decode_attempt_cursor(cursor) == (created_at, question_id)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64!",
+        encode(["2024-05-01T12:34:56"]),
+        encode([1, "q1"]),
+        encode(["yesterday", "q1"]),
+        encode(["2024-13-01T12:34:56", "q1"]),
+        encode(['2024-05-01"12:34:56', "q1"]),
+        encode(["2024-05-01T12:34:56", 'q1",question_id.gt."']),
+        encode(["2024-05-01T12:34:56", "q1)"]),
+    ],
+)
+def test_malformed_cursors_are_rejected(api, cursor):
+    with pytest.raises(HTTPException) as error:
+        api.decode_attempt_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_attempted_pages_follow_the_cursor(api):
+    api.db.backend.add_user("paging-user", "paging@example.com", "2024-01-01T00:00:00")
+    question_ids = api.live_store.current.question_ids[:5]
+    api.db.backend.upsert_attempts([
+        {"user_id": "paging-user", "question_id": question_id, "selected_answer": ["A"], "is_correct": index % 2 == 0, "created_at": f"2024-05-0{index + 1}T00:00:00"}
+        for index, question_id in enumerate(question_ids)
+    ])
+    client = TestClient(api.app)
+    headers = token("paging-user")
+
+    seen = []
+    url = "/user/attempted?limit=2"
+    while url:
+        body = client.get(url, headers=headers).json()
+        assert body["total"] == 5
+        seen += [question["questionId"] for question in body["questions"]]
+        url = body["next_cursor"] and f"/user/attempted?limit=2&cursor={body['next_cursor']}"
+    assert seen == list(reversed(question_ids))
+
+    correct = client.get("/user/attempted?limit=10&is_correct=true", headers=headers).json()
+    assert correct["total"] == 3
+    assert client.get("/user/attempted?cursor=bogus", headers=headers).status_code == 400
+
+
+def test_attempted_first_page_includes_spooled_attempts(api, monkeypatch):
+    api.db.backend.add_user("spool-page-user", "spool-page@example.com", "2024-01-01T00:00:00")
+    question_ids = api.live_store.current.question_ids[:4]
+    rows = [
+        {"user_id": "spool-page-user", "question_id": question_id, "selected_answer": ["A"], "is_correct": True, "created_at": f"2024-05-0{index + 1}T00:00:00"}
+        for index, question_id in enumerate(question_ids)
+    ]
+    api.db.backend.upsert_attempts(rows[:3])
+    # A new attempt and a re-attempt of the newest written one, not yet flushed
+    spooled = [dict(rows[3], created_at="2024-06-01T00:00:00"), dict(rows[2], is_correct=False, created_at="2024-06-02T00:00:00")]
+    monkeypatch.setattr(api.attempt_ingest, "pending_rows", lambda user_id: spooled)
+    client = TestClient(api.app)
+    headers = token("spool-page-user")
+
+    seen = []
+    url = "/user/attempted?limit=2"
+    while url:
+        body = client.get(url, headers=headers).json()
+        assert body["total"] == 4
+        seen += [question["questionId"] for question in body["questions"]]
+        url = body["next_cursor"] and f"/user/attempted?limit=2&cursor={body['next_cursor']}"
+    assert seen == [question_ids[2], question_ids[3], question_ids[1], question_ids[0]]
+
+    correct = client.get("/user/attempted?is_correct=true", headers=headers).json()
+    assert correct["total"] == 3
+    assert [question["questionId"] for question in correct["questions"]] == [question_ids[3], question_ids[1], question_ids[0]]
+
+
+def test_progress_counts_a_reattempt_once(api):
+    api.db.backend.add_user("progress-user", "progress@example.com", "2024-01-01T00:00:00")
+    question_store = api.live_store.current
+    question_id = question_store.question_ids[0]
+    correct = question_store.correct_answer(0)
+    headers = token("progress-user")
+    with TestClient(api.app) as client:
+        client.post("/user/attempt-question", json={"question_id": question_id, "selected_answer": ["?"]}, headers=headers)
+        first = client.get("/user/progress", headers=headers).json()
+        client.post("/user/attempt-question", json={"question_id": question_id, "selected_answer": correct}, headers=headers)
+        second = client.get("/user/progress", headers=headers).json()
+    assert (first["total_attempted"], first["total_correct"]) == (1, 0)
+    assert (second["total_attempted"], second["total_correct"]) == (1, 1)
+    assert second["by_program"] == {question_store.columns["program"][0]: {"attempted": 1, "correct": 1, "accuracy": 1.0}}
+
+
+def test_progress_keeps_attempts_spooled_during_the_backend_read(api, monkeypatch):
+    question_store = api.live_store.current
+    question_id = question_store.question_ids[0]
+    row = {"user_id": "spooled-user", "question_id": question_id, "selected_answer": ["?"], "created_at": "2024-01-01T00:00:00"}
+    read = api.db.list_attempt_outcomes
+
+    async def reattempt_during_read(user_id):
+        rows = await read(user_id)
+        api.attempt_ingest.submit(dict(row, is_correct=True, created_at="2024-01-01T00:00:01"))
+        return rows
+
+    with TestClient(api.app):
+        api.attempt_ingest.submit(dict(row, is_correct=False))
+        monkeypatch.setattr(api.db, "list_attempt_outcomes", reattempt_during_read)
+        progress = asyncio.run(api.load_progress("spooled-user"))
+    assert progress.outcomes == {question_id: True}
+
+
+def test_next_questions_skip_attempted_ones(api):
+    api.db.backend.add_user("next-user", "next@example.com", "2024-01-01T00:00:00")
+    headers = token("next-user")
+    url = "/user/next-questions?program=SAT&subject=RW&count=3"
+    with TestClient(api.app) as client:
+        before = client.get(url, headers=headers).json()
+        question_id = before["questions"][0]["questionId"]
+        client.post("/user/attempt-question", json={"question_id": question_id, "selected_answer": ["A"]}, headers=headers)
+        after = client.get(url + "&strategy=weakest", headers=headers).json()
+        assert client.get(url + "&strategy=easiest", headers=headers).status_code == 400
+    assert len(before["questions"]) == 3
+    assert after["remaining"] == before["remaining"] - 1
+    assert question_id not in [question["questionId"] for question in after["questions"]]
+
+
+def test_search_pages_keep_their_scores(api):
+    client = TestClient(api.app)
+    everything = client.get("/questions/search?q=author&limit=6").json()
+    second = client.get("/questions/search?q=author&limit=3&page=2").json()
+    assert everything["total"] == second["total"] > 6
+    assert [(hit["questionId"], hit["score"]) for hit in second["questions"]] == [(hit["questionId"], hit["score"]) for hit in everything["questions"][3:]]
+    scores = [hit["score"] for hit in everything["questions"]]
+    assert scores == sorted(scores, reverse=True)
+    assert all("<mark>" in hit["snippet"].lower() for hit in everything["questions"])
+
+
+def test_export_streams_every_match_and_deltas(api):
+    client = TestClient(api.app)
+    full = client.get("/questions/export?program=SAT&subject=RW&difficulty=H", headers={"Accept-Encoding": "gzip"})
+    assert full.headers["Content-Encoding"] == "gzip"
+    assert full.headers["X-Export-Since"] == "full"
+    lines = [json.loads(line) for line in full.text.splitlines()]
+    page = client.get("/questions/rw?difficulty=H&limit=1").json()
+    assert len(lines) == page["total"]
+    assert lines[0] == page["questions"][0]
+
+    revision = full.headers["X-Question-Revision"]
+    delta = client.get(f"/questions/export?program=SAT&since={revision}&format=json")
+    assert delta.headers["X-Export-Since"] == revision
+    assert delta.json() == []
+    epoch, _, number = revision.partition(".")
+    ahead = client.get(f"/questions/export?program=SAT&subject=RW&difficulty=H&since={epoch}.{int(number) + 1}")
+    assert ahead.headers["X-Export-Since"] == "full"
+    assert len(ahead.text.splitlines()) == len(lines)
+    assert client.get("/questions/export?since=bogus").status_code == 400
+
+
+def test_pages_are_served_precompressed(api):
+    client = TestClient(api.app)
+    identity = client.get("/questions/rw?limit=20", headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/questions/rw?limit=20", headers={"Accept-Encoding": "gzip;q=0.5, unknown"})
+    assert "Content-Encoding" not in identity.headers
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.headers["Vary"] == "Accept-Encoding"
+    assert gzipped.content == identity.content
+
+
+def test_metrics_label_requests_by_route(api):
+    client = TestClient(api.app)
+    client.get("/questions/SAT/RW?limit=1")
+    client.get("/no-such-route")
+    lines = client.get("/metrics").text.splitlines()
+    assert any(line.startswith('http_request_duration_seconds_count{method="GET",route="/questions/{program}/{subject}",status="200"}') for line in lines)
+    assert any(line.startswith('http_request_duration_seconds_count{method="GET",route="unmatched",status="404"}') for line in lines)
+    assert "question_store_questions %d" % len(api.live_store.current) in lines
+
+
+def test_requested_profiles_are_kept_for_admins(api):
+    client = TestClient(api.app)
+    admin = {"X-Admin-Token": os.environ["ADMIN_TOKEN"]}
+    assert "X-Profile-Id" not in client.get("/questions/rw?limit=1", headers={"X-Profile": "1"}).headers
+    profile_id = client.get("/questions/rw?limit=1", headers={"X-Profile": "1", **admin}).headers["X-Profile-Id"]
+
+    assert profile_id in [profile["id"] for profile in client.get("/admin/profiles", headers=admin).json()["profiles"]]
+    assert client.get(f"/admin/profiles/{profile_id}", headers=admin).headers["Content-Type"].startswith("text/plain")
+    assert client.get("/admin/profiles/missing", headers=admin).status_code == 404
+    assert client.get(f"/admin/profiles/{profile_id}").status_code == 403
+
+
+def test_fields_projection_over_http(api):
+    client = TestClient(api.app)
+    summary = client.get("/questions/rw?limit=3&fields=summary").json()["questions"]
+    full = client.get("/questions/rw?limit=3").json()["questions"]
+    assert [list(question) for question in summary] == [["questionId", "difficulty", "skill_desc", "primary_class_cd_desc", "program", "clusterId"]] * 3
+    assert [question["questionId"] for question in summary] == [question["questionId"] for question in full]
+    assert client.get("/questions/rw?fields=html").status_code == 400
+
+    question_id = full[0]["questionId"]
+    assert client.get(f"/questions/{question_id}").json() == full[0]
+    assert client.get("/questions/missing").status_code == 404
+    batch = client.get(f"/questions?ids={question_id},missing&fields=difficulty").json()
+    assert batch == {"questions": [{"questionId": question_id, "difficulty": full[0]["difficulty"]}], "missing": ["missing"]}
+
+
+def test_batch_attempts_are_graded_and_recorded(api):
+    api.db.backend.add_user("batch-user", "batch@example.com", "2024-01-01T00:00:00")
+    question_store = api.live_store.current
+    first, second = question_store.question_ids[:2]
+    attempts = [
+        {"question_id": first, "selected_answer": question_store.correct_answer(0)},
+        {"question_id": second, "selected_answer": ["?"]},
+        {"question_id": "missing", "selected_answer": ["A"]},
+    ]
+    headers = token("batch-user")
+    with TestClient(api.app) as client:
+        body = client.post("/user/attempt-questions", json={"attempts": attempts}, headers=headers).json()
+        progress = client.get("/user/progress", headers=headers).json()
+    assert body["results"] == [{"question_id": first, "is_correct": True}, {"question_id": second, "is_correct": False}]
+    assert body["missing"] == ["missing"]
+    assert (body["total_attempted"], body["total_correct"]) == (2, 1)
+    assert (progress["total_attempted"], progress["total_correct"]) == (2, 1)
+
+
+def test_attempts_are_recorded_under_the_canonical_id(api):
+    api.db.backend.add_user("canonical-user", "canonical@example.com", "2024-01-01T00:00:00")
+    question_store = api.live_store.current
+    position = question_store.position("f1bfbed3")
+    external_id = question_store.external_ids[position]
+    headers = token("canonical-user")
+    with TestClient(api.app) as client:
+        for question_id in ("f1bfbed3", external_id):
+            response = client.post("/user/attempt-question", json={"question_id": question_id, "selected_answer": ["A"]}, headers=headers)
+            assert response.status_code == 200
+        batch = client.post("/user/attempt-questions", json={"attempts": [{"question_id": external_id, "selected_answer": ["A"]}]}, headers=headers)
+        assert batch.json()["results"] == [{"question_id": external_id, "is_correct": False}]
+        assert client.get("/user/progress", headers=headers).json()["total_attempted"] == 1
+    api.attempt_ingest.flush()
+    assert [row["question_id"] for row in api.db.backend.list_attempt_outcomes("canonical-user")] == ["f1bfbed3"]
+
+
+@pytest.mark.parametrize("query", ["limit=101", "limit=-1", "offset=-1", "page=0"])
+def test_list_windows_are_bounded(api, query):
+    client = TestClient(api.app)
+    assert client.get(f"/questions/rw?{query}").status_code == 422
+    assert client.get(f"/questions/search?q=author&{query}").status_code == 422
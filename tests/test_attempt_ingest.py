@@ -0,0 +1,94 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from attempt_ingest import AttemptIngest
+
+
+def row(user_id, question_id, is_correct, created_at="2024-01-01T00:00:00"):
+    return {"user_id": user_id, "question_id": question_id, "selected_answer": ["A"], "is_correct": is_correct, "created_at": created_at}
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def write_spool(path, rows, torn=False):
+    with open(path, "w") as f:
+        for item in rows:
+            f.write(json.dumps(item) + "\n")
+        if torn:
+            f.write('{"user_id": "u1", "quest')
+
+
+def test_recovers_spool_files_of_dead_processes(tmp_path):
+    pid = dead_pid()
+    write_spool(tmp_path / f"attempts-{pid}.log", [row("u1", "q1", False), row("u1", "q2", True), row("u1", "q1", True)], torn=True)
+    write_spool(tmp_path / f"attempts-{pid}.log.1.segment", [row("u2", "q3", True)])
+    # A live process's spool is still being written and is left alone
+    live = tmp_path / f"attempts-{os.getppid()}.log"
+    write_spool(live, [row("u3", "q4", True)])
+
+    written = []
+    ingest = AttemptIngest(written.extend, str(tmp_path), flush_interval=60)
+    ingest.start()
+    assert ingest.pending == 4
+    assert ingest.pending_rows("u1")[-1]["is_correct"] is True
+    ingest.stop()
+
+    # The re-attempt of q1 replaced the first one within the batch
+    assert sorted((item["user_id"], item["question_id"], item["is_correct"]) for item in written) == [
+        ("u1", "q1", True),
+        ("u1", "q2", True),
+        ("u2", "q3", True),
+    ]
+    assert sorted(os.listdir(tmp_path)) == [live.name]
+
+
+def test_failed_flush_keeps_rows_spooled(tmp_path):
+    def fail(rows):
+        raise RuntimeError("backend down")
+
+    ingest = AttemptIngest(fail, str(tmp_path), flush_interval=60)
+    ingest.start()
+    ingest.submit_many([row("u1", "q1", True), row("u1", "q2", False)])
+    with pytest.raises(RuntimeError):
+        ingest.flush()
+    assert ingest.pending == 2
+
+    # Once the backend is back, shutdown writes them and clears the spool
+    written = []
+    ingest.write_rows = written.extend
+    ingest.stop()
+    assert [item["question_id"] for item in written] == ["q1", "q2"]
+    assert os.listdir(tmp_path) == []
+
+
+def test_stop_leaves_rows_spooled_at_the_deadline(tmp_path):
+    written = []
+
+    def slow(rows):
+        time.sleep(0.2)
+        written.extend(rows)
+
+    ingest = AttemptIngest(slow, str(tmp_path), batch_size=1, flush_interval=60)
+    ingest.start()
+    ingest.submit_many([row("u1", "q1", True), row("u1", "q2", False), row("u1", "q3", True)])
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        ingest.stop(timeout=0.1)
+    assert time.monotonic() - started < 1
+    assert [item["question_id"] for item in written] == ["q1"]
+
+    # The unwritten rows are replayed by the next start
+    ingest = AttemptIngest(written.extend, str(tmp_path), flush_interval=60)
+    ingest.start()
+    ingest.stop()
+    assert sorted(item["question_id"] for item in written) == ["q1", "q1", "q2", "q3"]
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,69 @@
+import gzip
+import threading
+
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import compression
+from compression import AVAILABLE_ENCODINGS, CompressedBody, PrecompressedResponse, negotiate_encoding
+
+
+@pytest.mark.parametrize(
+    "accept, expected",
+    [
+        (None, None),
+        ("", None),
+        ("gzip", "gzip"),
+        ("GZIP;q=0.5", "gzip"),
+        ("gzip;q=0", None),
+        ("gzip;q=0.0, deflate", None),
+        ("gzip;q=bogus", None),
+        ("identity", None),
+        ("*", "gzip"),
+        ("*, gzip;q=0", None),
+        ("deflate, *;q=0.1", "gzip"),
+    ],
+)
+def test_negotiate_gzip(accept, expected):
+    assert negotiate_encoding(accept, ("gzip",)) == expected
+
+
+def test_negotiate_prefers_the_servers_order():
+    expected = "br" if "br" in AVAILABLE_ENCODINGS else "gzip"
+    assert negotiate_encoding("gzip, br", ("br", "gzip")) == expected
+    assert negotiate_encoding("gzip, br;q=0", ("br", "gzip")) == "gzip"
+
+
+def test_negotiate_skips_encodings_that_are_not_installed():
+    assert negotiate_encoding("unknown", ("unknown",)) is None
+
+
+def test_compressed_body_is_cached_per_encoding():
+    payload = CompressedBody(b'{"questions":[]}' * 100)
+    encoded = payload.encoded("gzip")
+    assert gzip.decompress(encoded) == payload.body
+    assert payload.encoded("gzip") is encoded
+
+
+def test_precompressed_misses_compress_off_the_event_loop(monkeypatch):
+    threads = {}
+    original = compression.compress
+
+    def recording(body, encoding, level=None):
+        threads["compress"] = threading.current_thread()
+        return original(body, encoding, level)
+
+    async def endpoint(request):
+        threads["loop"] = threading.current_thread()
+        return PrecompressedResponse(payload)
+
+    monkeypatch.setattr(compression, "compress", recording)
+    payload = CompressedBody(b'{"questions":[]}' * 100)
+    client = TestClient(Starlette(routes=[Route("/", endpoint)]))
+    response = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == payload.body
+    assert threads["compress"] is not threads["loop"]
+    assert payload.cached("gzip") is not None
@@ -0,0 +1,34 @@
+import asyncio
+import threading
+
+import pytest
+
+from db import DataAccess, DataAccessTimeout, MemoryBackend
+
+
+def test_calls_give_up_after_the_timeout():
+    release = threading.Event()
+    db = DataAccess(MemoryBackend(), max_concurrency=3, timeout=0.05)
+    try:
+        with pytest.raises(DataAccessTimeout):
+            db.call_blocking(release.wait, 5)
+        with pytest.raises(DataAccessTimeout):
+            asyncio.run(db.call(release.wait, 5))
+        assert db.call_blocking(len, [1, 2]) == 2
+        assert db.in_flight == 0
+    finally:
+        release.set()
+        db.shutdown()
+
+
+def test_in_flight_settles_after_concurrent_blocking_calls():
+    db = DataAccess(MemoryBackend(), max_concurrency=4)
+    try:
+        threads = [threading.Thread(target=lambda: [db.call_blocking(len, "") for _ in range(500)]) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert db.in_flight == 0
+    finally:
+        db.shutdown()
@@ -0,0 +1,41 @@
+import pytest
+
+from metrics import Registry, _Metric
+
+
+def test_render_counters_gauges_and_histograms():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests", ("route",))
+    requests.inc(route="/a")
+    requests.inc(2, route='/b"c')
+    registry.gauge("queue_depth", "Queued\nitems", function=lambda: {(): 3})
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    latency.observe(0.05)
+    latency.observe(0.5)
+
+    lines = registry.render().decode("utf-8").splitlines()
+    assert lines[:4] == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{route="/a"} 1',
+        'requests_total{route="/b\\"c"} 2',
+    ]
+    assert "# HELP queue_depth Queued\\nitems" in lines
+    assert "queue_depth 3" in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 2' in lines
+    assert "latency_seconds_sum 0.55" in lines
+    assert "latency_seconds_count 2" in lines
+
+
+def test_failing_callbacks_do_not_break_the_scrape():
+    registry = Registry()
+    registry.gauge("broken", "Fails", function=lambda: 1 / 0)
+    registry.counter("fine_total", "Works").inc()
+    assert "fine_total 1" in registry.render().decode("utf-8").splitlines()
+
+
+def test_metrics_must_implement_samples():
+    with pytest.raises(TypeError):
+        _Metric("incomplete", "A metric without samples")
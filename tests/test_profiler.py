@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+from profiler import ProfilingMiddleware, StackSampler
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def endpoint(scope, receive, send):
+    busy_loop(0.05)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def call(middleware, headers=()):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/slow", "headers": list(headers)}
+    asyncio.run(middleware(scope, None, send))
+    return dict(sent[0]["headers"])
+
+
+def test_only_admin_requests_are_profiled_by_default():
+    sampler = StackSampler(interval=0.001)
+    middleware = ProfilingMiddleware(endpoint, sampler, admin_token=lambda: "secret")
+
+    assert b"x-profile-id" not in call(middleware)
+    assert b"x-profile-id" not in call(middleware, [(b"x-profile", b"1")])
+    assert b"x-profile-id" not in call(middleware, [(b"x-profile", b"1"), (b"x-admin-token", b"wrong")])
+    assert sampler.finished() == []
+
+    headers = call(middleware, [(b"x-profile", b"1"), (b"x-admin-token", b"secret")])
+    profile = sampler.get(headers[b"x-profile-id"].decode("ascii"))
+    assert profile.summary()["reason"] == "requested"
+    assert profile.status == 200
+    assert profile.duration >= 0.05
+    assert "busy_loop (test_profiler.py:" in profile.collapsed()
+
+
+def test_sampled_requests_and_history():
+    sampler = StackSampler(interval=0.001, history=2)
+    middleware = ProfilingMiddleware(endpoint, sampler, sample_rate=1.0)
+    ids = [call(middleware)[b"x-profile-id"].decode("ascii") for _ in range(3)]
+    assert [profile.id for profile in sampler.finished()] == ids[:0:-1]
+    assert sampler.get(ids[0]) is None
+    assert {profile.reason for profile in sampler.finished()} == {"sampled"}
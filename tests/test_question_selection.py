@@ -0,0 +1,31 @@
+import random
+from array import array
+
+from question_selection import select_questions
+from question_store import to_bitmap
+
+
+def test_random_picks_skip_attempted_questions(store):
+    selectable, bits = store.selectable(program="SAT")
+    attempted = store.bitmap(["q1", "q4", "unknown"])
+    picked, remaining = select_questions(store, selectable, bits, attempted, 5, rng=random.Random(1))
+    assert remaining == 2
+    assert sorted(picked) == [1, 2]
+
+
+def test_weakest_favours_skills_answered_wrong(store):
+    selectable, bits = store.selectable()
+    scores = {"Inferences": (50, 0), "Words in Context": (50, 50), "Command of Evidence": (50, 50)}
+    rng = random.Random(7)
+    picks = [select_questions(store, selectable, bits, 0, 1, "weakest", scores, rng)[0][0] for _ in range(200)]
+    assert picks.count(0) > 180
+
+    picked, remaining = select_questions(store, selectable, bits, 0, 5, "weakest", scores, rng)
+    assert (sorted(picked), remaining) == ([0, 1, 2], 3)
+
+
+def test_finds_the_last_unattempted_question():
+    positions = array("I", range(1000))
+    bits = to_bitmap(positions)
+    picked, remaining = select_questions(None, positions, bits, bits & ~(1 << 637), 3, rng=random.Random(0))
+    assert (picked, remaining) == ([637], 1)
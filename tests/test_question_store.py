@@ -0,0 +1,214 @@
+import json
+import shutil
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import question_store
+from conftest import write_bank
+from question_store import (
+    ARTIFACT_FORMAT,
+    RENDERED_FIELDS,
+    REVISIONS_FILE,
+    SUMMARY_FIELDS,
+    QuestionStore,
+    build_artifact,
+    load_question_store,
+    parse_fields,
+    render_question,
+    revisions_up_to_date,
+)
+
+
+def test_round_trip(store, bank_questions):
+    assert len(store) == len(bank_questions)
+    assert store.banks == [("SAT", "RW")]
+    for position, question in enumerate(bank_questions):
+        assert store.question_ids[position] == question["questionId"]
+        assert store.position(question["questionId"]) == position
+        assert store.correct_answer(position) == question["correct_answer"]
+        assert store.body(position) == render_question(question, store.columns["cluster_id"][position])
+    assert store.position("ext-2") == 1
+    assert store.position("missing") is None
+
+
+def test_canonical_id(store):
+    assert store.canonical_id(store.position("ext-2")) == "q2"
+
+
+def test_columns_hold_more_than_u16_values(bank_dir, bank_questions):
+    data_dir = bank_dir / "data"
+    questions = [
+        dict(bank_questions[0], questionId=f"id-{index}", external_id="", skill_desc=f"skill {index}")
+        for index in range(70000)
+    ]
+    write_bank(data_dir, questions)
+    large = QuestionStore(build_artifact(str(data_dir), str(bank_dir / "lookup.json"), str(data_dir / "questions.bin")))
+    assert large.columns["skill_desc"][69999] == "skill 69999"
+    assert list(large.query(skill="skill 69999")) == [69999]
+
+
+def test_filters_and_pages(store):
+    assert list(store.query(difficulty="H")) == [0, 3]
+    assert list(store.query(category="Craft and Structure", difficulty="E")) == [1, 4]
+    assert list(store.query(skill="WORDS")) == [1]
+    assert list(store.selectable(program="SAT")[0]) == [0, 1, 2]
+
+    page = json.loads(store.page_json(1, 2, 1, program="SAT"))
+    assert page["total"] == 5
+    assert [question["questionId"] for question in page["questions"]] == ["q2", "q3"]
+
+
+def test_page_cache_is_bounded_by_bytes(store):
+    first = store.page(0, 1, 1)
+    assert store.page(0, 1, 1) is first
+    assert store.cache_stats()["page"] == (1, 1)
+
+    store._pages.max_bytes = len(first) + len(store.page(1, 1, 1))
+    store.page(2, 1, 1)
+    assert store._pages.size <= store._pages.max_bytes
+    assert store.page(0, 1, 1) is not first
+
+    store._pages.max_entry = len(first) - 1
+    assert store.page(0, 5, 1) is not store.page(0, 5, 1)
+
+
+def test_near_duplicates_share_a_cluster(store):
+    assert store.columns["cluster_id"][3] == "q1"
+    assert list(store.query(difficulty="H", dedup=True)) == [0]
+
+
+def test_other_format_is_rejected_and_rebuilt(bank_dir, store):
+    stale = bank_dir / "stale.bin"
+    shutil.copy(store.path, stale)
+    with open(stale, "r+b") as f:
+        f.seek(8)
+        f.write(struct.pack("<I", ARTIFACT_FORMAT - 1))
+    with pytest.raises(ValueError):
+        QuestionStore(str(stale))
+
+    rebuilt = load_question_store(str(bank_dir / "data"), str(bank_dir / "lookup.json"), str(stale))
+    assert rebuilt.format == ARTIFACT_FORMAT
+    assert len(rebuilt) == len(store)
+
+
+def test_concurrent_rebuilds_compile_once(bank_dir, store, bank_questions, monkeypatch):
+    data_dir = str(bank_dir / "data")
+    bank_questions[0]["explanation"] = "<p>Rewritten.</p>"
+    write_bank(data_dir, bank_questions)
+    builds = []
+
+    def counting_build(*args):
+        builds.append(args)
+        # Long enough for every thread to find the artifact stale meanwhile
+        time.sleep(0.2)
+        return build_artifact(*args)
+
+    monkeypatch.setattr(question_store, "build_artifact", counting_build)
+    with ThreadPoolExecutor(4) as pool:
+        loaded = list(pool.map(lambda _: load_question_store(data_dir, str(bank_dir / "lookup.json"), store.path), range(4)))
+    assert len(builds) == 1
+    assert {reloaded.version for reloaded in loaded} == {loaded[0].version} != {store.version}
+
+
+def test_revisions_count_changes_and_deletions(bank_dir, store, bank_questions):
+    data_dir = str(bank_dir / "data")
+    epoch, revision = store.revision.split(".")
+    assert revision == "1"
+    assert revisions_up_to_date(data_dir)
+
+    bank_questions[1]["explanation"] = "<p>Rewritten.</p>"
+    removed = bank_questions.pop(2)
+    write_bank(data_dir, bank_questions)
+    assert not revisions_up_to_date(data_dir)
+
+    # A runtime build applies the change in memory but leaves the committed log alone
+    log = (bank_dir / "data" / REVISIONS_FILE).read_bytes()
+    updated = QuestionStore(build_artifact(data_dir, str(bank_dir / "lookup.json"), store.path))
+    assert updated.revision == f"{epoch}.2"
+    assert (bank_dir / "data" / REVISIONS_FILE).read_bytes() == log
+    assert not revisions_up_to_date(data_dir)
+
+    compiled = QuestionStore(build_artifact(data_dir, str(bank_dir / "lookup.json"), store.path, write_revisions=True))
+    assert compiled.revision == updated.revision
+    assert revisions_up_to_date(data_dir)
+    assert updated.since(store.revision) == 1
+    assert [updated.question_ids[position] for position in updated.changed(updated.query(), 1)] == ["q2"]
+    assert updated.deleted_since(1) == [removed["questionId"]]
+    assert updated.since("other.1") is None
+    assert updated.since(f"{epoch}.3") is None
+    with pytest.raises(ValueError):
+        updated.since("bad")
+
+
+def test_deletions_follow_every_filter(bank_dir, store, bank_questions):
+    data_dir = str(bank_dir / "data")
+    removed = bank_questions.pop(2)
+    write_bank(data_dir, bank_questions)
+    updated = QuestionStore(build_artifact(data_dir, str(bank_dir / "lookup.json"), store.path))
+
+    assert updated.deleted_since(1, program="SAT", subject="RW") == [removed["questionId"]]
+    assert updated.deleted_since(1, difficulty=removed["difficulty"]) == [removed["questionId"]]
+    assert updated.deleted_since(1, skill=removed["skill_desc"].upper()) == [removed["questionId"]]
+    assert updated.deleted_since(1, category=removed["primary_class_cd_desc"]) == [removed["questionId"]]
+    assert updated.deleted_since(1, difficulty="X") == []
+    assert updated.deleted_since(1, category="Other") == []
+    assert updated.deleted_since(1, skill="no such skill") == []
+
+
+def test_fresh_revision_logs_share_an_epoch(tmp_path, bank_dir, store):
+    copy = tmp_path / "copy"
+    shutil.copytree(bank_dir / "data", copy, ignore=shutil.ignore_patterns("questions.bin", "question_revisions.json"))
+    rebuilt = QuestionStore(build_artifact(str(copy), str(bank_dir / "lookup.json"), str(copy / "questions.bin")))
+    assert rebuilt.revision == store.revision
+
+
+@pytest.mark.parametrize(
+    "fields, expected",
+    [
+        (None, None),
+        ("", None),
+        ("summary", SUMMARY_FIELDS),
+        ("skill_desc", ("questionId", "skill_desc")),
+        ("explanation, difficulty", ("questionId", "difficulty", "explanation")),
+        ("summary,correct_answer", ("questionId", "difficulty", "skill_desc", "primary_class_cd_desc", "program", "correct_answer", "clusterId")),
+        (",".join(RENDERED_FIELDS), None),
+    ],
+)
+def test_parse_fields(fields, expected):
+    assert parse_fields(fields) == expected
+
+
+def test_parse_fields_rejects_unknown_names():
+    with pytest.raises(ValueError):
+        parse_fields("questionId,html")
+
+
+@pytest.mark.parametrize(
+    "fields",
+    [
+        SUMMARY_FIELDS,
+        ("questionId", "skill_desc"),
+        ("questionId", "difficulty", "explanation"),
+        ("questionId", "answerOptions", "correct_answer"),
+    ],
+)
+def test_render_projects_the_full_body(store, fields):
+    for position in range(len(store)):
+        full = json.loads(store.body(position))
+        projected = store.render(position, fields)
+        assert list(json.loads(projected)) == list(fields)
+        assert json.loads(projected) == {field: full[field] for field in fields}
+
+
+def test_render_without_fields_is_the_body(store):
+    assert store.render(0) == store.body(0)
+    assert store.render(0, SUMMARY_FIELDS) == store.summary(0)
+
+
+def test_projected_pages(store):
+    page = json.loads(store.page_json(0, 10, 1, fields=("questionId", "difficulty")))
+    assert page["questions"][0] == {"questionId": "q1", "difficulty": "H"}
+    assert json.loads(store.page_json(0, 10, 1))["questions"][0]["question"]
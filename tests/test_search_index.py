@@ -0,0 +1,76 @@
+import pytest
+
+import search_index
+from conftest import make_question, write_bank
+from question_store import LiveQuestionStore, QuestionStore, build_artifact
+from search_index import LiveSearchIndex, SearchIndex, parse_query, plain_text
+
+
+@pytest.fixture
+def index(bank_dir):
+    questions = [
+        make_question("s1", "e1", "Coral reefs bleach when the ocean warms"),
+        make_question("s2", "e2", "Coral survives, and coral grows back on coral"),
+        make_question("s3", "e3", "Migrating birds follow the coast"),
+        make_question("s4", "e4", "The reef wall beside the coral garden"),
+        make_question("s5", "e5", "The author&rsquo;s <em>coral</em> garden", difficulty="E"),
+    ]
+    write_bank(bank_dir / "data", questions)
+    store = QuestionStore(build_artifact(str(bank_dir / "data"), str(bank_dir / "lookup.json"), str(bank_dir / "data" / "questions.bin")))
+    return SearchIndex(store)
+
+
+def ids(index, positions):
+    return [index.store.question_ids[position] for position in positions]
+
+
+def test_parse_query():
+    assert parse_query('Coral "reef wall" "garden" x-ray') == (["coral", "garden", "x", "ray"], [["reef", "wall"]])
+
+
+def test_plain_text_strips_markup():
+    assert plain_text("<p>The author&rsquo;s <em>claim</em></p>").split() == ["The", "author’s", "claim"]
+
+
+def test_ranked_by_term_frequency_and_length(index):
+    positions, scores = index.search("coral")
+    assert ids(index, positions) == ["s2", "s5", "s1", "s4"]
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+def test_every_term_is_required(index):
+    assert ids(index, index.search("coral garden")[0]) == ["s5", "s4"]
+    assert len(index.search("coral birds")[0]) == 0
+    assert len(index.search("unheard")[0]) == 0
+
+
+def test_phrases_match_in_order(index):
+    assert ids(index, index.search('"coral garden"')[0]) == ["s5", "s4"]
+    assert len(index.search('"garden coral"')[0]) == 0
+    assert ids(index, index.search('"author s"')[0]) == ["s5"]
+
+
+def test_allowed_positions(index):
+    allowed = index.store.query(difficulty="E")
+    assert ids(index, index.search("coral", allowed)[0]) == ["s5"]
+
+
+def test_snippet_marks_matches(index):
+    position = index.store.position("s4")
+    assert index.snippet(position, '"coral garden"') == "The reef wall beside the <mark>coral</mark> <mark>garden</mark>?"
+
+
+def test_reload_builds_the_next_index_before_serving_it(bank_dir, bank_questions, monkeypatch):
+    data_dir = bank_dir / "data"
+    live_store = LiveQuestionStore(str(data_dir), str(bank_dir / "lookup.json"), str(data_dir / "questions.bin"))
+    live_index = LiveSearchIndex(live_store)
+    first = live_index.current
+
+    write_bank(data_dir, bank_questions + [make_question("s9", "e9", "Glaciers carve valleys")])
+    assert live_store.reload()
+    # Searches after the swap find the index already built
+    monkeypatch.setattr(search_index, "SearchIndex", None)
+    index = live_index.current
+    assert index is not first
+    assert index.store is live_store.current
+    assert ids(index, index.search("glaciers")[0]) == ["s9"]
@@ -0,0 +1,53 @@
+import gzip
+import json
+import os
+
+import pytest
+from pydantic import BaseModel
+
+from stats_cache import StatsCache, StatsUnavailable
+
+
+class Totals(BaseModel):
+    total: int
+
+
+def write_stats(path, total):
+    with open(path, "w") as f:
+        json.dump({"total": total, "unused": True}, f)
+
+
+def test_served_from_memory_until_the_file_changes(tmp_path):
+    path = tmp_path / "stats.json"
+    write_stats(path, 1)
+    cache = StatsCache(str(tmp_path), lambda: None)
+    first = cache.get("stats.json", Totals)
+    assert first.body == b'{"total":1}'
+    assert gzip.decompress(first.compressed.encoded("gzip")) == first.body
+    assert cache.get("stats.json", Totals) is first
+
+    write_stats(path, 2)
+    os.utime(path, ns=(first.mtime_ns + 10**9, first.mtime_ns + 10**9))
+    second = cache.get("stats.json", Totals)
+    assert second.body == b'{"total":2}'
+    assert second.etag != first.etag
+
+
+def test_missing_files_are_generated_once(tmp_path):
+    runs = []
+
+    def generate():
+        runs.append(1)
+        write_stats(tmp_path / "stats.json", 3)
+
+    cache = StatsCache(str(tmp_path), generate)
+    assert cache.missing("stats.json")
+    assert cache.get("stats.json", Totals).body == b'{"total":3}'
+    assert not cache.missing("stats.json")
+    assert runs == [1]
+
+
+def test_unavailable_when_generation_writes_nothing(tmp_path):
+    cache = StatsCache(str(tmp_path), lambda: None)
+    with pytest.raises(StatsUnavailable):
+        cache.get("stats.json", Totals)
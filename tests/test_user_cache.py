@@ -0,0 +1,43 @@
+import time
+
+from user_cache import UserCache
+
+
+def test_entries_expire_with_the_token(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = UserCache(ttl=300, negative_ttl=30)
+    cache.put("u1", "alice", token_exp=1060)
+    cache.put("u2", "bob")
+    cache.put_missing("u3")
+    assert cache.lookup("u1") == (True, "alice")
+    assert cache.lookup("u3") == (True, None)
+
+    now[0] = 1060
+    assert cache.lookup("u1") == (False, None)
+    assert cache.lookup("u2") == (True, "bob")
+    assert cache.lookup("u3") == (False, None)
+    assert len(cache) == 1
+
+
+def test_least_recently_used_are_evicted():
+    cache = UserCache(max_size=2)
+    cache.put("u1", "alice")
+    cache.put("u2", "bob")
+    cache.lookup("u1")
+    cache.put("u3", "carol")
+    assert cache.lookup("u2") == (False, None)
+    assert cache.lookup("u1") == (True, "alice")
+    assert cache.lookup("u3") == (True, "carol")
+
+
+def test_invalidate_one_or_all():
+    cache = UserCache()
+    cache.put("u1", "alice")
+    cache.put("u2", "bob")
+    cache.invalidate("u1")
+    cache.invalidate("unknown")
+    assert cache.lookup("u1") == (False, None)
+    assert cache.lookup("u2") == (True, "bob")
+    cache.invalidate()
+    assert len(cache) == 0
@@ -0,0 +1,49 @@
+import time
+
+from user_progress import ProgressTracker, UserProgress, score_outcomes
+
+
+def test_reattempt_replaces_the_earlier_outcome(store):
+    progress = UserProgress({}, time.time() + 60)
+    progress.recount(store)
+    progress.record(store, "q1", False)
+    progress.record(store, "q2", True)
+    progress.record(store, "q1", True)
+
+    assert progress.outcomes == {"q1": True, "q2": True}
+    assert progress.scores("difficulty") == {"H": (1, 1), "E": (1, 1)}
+    assert progress.attempted == (1 << 0) | (1 << 1)
+
+
+def test_tracker_records_batches_in_order(store):
+    tracker = ProgressTracker()
+    progress = tracker.load("u1", [("q3", True)])
+    tracker.record_many(store, "u1", [("q1", True), ("q3", False), ("q1", False)])
+
+    summary = tracker.summary(progress, store)
+    assert (summary["total_attempted"], summary["total_correct"]) == (2, 0)
+    assert summary["by_difficulty"] == {"H": {"attempted": 1, "correct": 0, "accuracy": 0.0}, "M": {"attempted": 1, "correct": 0, "accuracy": 0.0}}
+
+
+def test_tracker_ignores_users_it_has_not_loaded(store):
+    tracker = ProgressTracker()
+    tracker.record_many(store, "u1", [("q1", True)])
+    assert tracker.get("u1") is None
+
+
+def test_score_outcomes(store):
+    facets = (("primary_class_cd_desc", "by_main_category"), ("difficulty", "by_difficulty"))
+    outcomes = [(store.position("q1"), True), (store.position("q2"), False), (store.position("q5"), True), (store.position("q1"), False)]
+    summary = score_outcomes(store, outcomes, facets)
+
+    assert (summary["total_attempted"], summary["total_correct"], summary["accuracy"]) == (4, 2, 0.5)
+    assert summary["by_main_category"] == {
+        "Information and Ideas": {"attempted": 2, "correct": 1, "accuracy": 0.5},
+        "Craft and Structure": {"attempted": 2, "correct": 1, "accuracy": 0.5},
+    }
+    assert summary["by_difficulty"]["E"] == {"attempted": 2, "correct": 1, "accuracy": 0.5}
+    assert set(summary) == {"total_attempted", "total_correct", "accuracy", "by_main_category", "by_difficulty"}
+
+
+def test_score_outcomes_of_nothing(store):
+    assert score_outcomes(store, [])["accuracy"] == 0.0
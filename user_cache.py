@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+
+class UserCache:
+    """
+    Bounded TTL + LRU cache of resolved users, keyed by user id (the JWT `sub`).
+
+    Entries expire after `ttl` seconds, and never later than the `exp` of the
+    token that populated them. Unknown user ids are cached as well, for the
+    shorter `negative_ttl`, so a stream of requests for a deleted account
+    doesn't hit the database each time. `invalidate()` drops one user, or
+    everything, when the underlying row changes.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0, negative_ttl: float = 30.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: "OrderedDict[str, Tuple[float, Optional[Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, user_id: str) -> Tuple[bool, Optional[Any]]:
+        """
+        Returns (hit, user). On a hit, `user` is None if the id is cached as
+        unknown.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return False, None
+            expires_at, user = entry
+            if expires_at <= time.time():
+                del self._entries[user_id]
+                return False, None
+            self._entries.move_to_end(user_id)
+            return True, user
+
+    def put(self, user_id: str, user: Any, token_exp: Optional[float] = None) -> None:
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        self._store(user_id, expires_at, user)
+
+    def put_missing(self, user_id: str) -> None:
+        self._store(user_id, time.time() + self.negative_ttl, None)
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def _store(self, user_id: str, expires_at: float, user: Optional[Any]) -> None:
+        with self._lock:
+            self._entries[user_id] = (expires_at, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
@@ -0,0 +1,190 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Facets a user's attempts are counted by, and the keys they're reported under
+PROGRESS_FACETS = (
+    ("program", "by_program"),
+    ("subject", "by_subject"),
+    ("primary_class_cd_desc", "by_main_category"),
+    ("skill_desc", "by_subcategory"),
+    ("difficulty", "by_difficulty"),
+    ("score_band_range_cd", "by_score_band"),
+)
+
+
+class UserProgress:
+    """
+    One user's latest outcome per question, plus attempted/correct counters
+    per program, facet and value derived from it and a bitset of the store
+    positions they've attempted. Both are tied to the question store version
+    they were built against.
+    """
+
+    __slots__ = ("outcomes", "counters", "attempted", "version", "expires_at")
+
+    def __init__(self, outcomes: Dict[str, bool], expires_at: float):
+        self.outcomes = outcomes
+        self.counters: Dict[str, Dict[str, Dict[Any, List[int]]]] = {}
+        self.attempted = 0
+        self.version: Optional[str] = None
+        self.expires_at = expires_at
+
+    def recount(self, store: Any) -> None:
+        self.counters = {}
+        self.attempted = store.bitmap(self.outcomes)
+        self.version = store.version
+        for question_id, is_correct in self.outcomes.items():
+            self._count(store, question_id, is_correct, 1)
+
+    def record(self, store: Any, question_id: str, is_correct: bool) -> None:
+        if self.version != store.version:
+            self.outcomes[question_id] = is_correct
+            self.recount(store)
+            return
+        previous = self.outcomes.get(question_id)
+        if previous is not None:
+            # A re-attempt replaces the earlier row, so it replaces its counts too
+            self._count(store, question_id, previous, -1)
+        self.outcomes[question_id] = is_correct
+        self._count(store, question_id, is_correct, 1)
+        position = store.position(question_id)
+        if position is not None:
+            self.attempted |= 1 << position
+
+    def scores(self, facet: str, program: Optional[str] = None) -> Dict[Any, Tuple[int, int]]:
+        """(attempted, correct) per value of `facet`, across all programs or for one."""
+        scores: Dict[Any, Tuple[int, int]] = {}
+        for name in [program] if program else list(self.counters):
+            for value, (attempted, correct) in self.counters.get(name, {}).get(facet, {}).items():
+                total = scores.get(value, (0, 0))
+                scores[value] = (total[0] + attempted, total[1] + correct)
+        return scores
+
+    def _count(self, store: Any, question_id: str, is_correct: bool, step: int) -> None:
+        position = store.position(question_id)
+        if position is None:
+            # No longer in the bank; kept in outcomes in case it comes back
+            return
+        by_facet = self.counters.setdefault(store.columns["program"][position], {})
+        for facet, _ in PROGRESS_FACETS:
+            counter = by_facet.setdefault(facet, {}).setdefault(store.columns[facet][position], [0, 0])
+            counter[0] += step
+            if is_correct:
+                counter[1] += step
+
+
+class ProgressTracker:
+    """
+    Materialized per-user progress, so /user/progress doesn't re-read the
+    user's attempt history on every request.
+
+    A user's progress is built from their attempted_questions rows the first
+    time it's asked for, then kept up to date in-process as attempts come
+    in. Entries expire after `ttl` seconds so attempts another worker
+    recorded are picked up on the next rebuild; at most `max_users` are kept.
+    """
+
+    def __init__(self, max_users: int = 10000, ttl: float = 300.0):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, UserProgress]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: str) -> Optional[UserProgress]:
+        with self._lock:
+            progress = self._entries.get(user_id)
+            if progress is None:
+                return None
+            if progress.expires_at <= time.time():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return progress
+
+    def load(self, user_id: str, outcomes: Iterable[Tuple[str, bool]]) -> UserProgress:
+        progress = UserProgress(dict(outcomes), time.time() + self.ttl)
+        with self._lock:
+            self._entries[user_id] = progress
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return progress
+
+    def current(self, progress: UserProgress, store: Any) -> UserProgress:
+        """`progress`, recounted first if the question store has been reloaded since."""
+        with self._lock:
+            if progress.version != store.version:
+                progress.recount(store)
+        return progress
+
+    def record(self, store: Any, user_id: str, question_id: str, is_correct: bool) -> None:
+        """Apply one graded attempt, if the user's progress is loaded."""
+        self.record_many(store, user_id, [(question_id, is_correct)])
+
+    def record_many(self, store: Any, user_id: str, outcomes: Iterable[Tuple[str, bool]]) -> None:
+        """Apply graded attempts in order, if the user's progress is loaded."""
+        with self._lock:
+            progress = self._entries.get(user_id)
+            if progress is not None:
+                for question_id, is_correct in outcomes:
+                    progress.record(store, question_id, is_correct)
+
+    def summary(self, progress: UserProgress, store: Any, program: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Attempted/correct/accuracy overall and by facet value, across all
+        programs or for one.
+        """
+        self.current(progress, store)
+        with self._lock:
+            totals = {}
+            for facet, key in PROGRESS_FACETS:
+                scores = progress.scores(facet, program).items()
+                totals[key] = {str(value): total for value, total in scores if total[0]}
+
+        attempted = sum(total[0] for total in totals["by_program"].values())
+        correct = sum(total[1] for total in totals["by_program"].values())
+        summary = {"total_attempted": attempted, "total_correct": correct, "accuracy": _accuracy(attempted, correct)}
+        for _, key in PROGRESS_FACETS:
+            summary[key] = {value: _score(*total) for value, total in totals[key].items()}
+        return summary
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+def score_outcomes(store: Any, outcomes: Iterable[Tuple[int, bool]], facets: Iterable[Tuple[str, str]] = PROGRESS_FACETS) -> Dict[str, Any]:
+    """
+    Attempted/correct/accuracy overall and by facet value for a set of
+    (position, is_correct) outcomes, such as one graded practice set.
+    """
+    facets = list(facets)
+    totals: Dict[str, Dict[str, List[int]]] = {key: {} for _, key in facets}
+    attempted = correct = 0
+    for position, is_correct in outcomes:
+        attempted += 1
+        correct += is_correct
+        for facet, key in facets:
+            counter = totals[key].setdefault(str(store.columns[facet][position]), [0, 0])
+            counter[0] += 1
+            counter[1] += is_correct
+    summary = {"total_attempted": attempted, "total_correct": correct, "accuracy": _accuracy(attempted, correct)}
+    for _, key in facets:
+        summary[key] = {value: _score(*total) for value, total in totals[key].items()}
+    return summary
+
+
+def _score(attempted: int, correct: int) -> Dict[str, Any]:
+    return {"attempted": attempted, "correct": correct, "accuracy": _accuracy(attempted, correct)}
+
+
+def _accuracy(attempted: int, correct: int) -> float:
+    return round(correct / attempted, 4) if attempted else 0.0